@@ -0,0 +1,193 @@
+# Import necessary modules
+import argparse  # For command-line argument parsing
+import csv  # For writing CSV files
+import gzip  # For compressing the generated files
+import json  # For writing the locations file
+import logging  # For logging information
+import math  # For the daily cycle of the generated values
+import os  # For file and directory operations
+import random  # For generating measurement values
+from datetime import datetime, timedelta  # For working with date and time
+from typing import Dict, List  # For type hinting
+
+from dateutil.relativedelta import relativedelta  # For adding months
+
+# Parameters that can be generated, with their units and typical level
+PARAMETERS = [
+    ("pm10", "µg/m³", 40.0),
+    ("pm25", "µg/m³", 20.0),
+    ("so2", "µg/m³", 10.0),
+    ("no2", "µg/m³", 25.0),
+    ("o3", "µg/m³", 60.0),
+]
+
+# Columns of the OpenAQ archive files, in order
+COLUMNS = ["location_id", "sensors_id", "location", "datetime", "lat", "lon", "parameter", "units", "value"]
+
+
+# Function to generate the locations and their sensors
+def generate_locations(
+    locations: int, parameters: int, sensors_per_parameter: int, seed: int
+) -> List[Dict]:
+    """
+    Generate locations with coordinates and sensors for each parameter.
+    
+    Args:
+        locations (int): Number of locations.
+        parameters (int): Number of parameters measured at each location.
+        sensors_per_parameter (int): Number of sensors per parameter at each location.
+        seed (int): Seed for the random number generator.
+    
+    Returns:
+        List[Dict]: The generated locations.
+    """
+    rng = random.Random(seed)
+    generated = []
+    for index in range(locations):
+        location_id = 100000 + index
+        sensors = [
+            (location_id * 100 + parameter_index * sensors_per_parameter + sensor_index, *PARAMETERS[parameter_index])
+            for parameter_index in range(parameters)
+            for sensor_index in range(sensors_per_parameter)
+        ]
+        generated.append({
+            "location_id": location_id,
+            "location": f"Synthetic Station {index}",
+            "lat": round(rng.uniform(-27.0, -25.0), 5),
+            "lon": round(rng.uniform(27.0, 30.0), 5),
+            "sensors": sensors,
+        })
+    return generated
+
+
+# Function to write the data of one location and day
+def write_day_file(path: str, location: Dict, day: datetime, rng: random.Random) -> int:
+    """
+    Write hourly measurements of every sensor of a location for one day.
+    
+    Values follow a daily cycle with noise. A small share is negative or
+    missing, like in the real archive, so data-quality filters have work to do.
+    
+    Args:
+        path (str): Path of the gzipped CSV file.
+        location (Dict): The location and its sensors.
+        day (datetime): The day to generate.
+        rng (random.Random): Random number generator.
+    
+    Returns:
+        int: Number of rows written.
+    """
+    rows = 0
+    with gzip.open(path, "wt", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for hour in range(24):
+            timestamp = day + timedelta(hours=hour)
+            cycle = 1.0 + 0.5 * math.sin(2 * math.pi * (hour - 6) / 24)
+            for sensors_id, parameter, units, level in location["sensors"]:
+                value = level * cycle * rng.lognormvariate(0.0, 0.3)
+                if rng.random() < 0.005:
+                    value = -999.0  # Invalid reading
+                writer.writerow([
+                    location["location_id"],
+                    sensors_id,
+                    location["location"],
+                    timestamp.strftime("%Y-%m-%dT%H:%M:%S+02:00"),
+                    location["lat"],
+                    location["lon"],
+                    parameter,
+                    units,
+                    "" if rng.random() < 0.002 else round(value, 2),
+                ])
+                rows += 1
+    return rows
+
+
+# Function to generate a hive-partitioned source tree
+def generate_data(
+    output_dir: str,
+    locations: int,
+    parameters: int,
+    sensors_per_parameter: int,
+    start_date: str,
+    months: int,
+    seed: int = 0,
+) -> str:
+    """
+    Generate an OpenAQ-style source tree ("locationid=/year=/month=/") with one
+    gzipped CSV file per location and day, plus a locations JSON file.
+    
+    Args:
+        output_dir (str): Directory to write the data to.
+        locations (int): Number of locations.
+        parameters (int): Number of parameters measured at each location.
+        sensors_per_parameter (int): Number of sensors per parameter at each location.
+        start_date (str): First month in "YYYY-MM" format.
+        months (int): Number of months to generate.
+        seed (int): Seed for the random number generator.
+    
+    Returns:
+        str: Path of the locations JSON file.
+    """
+    rng = random.Random(seed)
+    generated = generate_locations(locations, parameters, sensors_per_parameter, seed)
+    first_month = datetime.strptime(start_date, "%Y-%m")
+
+    rows = 0
+    for location in generated:
+        for month_offset in range(months):
+            month = first_month + relativedelta(months=month_offset)
+            partition_dir = os.path.join(
+                output_dir,
+                f"locationid={location['location_id']}",
+                f"year={month.year}",
+                f"month={str(month.month).zfill(2)}",
+            )
+            os.makedirs(partition_dir, exist_ok=True)
+
+            day = month
+            while day.month == month.month:
+                file_name = f"location-{location['location_id']}-{day.strftime('%Y%m%d')}.csv.gz"
+                rows += write_day_file(os.path.join(partition_dir, file_name), location, day, rng)
+                day += timedelta(days=1)
+
+    # Write the locations file read by the extraction
+    locations_file_path = os.path.join(output_dir, "locations.json")
+    with open(locations_file_path, "w") as f:
+        json.dump({str(location["location_id"]): location["location"] for location in generated}, f, indent=4)
+
+    logging.info(f"Generated {rows} rows for {locations} locations and {months} months in {output_dir}")
+    return locations_file_path
+
+
+# Main function to set up argument parsing and generate the data
+def main():
+    """
+    Main entry point for the CLI tool. Parses arguments and generates the data.
+    """
+    logging.getLogger().setLevel(logging.INFO)  # Set logging level to INFO
+
+    parser = argparse.ArgumentParser(description="Generate synthetic OpenAQ-style air quality data")
+    parser.add_argument("--output_dir", type=str, required=True, help="Directory to write the data to")
+    parser.add_argument("--locations", type=int, default=10, help="Number of locations")
+    parser.add_argument("--parameters", type=int, default=3, help=f"Number of parameters (at most {len(PARAMETERS)})")
+    parser.add_argument("--sensors_per_parameter", type=int, default=1, help="Number of sensors per parameter")
+    parser.add_argument("--start_date", type=str, default="2024-01", help="First month in YYYY-MM format")
+    parser.add_argument("--months", type=int, default=3, help="Number of months")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the random number generator")
+    args = parser.parse_args()
+
+    generate_data(
+        output_dir=args.output_dir,
+        locations=args.locations,
+        parameters=min(args.parameters, len(PARAMETERS)),
+        sensors_per_parameter=args.sensors_per_parameter,
+        start_date=args.start_date,
+        months=args.months,
+        seed=args.seed,
+    )
+
+
+# Entry point for the script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# Import necessary modules
+import argparse  # For command-line argument parsing
+import json  # For writing machine-readable results
+import logging  # For logging information
+import os  # For file and directory operations
+import shlex  # For splitting pass-through CLI arguments
+import statistics  # For summarizing repeated timings
+import subprocess  # For reading the current git commit
+import sys  # For locating the pipeline and dashboard modules
+import tempfile  # For a default working directory
+import time  # For timing the stages
+from datetime import datetime, timezone  # For timestamping the results
+from typing import Callable, Dict, List, Optional  # For type hinting
+
+# Make the pipeline and dashboard modules importable, they use flat imports
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "pipeline"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "dashboard"))
+
+import extraction  # Extraction stage
+import data_quality  # Data-quality stage
+import transformation  # Transformation stage
+from database_manager import connect_to_database, close_database_connection, setup_database
+from generate_data import generate_data  # Synthetic source data
+
+DDL_QUERY_PARENT_DIR = os.path.join(REPO_ROOT, "sql", "ddl")
+EXTRACT_QUERY_TEMPLATE_PATH = os.path.join(REPO_ROOT, "sql", "dml", "raw", "0_raw_air_quality_insert.sql")
+LATEST_VALUES_QUERY_PATH = os.path.join(REPO_ROOT, "sql", "dml", "raw", "2_presentation_latest_values_upsert.sql")
+QUALITY_QUERY_TEMPLATE_PATH = os.path.join(REPO_ROOT, "sql", "dml", "quality", "0_quality_checks.sql")
+TRANSFORM_QUERY_DIRECTORY = os.path.join(REPO_ROOT, "sql", "dml", "presentation")
+
+
+# Function to time a callable
+def time_call(function: Callable, repeat: int = 1, before: Optional[Callable] = None) -> List[float]:
+    """
+    Run a callable `repeat` times and return the wall time of each run.
+    
+    Args:
+        function (Callable): The function to time.
+        repeat (int): Number of runs.
+        before (Optional[Callable]): Untimed function run before each run.
+    
+    Returns:
+        List[float]: Wall time of each run in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+# Function to read the current git commit
+def read_git_commit() -> Optional[str]:
+    """
+    Read the commit the benchmark runs against, so results can be compared across commits.
+    
+    Returns:
+        Optional[str]: The commit hash, or None outside a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Function to benchmark the dashboard callbacks
+def benchmark_dashboard(database_path: str, repeat: int) -> Dict[str, List[float]]:
+    """
+    Time each dashboard callback with a cold and a warm result cache.
+    
+    Args:
+        database_path (str): Path to the DuckDB database.
+        repeat (int): Number of runs per callback.
+    
+    Returns:
+        Dict[str, List[float]]: Wall times by callback name.
+    """
+    import app  # Imported here so the pipeline stages can be benchmarked without Dash installed
+
+    app.connection_pool.database_path = database_path
+    app.query_cache.clear()
+    _, location, _, parameter, _, _ = app.update_dropdowns(None)
+    callbacks = {
+        "update_map": lambda: app.update_map(None),
+        "update_dropdowns": lambda: app.update_dropdowns(None),
+        "load_series": lambda: app.load_series(location, parameter),
+    }
+
+    timings = {}
+    for name, callback in callbacks.items():
+        timings[f"dashboard.{name}.cold"] = time_call(callback, repeat, before=app.query_cache.clear)
+        timings[f"dashboard.{name}.warm"] = time_call(callback, repeat)
+
+    # Release the read-only connection so the next scale starts from a clean state
+    app.connection_pool.close()
+    app.query_cache.clear()
+    return timings
+
+
+# Function to benchmark the pipeline at one data scale
+def benchmark_scale(args: argparse.Namespace, locations: int, months: int) -> List[Dict]:
+    """
+    Generate data at one scale and time every stage of the pipeline on it.
+    
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments.
+        locations (int): Number of locations.
+        months (int): Number of months.
+    
+    Returns:
+        List[Dict]: One result record per timed stage.
+    """
+    scale = f"{locations}x{months}"
+    data_dir = os.path.join(
+        args.work_dir, f"data-{scale}-p{args.parameters}-s{args.sensors_per_parameter}-{args.start_date}"
+    )
+    locations_file_path = os.path.join(data_dir, "locations.json")
+
+    # Reuse previously generated data for the same scale
+    if not os.path.exists(locations_file_path):
+        generate_data(
+            output_dir=data_dir,
+            locations=locations,
+            parameters=args.parameters,
+            sensors_per_parameter=args.sensors_per_parameter,
+            start_date=args.start_date,
+            months=months,
+        )
+
+    # Start every scale from an empty database
+    database_path = os.path.join(args.work_dir, f"benchmark-{scale}.db")
+    for path in (database_path, f"{database_path}.wal"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    end_month = datetime.strptime(args.start_date, "%Y-%m")
+    end_month = end_month.replace(year=end_month.year + (end_month.month - 1 + months - 1) // 12,
+                                  month=(end_month.month - 1 + months - 1) % 12 + 1)
+    extract_args = extraction.parse_arguments([
+        "--locations_file_path", locations_file_path,
+        "--start_date", args.start_date,
+        "--end_date", end_month.strftime("%Y-%m"),
+        "--extract_query_template_path", EXTRACT_QUERY_TEMPLATE_PATH,
+        "--database_path", database_path,
+        "--source_base_path", data_dir,
+        "--latest_values_query_path", LATEST_VALUES_QUERY_PATH,
+        *shlex.split(args.extract_args),
+    ])
+    quality_args = data_quality.parse_arguments([
+        "--database_path", database_path,
+        "--quality_query_template_path", QUALITY_QUERY_TEMPLATE_PATH,
+    ])
+    transform_args = transformation.parse_arguments([
+        "--database_path", database_path,
+        "--query_directory", TRANSFORM_QUERY_DIRECTORY,
+        *shlex.split(args.transform_args),
+    ])
+
+    timings = {
+        "setup_database": time_call(lambda: setup_database(database_path, DDL_QUERY_PARENT_DIR)),
+        "extract_data": time_call(lambda: extraction.extract_data(extract_args)),
+        "check_data_quality": time_call(lambda: data_quality.check_data_quality(quality_args)),
+        "transform_data": time_call(lambda: transformation.transform_data(transform_args)),
+    }
+
+    # Record the size of the loaded data with the results
+    con = connect_to_database(database_path)
+    raw_rows = con.execute("SELECT COUNT(*) FROM raw.air_quality").fetchone()[0]
+    close_database_connection(con)
+
+    if not args.skip_dashboard:
+        timings.update(benchmark_dashboard(database_path, args.repeat))
+
+    return [
+        {
+            "stage": stage,
+            "scale": scale,
+            "locations": locations,
+            "months": months,
+            "parameters": args.parameters,
+            "sensors_per_parameter": args.sensors_per_parameter,
+            "raw_rows": raw_rows,
+            "database_bytes": os.path.getsize(database_path),
+            "extract_args": args.extract_args,
+            "transform_args": args.transform_args,
+            "seconds": stage_timings,
+            "min_seconds": min(stage_timings),
+            "median_seconds": statistics.median(stage_timings),
+        }
+        for stage, stage_timings in timings.items()
+    ]
+
+
+# Main function to set up argument parsing and run the benchmarks
+def main():
+    """
+    Main entry point for the CLI tool. Runs the benchmarks at every requested
+    scale and appends the results as JSON lines to the output file.
+    """
+    logging.getLogger().setLevel(logging.WARNING)  # Keep the pipeline logs out of the timings
+
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks for the air quality pipeline")
+    parser.add_argument(
+        "--scales", type=str, nargs="+", default=["5x3", "20x12"],
+        help="Data scales as LOCATIONSxMONTHS, e.g. 5x3 20x12",
+    )
+    parser.add_argument("--parameters", type=int, default=3, help="Number of parameters per location")
+    parser.add_argument("--sensors_per_parameter", type=int, default=1, help="Number of sensors per parameter")
+    parser.add_argument("--start_date", type=str, default="2024-01", help="First month in YYYY-MM format")
+    parser.add_argument("--work_dir", type=str, default=None, help="Directory for generated data and databases")
+    parser.add_argument("--output_path", type=str, default="benchmark_results.jsonl", help="File to append results to")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs per dashboard callback")
+    parser.add_argument("--extract_args", type=str, default="", help="Extra arguments for extraction.py, e.g. \"--bulk\"")
+    parser.add_argument("--transform_args", type=str, default="", help="Extra arguments for transformation.py")
+    parser.add_argument("--skip_dashboard", action="store_true", help="Do not benchmark the dashboard callbacks")
+    args = parser.parse_args()
+
+    args.work_dir = args.work_dir or tempfile.mkdtemp(prefix="air-quality-benchmark-")
+    run = {
+        "commit": read_git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+    with open(args.output_path, "a") as f:
+        for scale in args.scales:
+            locations, months = (int(part) for part in scale.lower().split("x"))
+            for record in benchmark_scale(args, locations, months):
+                f.write(json.dumps({**run, **record}) + "\n")
+                print(f"{record['scale']:>8} {record['stage']:<32} median {record['median_seconds']:.4f}s")
+
+
+# Entry point for the script
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,81 @@
 # Import Required Libraies
 import dash
-from dash import dcc, html, Input, Output
-import plotly.express as px
-import duckdb
-import pandas as pd
+from dash import dcc, html, Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
+import plotly.graph_objects as go
+import numpy as np
+from typing import Dict, List
+
+from clustering import grid_cell_degrees, read_map_zoom
+from query_cache import ConnectionPool, QueryCache
+from series_store import encode_columns
 
 # Initialize the Dash app
 app = dash.Dash(__name__)
 
+# Share one read-only database connection and a result cache between all callbacks
+connection_pool = ConnectionPool("../air_quality.db")
+query_cache = QueryCache(connection_pool)
+
+# Zoom level the map opens at
+MAP_DEFAULT_ZOOM = 6.0
+
+# Rollup resolutions sent to the browser with the series, for the line plot of any date range
+STORED_RESOLUTIONS = ["week", "month"]
+
+# Function to fetch the rollups of a location and parameter at one resolution
+def fetch_rollups(
+    resolution: str, location_id: int, parameter: str, start: str = "-infinity", end: str = "infinity"
+) -> Dict[str, np.ndarray]:
+    """
+    Fetch the average of every period from `start` (inclusive) to `end`
+    (exclusive), or of the whole history by default.
+    """
+    return query_cache.fetchnumpy(
+        """
+        SELECT
+            period_start,
+            SUM(average_value * measurement_count) / SUM(measurement_count) AS average_value
+        FROM presentation.air_quality_rollups
+        WHERE resolution = ?
+        AND location_id = ?
+        AND parameter = ?
+        AND period_start >= ?::TIMESTAMP
+        AND period_start < ?::TIMESTAMP
+        GROUP BY period_start
+        ORDER BY period_start
+        """,
+        [resolution, location_id, parameter, start, end],
+    )
+
+# Function to fetch the rollups of whole calendar months or years
+def fetch_calendar_rollups(
+    resolution: str, location_id: int, parameter: str, first_days: List[int], length: str
+) -> List[Dict[str, np.ndarray]]:
+    """
+    Fetch the rollups of the months ("M") or years ("Y") starting on the given
+    days since 1970-01-01, in order.
+    """
+    parts = []
+    for first_day in sorted(first_days):
+        start = np.datetime64(first_day, "D")
+        end = (start.astype(f"datetime64[{length}]") + 1).astype("datetime64[D]")
+        parts.append(fetch_rollups(resolution, location_id, parameter, str(start), str(end)))
+    return parts
+
+# Function to pack fetched rollups for the browser
+def encode_rollups(parts: List[Dict[str, np.ndarray]], unit: str) -> Dict[str, Dict[str, str]]:
+    """
+    Concatenate fetched rollups and encode them with their periods counted in
+    `unit` ("D" for days, "h" for hours) since 1970-01-01.
+    """
+    return encode_columns({
+        "period": np.concatenate(
+            [np.empty(0, f"datetime64[{unit}]")] + [part["period_start"].astype(f"datetime64[{unit}]") for part in parts]
+        ).astype("<i4"),
+        "average_value": np.concatenate([np.empty(0, "<f4")] + [part["average_value"].astype("<f4") for part in parts]),
+    })
+
 # Define the layout of the app
 app.layout = html.Div([
     dcc.Tabs([  # Create tabs for the dashboard
@@ -34,8 +102,11 @@ app.layout = html.Div([
                     id="date-picker-range",  # Date picker for filtering by date range
                     display_format="YYYY-MM-DD"
                 ),
-                dcc.Graph(id="line-plot"),  # Line plot for parameter trends over time
-                dcc.Graph(id="box-plot")    # Box plot for distribution of parameter values by weekday
+                dcc.Store(id="series-store"),  # Rollups and weekday summaries of the selected location and parameter
+                dcc.Store(id="window-request"),  # Rollups the date range needs beyond those in the series store
+                dcc.Store(id="window-store"),  # The requested rollups
+                dcc.Graph(id="line-plot", figure=go.Figure()),  # Line plot for parameter trends over time
+                dcc.Graph(id="box-plot", figure=go.Figure())    # Box plot for distribution of parameter values by weekday
             ]
         )
     ])
@@ -44,37 +115,73 @@ app.layout = html.Div([
 # Callback to update the map view with the sensor locations
 @app.callback(
     Output("map-view", "figure"),
-    Input("map-view", "id")  # Triggered when the map view component is loaded
+    Input("map-view", "relayoutData")  # Triggered when the map is loaded, panned or zoomed
 )
-def update_map(_):
-    with duckdb.connect("../air_quality.db", read_only=True) as db_connection:
-        latest_values_df = db_connection.execute(
-            "SELECT * FROM presentation.latest_param_values_per_location"
-        ).fetchdf()  # Fetch the latest air quality data for map view
-
-    # Fill NaN values with 0 for plotting
-    latest_values_df.fillna(0, inplace=True)
-    
-    # Create a scatter mapbox plot for sensor locations
-    map_fig = px.scatter_mapbox(
-        latest_values_df,
-        lat="lat",
-        lon="lon",
-        hover_name="location",
-        hover_data={
-            "lat": False,
-            "lon": False,
-            "datetime": True,
-            "pm10": True,
-            "pm25": True,
-            "so2": True
-        },
-        zoom=6.0
+def update_map(relayout_data):
+    # Cluster the locations on a grid that gets finer as the user zooms in
+    zoom = read_map_zoom(relayout_data, MAP_DEFAULT_ZOOM)
+    cell_degrees = grid_cell_degrees(zoom)
+    latest_values = query_cache.fetchnumpy(
+        """
+        WITH locations AS (
+            -- One row per location with the latest value of every parameter
+            SELECT
+                location_id,
+                ANY_VALUE(location) AS location,
+                ANY_VALUE(lat) AS lat,
+                ANY_VALUE(lon) AS lon,
+                MAX(datetime) AS datetime,
+                MAX(value) FILTER (WHERE parameter = 'pm10') AS pm10,
+                MAX(value) FILTER (WHERE parameter = 'pm25') AS pm25,
+                MAX(value) FILTER (WHERE parameter = 'so2') AS so2
+            FROM presentation.latest_values
+            GROUP BY location_id
+        )
+        SELECT
+            CASE WHEN COUNT(*) = 1 THEN ANY_VALUE(location) ELSE COUNT(*) || ' locations' END AS location,
+            COUNT(*) AS location_count,
+            AVG(lat) AS lat,
+            AVG(lon) AS lon,
+            MAX(datetime) AS datetime,
+            ROUND(COALESCE(AVG(pm10), 0), 2) AS pm10,  -- Fill missing values with 0 for plotting
+            ROUND(COALESCE(AVG(pm25), 0), 2) AS pm25,
+            ROUND(COALESCE(AVG(so2), 0), 2) AS so2
+        FROM locations
+        GROUP BY FLOOR(lon / ?), FLOOR(lat / ?)
+        """,
+        [cell_degrees, cell_degrees],
+    )  # Fetch the clustered latest air quality data for map view as column arrays
+
+    # Create a scatter mapbox plot for sensor locations, with larger markers for larger clusters
+    map_fig = go.Figure(
+        go.Scattermapbox(
+            lat=latest_values["lat"],
+            lon=latest_values["lon"],
+            mode="markers",
+            marker={"size": 8 + 4 * np.log2(latest_values["location_count"])},
+            hovertext=latest_values["location"],
+            customdata=np.column_stack([
+                np.datetime_as_string(latest_values["datetime"], unit="s"),
+                latest_values["pm10"],
+                latest_values["pm25"],
+                latest_values["so2"],
+            ]),
+            hovertemplate=(
+                "<b>%{hovertext}</b><br><br>"
+                "datetime=%{customdata[0]}<br>"
+                "pm10=%{customdata[1]}<br>"
+                "pm25=%{customdata[2]}<br>"
+                "so2=%{customdata[3]}<extra></extra>"
+            ),
+        )
     )
 
-    # Update the layout of the map
+    # Update the layout of the map, centered on the sensor locations; the user's view is kept on updates
     map_fig.update_layout(
         mapbox_style="open-street-map",
+        mapbox_center={"lat": float(np.mean(latest_values["lat"])), "lon": float(np.mean(latest_values["lon"]))},
+        mapbox_zoom=MAP_DEFAULT_ZOOM,
+        uirevision="map-view",
         height=800,
         title="Air Quality Monitoring Locations"
     )
@@ -94,82 +201,162 @@ def update_map(_):
     Input("location-dropdown", "id")  # Triggered when the location dropdown is loaded
 )
 def update_dropdowns(_):
-    with duckdb.connect("../air_quality.db", read_only=True) as db_connection:
-        df = db_connection.execute(
-            "SELECT * FROM presentation.daily_air_quality_stats"
-        ).fetchdf()  # Fetch daily air quality stats to populate the dropdowns
+    # Let DuckDB compute the distinct values and the date range
+    locations = query_cache.fetchall(
+        "SELECT DISTINCT location_id, location FROM presentation.daily_air_quality_stats ORDER BY location"
+    )
+    parameters = [row[0] for row in query_cache.fetchall(
+        "SELECT DISTINCT parameter FROM presentation.daily_air_quality_stats ORDER BY parameter"
+    )]
+    start_date, end_date = query_cache.fetchall(
+        "SELECT MIN(measurement_date), MAX(measurement_date) FROM presentation.daily_air_quality_stats"
+    )[0]  # Set the start and end date based on available data
 
-    # Prepare location dropdown options
+    # Prepare location dropdown options, selecting by ID so queries filter on the tables' sort key
     location_options = [
-        {"label": location, "value": location} for location in df["location"].unique()
+        {"label": location, "value": location_id} for location_id, location in locations
     ]
     # Prepare parameter dropdown options
     parameter_options = [
-        {"label": parameter, "value": parameter}
-        for parameter in df["parameter"].unique()
+        {"label": parameter, "value": parameter} for parameter in parameters
     ]
-    # Set the start and end date based on available data
-    start_date = df["measurement_date"].min()
-    end_date = df["measurement_date"].max()
 
     return (
         location_options,  # Set location options
-        df["location"].unique()[0],  # Default location selection
+        locations[0][0],  # Default location selection
         parameter_options,  # Set parameter options
-        df["parameter"].unique()[0],  # Default parameter selection
+        parameters[0],  # Default parameter selection
         start_date,  # Start date for the date picker
         end_date,  # End date for the date picker
     )
 
-# Callback to update the plots (line plot and box plot)
+# Callback to load the rollups of the selected location and parameter into the browser
 @app.callback(
-    [Output("line-plot", "figure"), Output("box-plot", "figure")],
+    Output("series-store", "data"),
     [
         Input("location-dropdown", "value"),
-        Input("parameter-dropdown", "value"),
-        Input("date-picker-range", "start_date"),
-        Input("date-picker-range", "end_date")
-    ]  # Triggered when user selects location, parameter, or date range
+        Input("parameter-dropdown", "value")
+    ]  # Triggered when user selects location or parameter; date range changes are handled in the browser
 )
-def update_plots(selected_location, selected_parameter, start_date, end_date):
-    with duckdb.connect("../air_quality.db", read_only=True) as db_connection:
-        daily_stats_df = db_connection.execute(
-            "SELECT * FROM presentation.daily_air_quality_stats"
-        ).fetchdf()  # Fetch daily air quality stats for the selected parameter and location
-
-    # Filter the data based on the selected location, parameter, and date range
-    filtered_df = daily_stats_df[daily_stats_df["location"] == selected_location]
-    filtered_df = filtered_df[filtered_df["parameter"] == selected_parameter]
-    filtered_df = filtered_df[
-        (filtered_df["measurement_date"] >= pd.to_datetime(start_date))
-        & (filtered_df["measurement_date"] <= pd.to_datetime(end_date))
-    ]
+def load_series(selected_location, selected_parameter):
+    if selected_location is None or selected_parameter is None:
+        raise PreventUpdate
 
-    # Label for the plot
-    labels = {
-        "average_value": filtered_df["units"].unique()[0],
-        "measurement_date": "Date"
+    # Fetch the whole history of the rollups the line plot can use once the series is loaded
+    rollups = {
+        resolution: fetch_rollups(resolution, selected_location, selected_parameter)
+        for resolution in STORED_RESOLUTIONS
     }
 
-    # Create a line plot for parameter values over time
-    line_fig = px.line(
-        filtered_df.sort_values(by="measurement_date"),
-        x="measurement_date",
-        y="average_value",
-        labels=labels,
-        title=f"Plot Over Time of {selected_parameter} Levels"
+    # Units of the selected parameter, used as axis label; a location that never reported it gets empty plots
+    units_rows = query_cache.fetchall(
+        """
+        SELECT units
+        FROM presentation.daily_air_quality_stats
+        WHERE location_id = ?
+        AND parameter = ?
+        LIMIT 1
+        """,
+        [selected_location, selected_parameter],
     )
+    units = units_rows[0][0] if units_rows else None
 
-    # Create a box plot for distribution of parameter values by weekday
-    box_fig = px.box(
-        filtered_df.sort_values(by="weekday_number"),
-        x="weekday",
-        y="average_value",
-        labels=labels,
-        title=f"Distribution of {selected_parameter} Levels by Weekday"
+    # Fetch the weekday summaries of every year, which the box plot merges for the years in the date range
+    summaries = query_cache.fetchnumpy(
+        """
+        SELECT
+            year_start,
+            weekday_number,
+            day_count,
+            min_value,
+            max_value,
+            average_value,
+            len(centroids) AS centroid_count
+        FROM presentation.weekday_summaries
+        WHERE location_id = ?
+        AND parameter = ?
+        ORDER BY year_start, weekday_number
+        """,
+        [selected_location, selected_parameter],
+    )
+    centroids = query_cache.fetchnumpy(
+        """
+        SELECT centroid.mean AS centroid_mean, centroid.weight AS centroid_weight
+        FROM (
+            SELECT year_start, weekday_number, unnest(centroids) AS centroid, generate_subscripts(centroids, 1) AS position
+            FROM presentation.weekday_summaries
+            WHERE location_id = ?
+            AND parameter = ?
+        )
+        ORDER BY year_start, weekday_number, position
+        """,
+        [selected_location, selected_parameter],
     )
 
-    return line_fig, box_fig  # Return the generated plots
+    # Send the series as compressed binary columns; assets/series_store.js filters and plots them
+    return {
+        "location": selected_location,
+        "parameter": selected_parameter,
+        "units": units,
+        "rollups": {resolution: encode_rollups([columns], "D") for resolution, columns in rollups.items()},
+        "summaries": encode_columns({
+            "year": summaries["year_start"].astype("datetime64[D]").astype("<i4"),  # Days since 1970-01-01
+            "weekday": summaries["weekday_number"].astype("<i4"),
+            "day_count": summaries["day_count"].astype("<i4"),
+            "min_value": summaries["min_value"].astype("<f4"),
+            "max_value": summaries["max_value"].astype("<f4"),
+            "average_value": summaries["average_value"].astype("<f4"),
+            "centroid_count": summaries["centroid_count"].astype("<i4"),
+        }),
+        "centroids": encode_columns({
+            "mean": centroids["centroid_mean"].astype("<f4"),
+            "weight": centroids["centroid_weight"].astype("<i4"),
+        }),
+    }
+
+# Callback to request the rollups a date range needs beyond the stored ones, decided in the browser
+app.clientside_callback(
+    ClientsideFunction(namespace="series_store", function_name="request_window"),
+    Output("window-request", "data"),
+    [
+        Input("series-store", "data"),
+        Input("date-picker-range", "start_date"),
+        Input("date-picker-range", "end_date")
+    ],  # Triggered when the series is loaded or user selects a date range
+    State("window-request", "data")  # The rollups requested last, reused while they cover the date range
+)
+
+# Callback to load the requested rollups into the browser
+@app.callback(
+    Output("window-store", "data"),
+    Input("window-request", "data")  # Triggered only when the date range needs rollups not loaded yet
+)
+def load_window(request):
+    if request is None:
+        raise PreventUpdate
+
+    # Fetch the rollups month by month and year by year, so each is cached on its own
+    location_id, parameter = request["location"], request["parameter"]
+    return {
+        "request": request,  # Sent back so the browser knows what the rollups cover
+        "rollups": {
+            "hour": encode_rollups(fetch_calendar_rollups("hour", location_id, parameter, request["hour_months"], "M"), "h"),
+            "day": encode_rollups(fetch_calendar_rollups("day", location_id, parameter, request["day_years"], "Y"), "D"),
+        },
+    }
+
+# Callback to update the plots (line plot and box plot) in the browser
+app.clientside_callback(
+    ClientsideFunction(namespace="series_store", function_name="update_plots"),
+    [Output("line-plot", "figure"), Output("box-plot", "figure")],
+    [
+        Input("series-store", "data"),
+        Input("window-store", "data"),
+        Input("date-picker-range", "start_date"),
+        Input("date-picker-range", "end_date")
+    ],  # Triggered when rollups are loaded or user selects a date range
+    [State("line-plot", "figure"), State("box-plot", "figure")]  # For the template of the empty figures
+)
 
 # Run the Dash app
 if __name__ == "__main__":
@@ -0,0 +1,364 @@
+// Draw the parameter plots in the browser from the rollups held in the 'series-store' dcc.Store.
+// The server only sends them when the location or parameter changes; date range changes are
+// filtered and plotted here. Hourly and daily rollups would make the store grow with the length of the history,
+// so they are requested per month or year in the 'window-request' store, only for the date ranges that need them.
+
+// Rollup resolution used for the line plot, by the longest date span in days it is used for
+const LINE_PLOT_RESOLUTIONS = [
+    [14, "hour"],
+    [730, "day"],
+    [3650, "week"],
+];
+const LINE_PLOT_COARSEST_RESOLUTION = "month";
+const RESOLUTION_LABELS = {hour: "Hourly", day: "Daily", week: "Weekly", month: "Monthly"};
+
+// Rollup periods per day by resolution; hourly periods are counted in hours, the others in days
+const PERIODS_PER_DAY = {hour: 24, day: 1, week: 1, month: 1};
+
+// Maximum number of points drawn in the line plot
+const LINE_PLOT_MAX_POINTS = 1000;
+
+// Weekday names by DuckDB's dayofweek number (Sunday is 0)
+const WEEKDAYS = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"];
+
+const MS_PER_DAY = 86400000;
+const TYPED_ARRAYS = {Int32Array, Float32Array, Float64Array};
+
+// Decoded columns by the stored columns object, so the rollups and summaries are only decoded once
+const decodedSeries = new WeakMap();
+
+// Function to decode a column encoded by series_store.encode_columns
+async function decodeColumn(column) {
+    const bytes = Uint8Array.from(atob(column.data), (character) => character.charCodeAt(0));
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("deflate"));
+    const buffer = await new Response(stream).arrayBuffer();
+    return new TYPED_ARRAYS[column.type](buffer);
+}
+
+// Function to decode all columns of a stored object, reusing earlier decodes
+async function decodeSeries(columns) {
+    if (!decodedSeries.has(columns)) {
+        const names = Object.keys(columns);
+        const arrays = await Promise.all(names.map((name) => decodeColumn(columns[name])));
+        decodedSeries.set(columns, Object.fromEntries(names.map((name, i) => [name, arrays[i]])));
+    }
+    return decodedSeries.get(columns);
+}
+
+// Function to convert a date picker value to days since 1970-01-01
+function toDay(date) {
+    return Math.floor(Date.parse(date.slice(0, 10)) / MS_PER_DAY);
+}
+
+// Function to format a rollup period as a date, or as a date and time for hourly periods
+function formatPeriod(period, resolution) {
+    const timestamp = new Date(period * MS_PER_DAY / PERIODS_PER_DAY[resolution]).toISOString();
+    return resolution === "hour" ? timestamp.slice(0, 19).replace("T", " ") : timestamp.slice(0, 10);
+}
+
+// Function to find the first index of a sorted array holding a value of at least `value`
+function lowerBound(values, value) {
+    let low = 0;
+    let high = values.length;
+    while (low < high) {
+        const middle = (low + high) >>> 1;
+        if (values[middle] < value) {
+            low = middle + 1;
+        } else {
+            high = middle;
+        }
+    }
+    return low;
+}
+
+// Function to choose the rollup resolution for a date range
+function selectResolution(spanDays) {
+    for (const [maxSpan, resolution] of LINE_PLOT_RESOLUTIONS) {
+        if (spanDays <= maxSpan) {
+            return resolution;
+        }
+    }
+    return LINE_PLOT_COARSEST_RESOLUTION;
+}
+
+// Function to find the first day of the month of a day
+function monthStart(day) {
+    const date = new Date(day * MS_PER_DAY);
+    return Date.UTC(date.getUTCFullYear(), date.getUTCMonth(), 1) / MS_PER_DAY;
+}
+
+// Function to find the first day of the month after the month of a day
+function nextMonthStart(day) {
+    const date = new Date(day * MS_PER_DAY);
+    return Date.UTC(date.getUTCFullYear(), date.getUTCMonth() + 1, 1) / MS_PER_DAY;
+}
+
+// Function to find the first day of the year of a day
+function yearStart(day) {
+    return Date.UTC(new Date(day * MS_PER_DAY).getUTCFullYear(), 0, 1) / MS_PER_DAY;
+}
+
+// Function to find the first day of the year after the year of a day
+function nextYearStart(day) {
+    return Date.UTC(new Date(day * MS_PER_DAY).getUTCFullYear() + 1, 0, 1) / MS_PER_DAY;
+}
+
+// Function to list the rollups a date range needs from the server, beyond those in the series store: the hourly
+// rollups of the months of a range plotted hourly, and the daily rollups of the years of a range plotted daily,
+// or else of the years at its ends that it covers only partly, whose days the box plot adds to the summaries
+function windowRequest(store, startDay, endDay) {
+    const request = {location: store.location, parameter: store.parameter, hour_months: [], day_years: []};
+    const resolution = selectResolution(endDay - startDay);
+    if (resolution === "hour") {
+        for (let month = monthStart(startDay); month <= endDay; month = nextMonthStart(month)) {
+            request.hour_months.push(month);
+        }
+    }
+    for (let year = yearStart(startDay); year <= endDay; year = nextYearStart(year)) {
+        const partlyCovered = year < startDay || nextYearStart(year) > endDay + 1;
+        if (resolution === "hour" || resolution === "day" || partlyCovered) {
+            request.day_years.push(year);
+        }
+    }
+    return request;
+}
+
+// Function to check whether a request needs any rollups from the server
+function windowNeeded(request) {
+    return request.hour_months.length > 0 || request.day_years.length > 0;
+}
+
+// Function to check whether loaded window rollups hold everything a request needs
+function windowCovers(loaded, request) {
+    return Boolean(loaded)
+        && loaded.location === request.location
+        && loaded.parameter === request.parameter
+        && request.hour_months.every((month) => loaded.hour_months.includes(month))
+        && request.day_years.every((year) => loaded.day_years.includes(year));
+}
+
+// Function to pick the points of a series that best preserve its shape, with the Largest-Triangle-Three-Buckets
+// algorithm: the first and last points are kept, and from each bucket of points in between the one forming the
+// largest triangle with the previously kept point and the average of the next bucket, so peaks and dips survive
+function lttbIndices(x, y, threshold) {
+    const length = x.length;
+    if (threshold >= length || threshold < 3) {
+        return x.map((_, i) => i);
+    }
+
+    const indices = [0];
+    let previous = 0;
+    for (let bucket = 0; bucket < threshold - 2; bucket++) {
+        const start = Math.floor(1 + bucket * (length - 2) / (threshold - 2));
+        const end = Math.floor(1 + (bucket + 1) * (length - 2) / (threshold - 2));
+        const nextEnd = bucket + 2 < threshold - 1
+            ? Math.floor(1 + (bucket + 2) * (length - 2) / (threshold - 2))
+            : length;
+
+        // Average point of the next bucket (the last point for the final bucket)
+        let averageX = 0;
+        let averageY = 0;
+        for (let i = end; i < nextEnd; i++) {
+            averageX += x[i];
+            averageY += y[i];
+        }
+        averageX /= nextEnd - end;
+        averageY /= nextEnd - end;
+
+        // Keep the point forming the largest triangle with its neighbours
+        let largestArea = -1;
+        let kept = start;
+        for (let i = start; i < end; i++) {
+            const area = Math.abs(
+                (x[previous] - averageX) * (y[i] - y[previous])
+                - (x[previous] - x[i]) * (averageY - y[previous])
+            );
+            if (area > largestArea) {
+                largestArea = area;
+                kept = i;
+            }
+        }
+        indices.push(kept);
+        previous = kept;
+    }
+    indices.push(length - 1);
+    return indices;
+}
+
+// Function to merge the weekday summaries of a date range. The years the range covers entirely are read from the
+// stored yearly summaries, and the days of the years it covers partly are added from the daily rollups.
+function mergeWeekdaySummaries(daily, summaries, centroids, startDay, endDay, start, end) {
+    const merged = WEEKDAYS.map(() => ({count: 0, total: 0, min: Infinity, max: -Infinity, centroids: []}));
+    const firstYear = yearStart(startDay) === startDay ? startDay : nextYearStart(startDay);
+    const endYear = yearStart(endDay + 1);  // Years from here on end after the range
+
+    // Summaries of the years within the range, adding the counts, weighting the means and concatenating the centroids
+    let offset = 0;
+    for (let i = 0; i < summaries.year.length; i++) {
+        const centroidCount = summaries.centroid_count[i];
+        if (summaries.year[i] >= firstYear && summaries.year[i] < endYear) {
+            const summary = merged[summaries.weekday[i]];
+            summary.count += summaries.day_count[i];
+            summary.total += summaries.average_value[i] * summaries.day_count[i];
+            summary.min = Math.min(summary.min, summaries.min_value[i]);
+            summary.max = Math.max(summary.max, summaries.max_value[i]);
+            for (let j = offset; j < offset + centroidCount; j++) {
+                summary.centroids.push([centroids.mean[j], centroids.weight[j]]);
+            }
+        }
+        offset += centroidCount;
+    }
+
+    // Days of the years at the ends of the range, each a centroid of its own
+    for (let i = start; i < end; i++) {
+        const day = daily.period[i];
+        if (day >= firstYear && day < endYear) {
+            continue;
+        }
+        const summary = merged[(((day + 4) % 7) + 7) % 7];  // 1970-01-01 was a Thursday
+        const value = daily.average_value[i];
+        summary.count += 1;
+        summary.total += value;
+        summary.min = Math.min(summary.min, value);
+        summary.max = Math.max(summary.max, value);
+        summary.centroids.push([value, 1]);
+    }
+    return merged;
+}
+
+// Function to estimate a quantile from centroids sorted by mean, interpolating linearly between their centers
+// like Plotly's default quartile method does between sorted values
+function centroidQuantile(centroids, count, quantile) {
+    const rank = quantile * (count - 1);
+    let cumulative = 0;
+    let previousCenter = null;
+    let previousMean = null;
+    for (const [mean, weight] of centroids) {
+        const center = cumulative + (weight - 1) / 2;  // Rank of the centroid's middle value
+        if (rank <= center) {
+            if (previousCenter === null) {
+                return mean;
+            }
+            return previousMean + (mean - previousMean) * (rank - previousCenter) / (center - previousCenter);
+        }
+        previousCenter = center;
+        previousMean = mean;
+        cumulative += weight;
+    }
+    return previousMean;
+}
+
+// Function to compute the box plot statistics of every weekday with values, ordered by weekday number, with the
+// points beyond the whiskers as each box's sample points
+function weekdayBoxStatistics(merged) {
+    const statistics = {x: [], y: [], q1: [], median: [], q3: [], lowerfence: [], upperfence: [], mean: []};
+    merged.forEach((summary, weekday) => {
+        if (summary.count === 0) {
+            return;
+        }
+        const sorted = summary.centroids.sort((a, b) => a[0] - b[0]);
+        const q1 = centroidQuantile(sorted, summary.count, 0.25);
+        const q3 = centroidQuantile(sorted, summary.count, 0.75);
+
+        // Whiskers end at the most extreme values within 1.5 times the interquartile range, as Plotly draws them;
+        // the values beyond are the sketch's single-value tail centroids (or centroid means, for few summaries)
+        const lowestInside = q1 - 1.5 * (q3 - q1);
+        const highestInside = q3 + 1.5 * (q3 - q1);
+        const inside = sorted.filter(([mean]) => mean >= lowestInside && mean <= highestInside);
+        statistics.x.push(WEEKDAYS[weekday]);
+        statistics.y.push(sorted.filter(([mean]) => mean < lowestInside || mean > highestInside).map(([mean]) => mean));
+        statistics.q1.push(q1);
+        statistics.median.push(centroidQuantile(sorted, summary.count, 0.5));
+        statistics.q3.push(q3);
+        statistics.lowerfence.push(summary.min >= lowestInside ? summary.min : (inside.length ? inside[0][0] : q1));
+        statistics.upperfence.push(
+            summary.max <= highestInside ? summary.max : (inside.length ? inside[inside.length - 1][0] : q3)
+        );
+        statistics.mean.push(summary.total / summary.count);
+    });
+    return statistics;
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    series_store: {
+        // Callback to request the window rollups a date range needs, only when the loaded ones lack some
+        request_window: function (store, startDate, endDate, loadedRequest) {
+            if (!store || !startDate || !endDate) {
+                return window.dash_clientside.no_update;
+            }
+            const request = windowRequest(store, toDay(startDate), toDay(endDate));
+            if (!windowNeeded(request) || windowCovers(loadedRequest, request)) {
+                return window.dash_clientside.no_update;
+            }
+            return request;
+        },
+
+        // Callback to update the plots (line plot and box plot) from the stored rollups and summaries
+        update_plots: async function (store, windowStore, startDate, endDate, lineFigure, boxFigure) {
+            if (!store || !startDate || !endDate) {
+                return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+            }
+            const startDay = toDay(startDate);
+            const endDay = toDay(endDate);
+
+            // Wait for the window rollups of the date range when it needs some
+            const request = windowRequest(store, startDay, endDay);
+            const loaded = windowStore ? windowStore.request : null;
+            if (windowNeeded(request) && !windowCovers(loaded, request)) {
+                return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+            }
+
+            // Select the periods of the date range at a resolution suited to it, then downsample
+            const resolution = selectResolution(endDay - startDay);
+            const rollups = await decodeSeries(
+                resolution in store.rollups ? store.rollups[resolution] : windowStore.rollups[resolution]
+            );
+            const perDay = PERIODS_PER_DAY[resolution];
+            const first = lowerBound(rollups.period, startDay * perDay);
+            const periods = rollups.period.subarray(first, lowerBound(rollups.period, (endDay + 1) * perDay));
+            const averages = rollups.average_value.subarray(first, first + periods.length);
+            const kept = lttbIndices(Array.from(periods), Array.from(averages), LINE_PLOT_MAX_POINTS);
+
+            // Merge the weekday summaries of the date range into the statistics the box plot is drawn from
+            const [daily, summaries, centroids] = await Promise.all([
+                windowNeeded(request) ? decodeSeries(windowStore.rollups.day) : {period: [], average_value: []},
+                decodeSeries(store.summaries),
+                decodeSeries(store.centroids),
+            ]);
+            const start = lowerBound(daily.period, startDay);
+            const end = lowerBound(daily.period, endDay + 1);
+            const box = weekdayBoxStatistics(
+                mergeWeekdaySummaries(daily, summaries, centroids, startDay, endDay, start, end)
+            );
+
+            // Keep the template the server rendered the empty figures with
+            const lineTemplate = lineFigure && lineFigure.layout ? lineFigure.layout.template : undefined;
+            const boxTemplate = boxFigure && boxFigure.layout ? boxFigure.layout.template : undefined;
+            return [
+                {
+                    data: [{
+                        type: "scatter",
+                        x: kept.map((i) => formatPeriod(periods[i], resolution)),
+                        y: kept.map((i) => averages[i]),
+                        mode: "lines",
+                    }],
+                    layout: {
+                        template: lineTemplate,
+                        title: {text: `Plot Over Time of ${store.parameter} Levels (${RESOLUTION_LABELS[resolution]} Averages)`},
+                        xaxis: {title: {text: "Date"}},
+                        yaxis: {title: {text: store.units}},
+                    },
+                },
+                {
+                    data: [{type: "box", boxmean: true, boxpoints: "outliers", ...box}],
+                    layout: {
+                        template: boxTemplate,
+                        title: {text: `Distribution of ${store.parameter} Levels by Weekday`},
+                        xaxis: {title: {text: "weekday"}},
+                        yaxis: {title: {text: store.units}},
+                    },
+                },
+            ];
+        },
+    },
+});
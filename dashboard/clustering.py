@@ -0,0 +1,42 @@
+# Import necessary modules
+import math  # For the map scale at a zoom level
+from typing import Optional  # For type hinting
+
+# Width in pixels of a map tile, the unit of the web map zoom levels
+TILE_SIZE = 256
+
+
+# Function to compute the size of the clustering grid at a zoom level
+def grid_cell_degrees(zoom: float, cell_pixels: int = 60) -> float:
+    """
+    Size in degrees of the grid cells markers are clustered in, so a cell
+    spans about `cell_pixels` pixels on screen at the given zoom level.
+
+    The zoom level is rounded down, so all views between two zoom levels share
+    a grid and their cluster queries hit the same cached result.
+
+    Args:
+        zoom (float): Map zoom level.
+        cell_pixels (int): Width of a cell on screen in pixels.
+
+    Returns:
+        float: The cell size in degrees of longitude (and latitude).
+    """
+    return 360.0 * cell_pixels / (TILE_SIZE * 2 ** math.floor(max(zoom, 0.0)))
+
+
+# Function to read the zoom level from the map's relayout data
+def read_map_zoom(relayout_data: Optional[dict], default: float) -> float:
+    """
+    Read the zoom level the user panned or zoomed the map to.
+
+    Args:
+        relayout_data (Optional[dict]): The `relayoutData` property of the map graph.
+        default (float): Zoom level to use before the user changed the view.
+
+    Returns:
+        float: The current zoom level.
+    """
+    if not relayout_data:
+        return default
+    return float(relayout_data.get("mapbox.zoom", default))
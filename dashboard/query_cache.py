@@ -0,0 +1,255 @@
+# Import necessary modules
+import os  # For checking the pipeline's writer marker file
+import threading  # For sharing the connection and cache between callbacks
+import time  # For waiting on the pipeline's lock on the database file
+from collections import OrderedDict  # For least recently used eviction
+from contextlib import contextmanager  # For handing out cursors
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Sequence, Tuple  # For type hinting
+
+import duckdb  # DuckDB library
+import numpy as np  # For query results as column arrays
+
+
+# Suffix of the marker file the pipeline keeps fresh while it waits for the database (see database_manager.py)
+WRITER_WAITING_SUFFIX = ".writer-waiting"
+
+# Age in seconds after which a marker is left over from a writer that stopped waiting without removing it
+WRITER_WAITING_MAX_AGE = 5.0
+
+# Interval in seconds at which an idle connection checks for a waiting writer
+WRITER_POLL_INTERVAL = 0.05
+
+# Query reading the version of the data from the pipeline's small bookkeeping tables, which every write updates
+DATA_VERSION_QUERY = """
+    SELECT
+        (SELECT MAX(ingestion_datetime) FROM raw.ingestion_manifest),              -- Ingested files
+        (SELECT COUNT(*) FROM raw.ingestion_manifest),                             -- Files ingested in the same second
+        (SELECT MAX(refreshed_datetime) FROM presentation.transformation_state),   -- Refreshed tables
+        (SELECT MAX(run_id) FROM quality.check_runs)                               -- Quarantined records
+"""
+
+
+class ConnectionPool:
+    """
+    Read-only connection to the DuckDB database, shared by concurrent requests.
+
+    Requests share one connection, each with its own cursor, and the
+    connection stays open for `idle_timeout` seconds after the last request
+    so that following requests do not reopen the database and reload its
+    catalog. Even a read-only connection locks the database file against the
+    pipeline's writers, so it is closed as soon as no request runs while a
+    writer waits for the file, which the writer signals with a marker file.
+    Opening waits up to `lock_timeout` seconds for a writer to release the file.
+    """
+
+    def __init__(self, database_path: str, idle_timeout: float = 5.0, lock_timeout: float = 10.0):
+        self.database_path = database_path
+        self.idle_timeout = idle_timeout
+        self.lock_timeout = lock_timeout
+        self._lock = threading.Lock()
+        self._connection: Optional[duckdb.DuckDBPyConnection] = None
+        self._active = 0  # Number of cursors currently handed out
+        self._idle_since = 0  # Number of times the connection became idle, to tell idle periods apart
+
+    @contextmanager
+    def cursor(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """
+        Hand out a cursor on the shared connection, opening it if needed.
+
+        Yields:
+            DuckDBPyConnection: A cursor to run the request's queries on.
+        """
+        with self._lock:
+            if self._connection is not None and self._active == 0 and self.writer_waiting():
+                self._close()  # Let the waiting writer have the file first
+            if self._connection is None:
+                self._connection = self._connect()
+            self._active += 1
+            cursor = self._connection.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            with self._lock:
+                self._active -= 1
+                if self._active == 0:
+                    if self.writer_waiting():
+                        self._close()
+                    else:
+                        self._idle_since += 1
+                        threading.Thread(target=self._close_when_idle, args=(self._idle_since,), daemon=True).start()
+
+    def writer_waiting(self) -> bool:
+        """
+        Check whether a pipeline writer is waiting for the database file.
+
+        Returns:
+            bool: True if a fresh writer marker exists.
+        """
+        try:
+            age = time.time() - os.stat(f"{self.database_path}{WRITER_WAITING_SUFFIX}").st_mtime
+        except FileNotFoundError:
+            return False
+        return age < WRITER_WAITING_MAX_AGE
+
+    def close(self) -> None:
+        """
+        Close the shared connection now, it is reopened by the next request.
+        """
+        with self._lock:
+            self._close()
+
+    def _close(self) -> None:
+        """
+        Close the shared connection, with the lock held.
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _close_when_idle(self, idle_since: int) -> None:
+        """
+        Close the connection once it has been idle for `idle_timeout` seconds,
+        or as soon as a writer waits for the file.
+
+        Args:
+            idle_since (int): The idle period this check belongs to.
+        """
+        deadline = time.monotonic() + self.idle_timeout
+        while time.monotonic() < deadline and not self.writer_waiting():
+            time.sleep(WRITER_POLL_INTERVAL)
+        with self._lock:
+            # A request that ran meanwhile started a new idle period, or is still running
+            if self._active == 0 and self._idle_since == idle_since:
+                self._close()
+
+    def _connect(self) -> duckdb.DuckDBPyConnection:
+        """
+        Open the database read-only, retrying while a writer holds the file lock
+        or waits for it.
+
+        Returns:
+            DuckDBPyConnection: The new connection.
+        """
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.05
+        while True:
+            if self.writer_waiting() and time.monotonic() + delay <= deadline:
+                time.sleep(delay)  # Do not take the file from under a waiting writer
+                continue
+            try:
+                return duckdb.connect(self.database_path, read_only=True)
+            except duckdb.IOException as e:
+                if "Could not set lock" not in str(e) or time.monotonic() + delay > deadline:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 1.0)
+
+
+class QueryCache:
+    """
+    Least recently used cache of query results, bounded by the number of entries.
+
+    The cache is cleared as soon as the version of the data changes, so results
+    are served from memory until the pipeline writes new data. The version is
+    read from the pipeline's bookkeeping tables at most every `version_ttl`
+    seconds, so new data shows up within that delay.
+    """
+
+    def __init__(self, pool: ConnectionPool, max_entries: int = 256, version_ttl: float = 1.0):
+        self.pool = pool
+        self.max_entries = max_entries
+        self.version_ttl = version_ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._version: Optional[Tuple] = None
+        self._version_read = float("-inf")  # Monotonic time the version was last read
+
+    def _read_version(self) -> Optional[Tuple]:
+        """
+        Return the version of the data, reading it again once it is older than `version_ttl`.
+
+        Returns:
+            Optional[Tuple]: The watermarks of the pipeline's writes.
+        """
+        with self._lock:
+            if time.monotonic() - self._version_read < self.version_ttl:
+                return self._version
+        with self.pool.cursor() as cursor:
+            version = cursor.execute(DATA_VERSION_QUERY).fetchone()
+        with self._lock:
+            self._version_read = time.monotonic()
+        return version
+
+    def _get(self, key: Hashable, run: Callable[[duckdb.DuckDBPyConnection], Any]) -> Any:
+        """
+        Return the cached result for a key, running the query on a miss.
+
+        Args:
+            key (Hashable): Cache key of the query.
+            run (Callable): Function running the query on a cursor.
+
+        Returns:
+            Any: The query result.
+        """
+        version = self._read_version()
+        with self._lock:
+            # Drop every result computed from an older version of the data
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        with self.pool.cursor() as cursor:
+            result = run(cursor)
+
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = result
+                # Evict the least recently used results
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        """
+        Drop every cached result.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def fetchnumpy(self, query: str, parameters: Sequence = ()) -> Dict[str, np.ndarray]:
+        """
+        Run a query and return its result as one NumPy array per column, without
+        building a DataFrame. The arrays are shared between requests and must
+        not be modified in place.
+
+        Args:
+            query (str): The SQL query to run.
+            parameters (Sequence): Values for the query's placeholders.
+
+        Returns:
+            Dict[str, np.ndarray]: The query result by column name.
+        """
+        return self._get(
+            ("fetchnumpy", query, tuple(parameters)),
+            lambda cursor: cursor.execute(query, list(parameters)).fetchnumpy(),
+        )
+
+    def fetchall(self, query: str, parameters: Sequence = ()) -> list:
+        """
+        Run a query and return its rows.
+
+        Args:
+            query (str): The SQL query to run.
+            parameters (Sequence): Values for the query's placeholders.
+
+        Returns:
+            list: The rows of the query result.
+        """
+        return self._get(
+            ("fetchall", query, tuple(parameters)),
+            lambda cursor: cursor.execute(query, list(parameters)).fetchall(),
+        )
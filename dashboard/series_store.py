@@ -0,0 +1,40 @@
+# Import necessary modules
+import base64  # For sending binary columns as JSON strings
+import zlib  # For compressing the columns
+from typing import Dict  # For type hinting
+
+import numpy as np  # For query results as column arrays
+
+
+# Function to pack column arrays for a dcc.Store
+def encode_columns(columns: Dict[str, np.ndarray]) -> Dict[str, Dict[str, str]]:
+    """
+    Encode column arrays as compressed little-endian binary, so a series of
+    thousands of values is stored and sent as a few kilobytes instead of a
+    JSON list of numbers.
+
+    Each column becomes its zlib-compressed bytes in base64, with the name of
+    the JavaScript typed array to read them into. `assets/series_store.js`
+    decodes them in the browser.
+
+    Args:
+        columns (Dict[str, np.ndarray]): Numeric column arrays.
+
+    Returns:
+        Dict[str, Dict[str, str]]: The encoded columns by name.
+    """
+    typed_arrays = {
+        np.dtype("<i4"): "Int32Array",
+        np.dtype("<f4"): "Float32Array",
+        np.dtype("<f8"): "Float64Array",
+    }
+    encoded = {}
+    for name, values in columns.items():
+        values = np.ascontiguousarray(values)
+        if values.dtype not in typed_arrays:
+            raise ValueError(f"Column {name} has unsupported type {values.dtype}")
+        encoded[name] = {
+            "type": typed_arrays[values.dtype],
+            "data": base64.b64encode(zlib.compress(values.tobytes(), 6)).decode("ascii"),
+        }
+    return encoded
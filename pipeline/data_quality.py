@@ -0,0 +1,253 @@
+# Import required modules
+import argparse  # For parsing command-line arguments
+import logging  # For logging information and errors
+from datetime import datetime  # For working with date and time
+from typing import List, Optional, Tuple  # For type hinting
+
+from duckdb import DuckDBPyConnection  # Type for DuckDB connection
+from jinja2 import Template  # For templating the check queries
+
+# Importing utility functions from the database_manager module
+from database_manager import (
+    connect_to_database,  # Function to establish a connection to the database
+    close_database_connection,  # Function to close the database connection
+    execute_query,  # Function to execute a SQL query
+    enable_query_profiling,  # Function to record every executed statement
+    disable_query_profiling,  # Function to summarize and export the recorded statements
+    read_query,  # Function to read a SQL query from a file
+    add_profiling_arguments,  # Function to add the query profiling CLI arguments
+    add_resource_arguments,  # Function to add the resource limit CLI arguments
+    read_resource_settings,  # Function to read the resource limits from the arguments
+)
+
+
+# Function to find how far the raw data has been checked
+def read_quality_watermark(con: DuckDBPyConnection) -> Optional[datetime]:
+    """
+    Read the latest raw ingestion timestamp checked by an earlier run.
+
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+
+    Returns:
+        Optional[datetime]: The watermark of the last run, or None if no run has finished yet.
+    """
+    return con.execute("SELECT MAX(watermark) FROM quality.check_runs").fetchone()[0]
+
+
+# Function to describe the records ingested since the last run
+def read_batch_bounds(
+    con: DuckDBPyConnection, previous_watermark: Optional[datetime]
+) -> Tuple[int, Optional[datetime], Optional[datetime], Optional[datetime]]:
+    """
+    Read the size, latest ingestion timestamp and measurement time range of the
+    records ingested after the previous watermark.
+
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        previous_watermark (Optional[datetime]): Watermark of the last run, None to check everything.
+
+    Returns:
+        Tuple[int, Optional[datetime], Optional[datetime], Optional[datetime]]: The record count,
+            the latest ingestion_datetime and the earliest and latest datetime.
+    """
+    return con.execute(
+        """
+        SELECT COUNT(*), MAX(ingestion_datetime), MIN("datetime"), MAX("datetime")
+        FROM raw.air_quality
+        WHERE ingestion_datetime > COALESCE(?, TIMESTAMP '-infinity')
+        """,
+        [previous_watermark],
+    ).fetchone()
+
+
+# Function to log the outcome of a run
+def log_check_results(con: DuckDBPyConnection, run_id: int) -> None:
+    """
+    Log the number of checked and quarantined records and the failures per check.
+
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        run_id (int): The run to summarize.
+    """
+    record_count, quarantined_count = con.execute(
+        "SELECT record_count, quarantined_count FROM quality.check_runs WHERE run_id = ?", [run_id]
+    ).fetchone()
+    logging.info(f"Checked {record_count} records, quarantined {quarantined_count}")
+    for check_name, failed_count in con.execute(
+        """
+        SELECT check_name, SUM(failed_count)
+        FROM quality.check_results
+        WHERE run_id = ?
+        GROUP BY check_name
+        ORDER BY check_name
+        """,
+        [run_id],
+    ).fetchall():
+        logging.info(f"Check {check_name}: {failed_count} failures")
+
+
+# Function to check the records ingested since the last run
+def run_quality_checks(
+    con: DuckDBPyConnection,
+    check_query_template: Template,
+    outlier_threshold: float = 6.0,
+    min_value_count: int = 30,
+    max_gap_hours: int = 3,
+    tag: Optional[str] = None,
+) -> Optional[int]:
+    """
+    Run the checks on the records ingested since the previous run, in a single transaction.
+
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        check_query_template (Template): Compiled template of the check queries.
+        outlier_threshold (float): Standard deviations from the mean beyond which a value is an outlier.
+        min_value_count (int): Valid values needed before outliers are flagged.
+        max_gap_hours (int): Longest time between measurements of a sensor that is not a gap.
+        tag (Optional[str]): Tag of the executed statements.
+
+    Returns:
+        Optional[int]: The ID of the run, or None if no records were ingested since the last run.
+    """
+    con.begin()
+    previous_watermark = read_quality_watermark(con)
+    record_count, watermark, batch_start, batch_end = read_batch_bounds(con, previous_watermark)
+    if record_count == 0:
+        logging.info("No records were ingested since the last check")
+        con.rollback()
+        return None
+
+    run_id = con.execute("SELECT COALESCE(MAX(run_id), 0) + 1 FROM quality.check_runs").fetchone()[0]
+    logging.info(f"Checking {record_count} records ingested after {previous_watermark} (run {run_id})")
+    query = check_query_template.render(
+        run_id=run_id,
+        previous_watermark=previous_watermark,
+        watermark=watermark,
+        batch_start=batch_start,
+        batch_end=batch_end,
+        outlier_threshold=float(outlier_threshold),
+        min_value_count=int(min_value_count),
+        max_gap_hours=int(max_gap_hours),
+    )
+    execute_query(con, query, tag=tag)
+    con.commit()
+    log_check_results(con, run_id)
+    return run_id
+
+
+# Main function to check the newly ingested data
+def check_data_quality(args) -> None:
+    """
+    Check the records ingested since the previous run.
+
+    All checks run as a handful of set-based statements in a single
+    transaction: the batch is flagged, failing records are quarantined, the
+    failures are counted per check and the state carried to the next run is
+    updated. Runs with no new records do nothing.
+
+    Args:
+        args: Parsed command-line arguments containing the database path,
+              the check query template and the check thresholds.
+    """
+    # Record every statement when profiling is requested
+    if args.profile:
+        enable_query_profiling()
+
+    # Read and compile the SQL query template of the checks
+    check_query_template = Template(read_query(path=args.quality_query_template_path))
+
+    # Establish a connection to the database
+    con = connect_to_database(path=args.database_path, **read_resource_settings(args))
+
+    run_quality_checks(
+        con,
+        check_query_template,
+        outlier_threshold=args.outlier_threshold,
+        min_value_count=args.min_value_count,
+        max_gap_hours=args.max_gap_hours,
+        tag=args.quality_query_template_path,
+    )
+
+    if args.profile:
+        disable_query_profiling("data_quality", args.profile_output_path, args.prometheus_output_path)
+
+    # Close the database connection after the checks
+    close_database_connection(con)
+
+
+# Function to parse the command-line arguments of the data-quality stage
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the data-quality arguments.
+
+    Args:
+        argv (Optional[List[str]]): Arguments to parse, defaults to the command line.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    # Initialize argument parser for command-line interface
+    parser = argparse.ArgumentParser(description="CLI for Data Quality Checks")
+
+    # Define required arguments
+    parser.add_argument(
+        "--database_path",
+        type=str,
+        required=True,
+        help="Path to the DuckDB database",
+    )
+    parser.add_argument(
+        "--quality_query_template_path",
+        type=str,
+        required=True,
+        help="Path to the SQL data-quality check query template",
+    )
+
+    # Thresholds of the checks
+    parser.add_argument(
+        "--outlier_threshold",
+        type=float,
+        default=6.0,
+        help="Number of standard deviations from the mean of a location, parameter and unit beyond which a value is an outlier",
+    )
+    parser.add_argument(
+        "--min_value_count",
+        type=int,
+        default=30,
+        help="Number of valid values a location, parameter and unit needs before outliers are flagged",
+    )
+    parser.add_argument(
+        "--max_gap_hours",
+        type=int,
+        default=3,
+        help="Longest time in hours between consecutive measurements of a sensor that is not reported as a gap",
+    )
+    add_resource_arguments(parser)
+    add_profiling_arguments(parser)
+
+    # Parse the arguments passed via the command line
+    args = parser.parse_args(argv)
+    args.profile = args.profile or bool(args.profile_output_path or args.prometheus_output_path)
+    return args
+
+
+# Main function to handle command-line argument parsing and trigger the checks
+def main():
+    """
+    Main entry point for the script. Parses command-line arguments
+    and triggers the data-quality checks.
+    """
+    # Set logging level to INFO for detailed logs
+    logging.getLogger().setLevel(logging.INFO)
+
+    # Parse the arguments passed via the command line
+    args = parse_arguments()
+
+    # Trigger the data-quality checks with the parsed arguments
+    check_data_quality(args)
+
+
+# Entry point for the script execution
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,137 @@
 # Import necessary modules
-from typing import List  # For type hinting
+from typing import List, Optional  # For type hinting
+from datetime import date  # For the retention cutoff
+from dateutil.relativedelta import relativedelta  # For subtracting months
 import os  # For file and directory operations
 import argparse  # For command-line argument parsing
 import logging  # For logging information
+import time  # For timing the pruning report queries and waiting for file locks
 
 from duckdb import DuckDBPyConnection  # Type for DuckDB connection
 import duckdb as ddb  # DuckDB library
+from jinja2 import Template  # For templating the archive queries
+
+from query_profiler import QueryProfiler  # For opt-in statement instrumentation
+from sql_runner import (  # For running SQL scripts in dependency order
+    SqlScript,
+    analyze_script,
+    build_dependencies,
+    read_schema_names,
+    run_scripts,
+)
+
+# Profiler recording every statement run through execute_query, if profiling is enabled
+query_profiler: Optional[QueryProfiler] = None
+
+# Suffix of the marker file a writer keeps fresh while waiting for the dashboard to release the database
+WRITER_WAITING_SUFFIX = ".writer-waiting"
+
+# Age in seconds after which a marker is left over from a writer that stopped waiting without removing it
+WRITER_WAITING_MAX_AGE = 5.0
+
+# Sort key of the tables read by location, parameter and time range, so their zone maps skip row groups
+CLUSTER_KEYS = {
+    "raw.air_quality": ["location_id", "parameter", "datetime"],
+    "presentation.daily_air_quality_stats": ["location_id", "parameter", "measurement_date"],
+    "presentation.air_quality_rollups": ["resolution", "location_id", "parameter", "period_start"],
+    "presentation.weekday_summaries": ["location_id", "parameter", "year_start"],
+}
 
 # Function to connect to the DuckDB database
-def connect_to_database(path: str) -> DuckDBPyConnection:
+def connect_to_database(
+    path: str,
+    memory_limit: Optional[str] = None,
+    threads: Optional[int] = None,
+    temp_directory: Optional[str] = None,
+    s3_endpoint: Optional[str] = None,
+    lock_timeout: float = 30.0,
+) -> DuckDBPyConnection:
     """
     Connect to the DuckDB database at the given path.
     
+    The dashboard keeps the database open read-only while it serves requests,
+    which locks the file. While waiting up to `lock_timeout` seconds for such
+    a lock, the connection keeps a `<path>.writer-waiting` marker file fresh,
+    which tells the dashboard to release the file as soon as its running
+    requests finish.
+    
     Args:
         path (str): Path to the DuckDB database file.
+        memory_limit (Optional[str]): Maximum memory DuckDB may use, e.g. "2GB". Larger
+                                      intermediate results are spilled to disk.
+        threads (Optional[int]): Maximum number of threads DuckDB may use.
+        temp_directory (Optional[str]): Directory DuckDB spills intermediate results to.
+        s3_endpoint (Optional[str]): URL of an S3-compatible endpoint, e.g. a local
+                                     stand-in such as MinIO, instead of AWS.
+        lock_timeout (float): Seconds to wait for another process's lock on the database file.
     
     Returns:
         DuckDBPyConnection: A connection object to interact with the database.
     """
     logging.info(f"Connecting to database at {path}")  # Log the connection attempt
-    con = ddb.connect(path)  # Establish the connection
+    deadline = time.monotonic() + lock_timeout
+    delay = 0.05
+    marker_path = f"{path}{WRITER_WAITING_SUFFIX}"
+    waited = False
+    try:
+        while True:
+            try:
+                con = ddb.connect(path)  # Establish the connection
+                break
+            except ddb.IOException as e:
+                # Retry while another process holds the file, with exponential backoff
+                if "Could not set lock" not in str(e) or time.monotonic() + delay > deadline:
+                    raise
+                with open(marker_path, "a"):
+                    os.utime(marker_path)  # Ask the dashboard to release the file
+                waited = True
+                time.sleep(delay)
+                delay = min(delay * 2, 1.0)
+    finally:
+        if waited:
+            try:
+                os.remove(marker_path)
+            except FileNotFoundError:
+                pass  # Another writer waiting alongside removed it already
     con.sql("""
         SET s3_access_key_id='';   -- Set S3 credentials (currently empty for security reasons)
         SET s3_secret_access_key='';
         SET s3_region='';
         """)  # Configure S3 settings for DuckDB (optional)
+    if s3_endpoint is not None:
+        scheme, _, host = s3_endpoint.rpartition("://")
+        con.sql(f"""
+            SET s3_endpoint='{host.rstrip("/")}';
+            SET s3_url_style='path';  -- Stand-ins serve buckets as paths, not subdomains
+            SET s3_use_ssl={"false" if scheme == "http" else "true"};
+            """)
+
+    # Limit the resources DuckDB takes, so the pipeline fits next to other jobs on the host
+    if memory_limit is not None:
+        con.execute(f"SET memory_limit = '{memory_limit}'")
+    if threads is not None:
+        con.execute(f"SET threads = {int(threads)}")
+    if temp_directory is not None:
+        con.execute(f"SET temp_directory = '{temp_directory}'")
     return con
 
+# Function to check whether a writer waits for the database
+def is_writer_waiting(path: str) -> bool:
+    """
+    Check whether another process waits in connect_to_database for the database file.
+    
+    Args:
+        path (str): Path to the DuckDB database file.
+    
+    Returns:
+        bool: True if a fresh writer marker exists.
+    """
+    try:
+        age = time.time() - os.stat(f"{path}{WRITER_WAITING_SUFFIX}").st_mtime
+    except FileNotFoundError:
+        return False
+    return age < WRITER_WAITING_MAX_AGE
+
 # Function to close the DuckDB database connection
 def close_database_connection(con: DuckDBPyConnection) -> None:
     """
@@ -78,35 +183,450 @@ def read_query(path: str) -> str:
     return query
 
 # Function to execute a query on the database
-def execute_query(con: DuckDBPyConnection, query: str) -> None:
+def execute_query(con: DuckDBPyConnection, query: str, tag: Optional[str] = None) -> DuckDBPyConnection:
     """
-    Execute an SQL query on the connected DuckDB database.
+    Execute an SQL query on the connected DuckDB database, recording it when
+    query profiling is enabled.
     
     Args:
         con (DuckDBPyConnection): The database connection object.
         query (str): The SQL query to execute.
+        tag (Optional[str]): Source SQL file or partition path of the query, used in the profile.
+    
+    Returns:
+        DuckDBPyConnection: The connection, positioned on the query result.
+    """
+    if query_profiler is not None:
+        return query_profiler.execute(con, query, tag)
+    return con.execute(query)  # Execute the query
+
+# Function to start recording the statements run through execute_query
+def enable_query_profiling() -> QueryProfiler:
+    """
+    Record the wall time, rows, scans and DuckDB profile of every
+    statement executed from now on.
+    
+    Returns:
+        QueryProfiler: The profiler collecting the records.
+    """
+    global query_profiler
+    query_profiler = QueryProfiler()
+    return query_profiler
+
+# Function to stop recording statements and export the records
+def disable_query_profiling(
+    job: str, json_lines_path: Optional[str] = None, prometheus_path: Optional[str] = None
+) -> None:
+    """
+    Stop profiling, log the slowest statements and sources and export the records.
+    
+    Args:
+        job (str): Name of the pipeline stage, used as Prometheus label.
+        json_lines_path (Optional[str]): File to append one JSON record per statement to.
+        prometheus_path (Optional[str]): File to write the totals per source to in Prometheus text format.
+    """
+    global query_profiler
+    if query_profiler is None:
+        return
+    profiler, query_profiler = query_profiler, None
+
+    profiler.log_summary()
+    if json_lines_path:
+        profiler.write_json_lines(json_lines_path)
+    if prometheus_path:
+        profiler.write_prometheus(prometheus_path, job)
+    profiler.close()
+
+# Function to execute every DDL script in a directory
+def execute_ddl_queries(con: DuckDBPyConnection, ddl_query_parent_dir: str, workers: int = 1) -> None:
     """
-    con.execute(query)  # Execute the query
+    Execute the DDL scripts from a directory in dependency order.
+    
+    A script runs after the scripts creating the schemas and objects it
+    references; scripts without dependencies between them keep their filename order.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        ddl_query_parent_dir (str): Path to the directory containing DDL SQL scripts.
+        workers (int): Maximum number of independent scripts executed at the same time.
+                       Must be 1 when the scripts run inside a transaction of `con`.
+    """
+    query_paths = collect_query_paths(ddl_query_parent_dir)  # Get paths to all DDL scripts
+    queries = {query_path: read_query(query_path) for query_path in query_paths}  # Read the queries from the files
+
+    # Order the scripts by the schemas and objects they create and reference
+    schemas = read_schema_names(con, list(queries.values()))
+    scripts = [
+        analyze_script(query_path, query_path, query, query, schemas)
+        for query_path, query in queries.items()
+    ]
+
+    def run(cursor: DuckDBPyConnection, script: SqlScript) -> None:
+        execute_query(cursor, script.text, tag=script.path)  # Execute the query
+        logging.info(f"Executed query from {script.path}")  # Log the execution
+
+    run_scripts(con, scripts, build_dependencies(scripts), run, workers=workers)
+
+# Function to add the query profiling options to a command-line parser
+def add_profiling_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the arguments enabling query profiling to a CLI parser.
+    
+    Args:
+        parser (argparse.ArgumentParser): The parser of a pipeline stage.
+    """
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile every statement and log the slowest statements and sources at the end of the run",
+    )
+    parser.add_argument(
+        "--profile_output_path",
+        type=str,
+        help="Append a JSON record per profiled statement to this file (implies --profile)",
+    )
+    parser.add_argument(
+        "--prometheus_output_path",
+        type=str,
+        help="Write the profiled totals per source to this file in Prometheus text format (implies --profile)",
+    )
+
+# Function to add the resource limit options to a command-line parser
+def add_resource_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the arguments limiting the memory, threads and spill directory of DuckDB to a CLI parser.
+    
+    Args:
+        parser (argparse.ArgumentParser): The parser of a pipeline stage.
+    """
+    parser.add_argument("--memory_limit", type=str, help="Maximum memory DuckDB may use, e.g. 2GB")
+    parser.add_argument("--threads", type=int, help="Maximum number of threads DuckDB may use")
+    parser.add_argument("--temp_directory", type=str, help="Directory DuckDB spills to when over the memory limit")
+
+# Function to read the resource limits from parsed arguments
+def read_resource_settings(args: argparse.Namespace) -> dict:
+    """
+    Collect the resource limits from parsed arguments, as keyword arguments for connect_to_database.
+    
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments.
+    
+    Returns:
+        dict: The memory limit, thread count and spill directory.
+    """
+    return {
+        "memory_limit": args.memory_limit,
+        "threads": args.threads,
+        "temp_directory": args.temp_directory,
+    }
 
 # Function to set up the database with DDL scripts
-def setup_database(database_path: str, ddl_query_parent_dir: str) -> None:
+def setup_database(database_path: str, ddl_query_parent_dir: str, workers: int = 1, **resource_settings) -> None:
     """
     Set up the DuckDB database using DDL queries from a specified directory.
     
     Args:
         database_path (str): Path to the DuckDB database file.
         ddl_query_parent_dir (str): Path to the directory containing DDL SQL scripts.
+        workers (int): Maximum number of independent DDL scripts executed at the same time.
+        **resource_settings: Resource limits passed to connect_to_database.
     """
-    query_paths = collect_query_paths(ddl_query_parent_dir)  # Get paths to all DDL scripts
-    con = connect_to_database(database_path)  # Connect to the database
+    con = connect_to_database(database_path, **resource_settings)  # Connect to the database
+    execute_ddl_queries(con, ddl_query_parent_dir, workers=workers)  # Create the schemas and tables
+    close_database_connection(con)  # Close the connection after execution
+
+# Function to deduplicate the raw table and rebuild it with its primary key
+def compact_database(database_path: str, ddl_query_parent_dir: str, **resource_settings) -> None:
+    """
+    Rewrite 'raw.air_quality' so it holds one record per primary key.
+    
+    Keeps the most recently ingested version of each record and recreates the
+    table from the DDL scripts, so tables created before the primary key was
+    introduced get it too. Runs in a single transaction.
+    
+    Args:
+        database_path (str): Path to the DuckDB database file.
+        ddl_query_parent_dir (str): Path to the directory containing DDL SQL scripts.
+        **resource_settings: Resource limits passed to connect_to_database.
+    """
+    con = connect_to_database(database_path, **resource_settings)  # Connect to the database
+    con.begin()
 
-    # Execute each query in the collected DDL scripts
-    for query_path in query_paths:
-        query = read_query(query_path)  # Read the query from the file
-        execute_query(con, query)  # Execute the query
-        logging.info(f"Executed query from {query_path}")  # Log the execution
+    # Move the existing data aside and recreate the table from the DDL scripts
+    execute_query(con, "ALTER TABLE raw.air_quality RENAME TO air_quality_uncompacted")
+    execute_ddl_queries(con, ddl_query_parent_dir)
 
-    close_database_connection(con)  # Close the connection after execution
+    # Copy the latest version of every record back into the new table
+    row_count = execute_query(con, """
+        INSERT INTO raw.air_quality
+        SELECT *
+        FROM raw.air_quality_uncompacted
+        WHERE location_id IS NOT NULL
+        AND sensors_id IS NOT NULL
+        AND "datetime" IS NOT NULL
+        AND "parameter" IS NOT NULL
+        QUALIFY ROW_NUMBER() OVER (
+            PARTITION BY location_id, sensors_id, "datetime", "parameter"
+            ORDER BY ingestion_datetime DESC
+        ) = 1
+        ORDER BY location_id, "parameter", "datetime"
+        """).fetchone()[0]
+    execute_query(con, "DROP TABLE raw.air_quality_uncompacted")
+    con.commit()
+
+    execute_query(con, "CHECKPOINT")  # Reclaim the space used by the removed duplicates
+    logging.info(f"Compacted raw.air_quality to {row_count} records")  # Log the result
+    close_database_connection(con)  # Close the connection
+
+# Function to move raw records older than the retention period to the cold tier
+def archive_database(
+    database_path: str,
+    archive_path: str,
+    archive_query_template_path: str,
+    retention_months: int,
+    **resource_settings,
+) -> None:
+    """
+    Move the raw records measured before the retention period to Parquet
+    archives, one per location and year, and delete them from the raw table.
+    
+    The cutoff is the start of the month `retention_months` months ago.
+    Archives that already exist are rewritten with the new records merged in.
+    The new archives replace the old ones before the records are deleted, so a
+    failure in between leaves records in both tiers rather than losing them;
+    the next run merges them again.
+    
+    Args:
+        database_path (str): Path to the DuckDB database file.
+        archive_path (str): Base path of the Parquet archives.
+        archive_query_template_path (str): Path to the SQL archive query template.
+        retention_months (int): Number of months of records kept in the database.
+        **resource_settings: Resource limits passed to connect_to_database.
+    """
+    archive_query_template = Template(read_query(archive_query_template_path))
+    cutoff = date.today().replace(day=1) - relativedelta(months=retention_months)
+
+    con = connect_to_database(database_path, **resource_settings)  # Connect to the database
+    con.begin()
+
+    # Stage the records to archive, so the raw table is scanned once
+    row_count = execute_query(con, f"""
+        CREATE OR REPLACE TEMP TABLE archive_batch AS
+        SELECT *
+        FROM raw.air_quality
+        WHERE "datetime" < DATE '{cutoff}'
+        """).fetchone()[0]
+    partitions = con.execute("SELECT DISTINCT location_id, \"year\" FROM archive_batch ORDER BY ALL").fetchall()
+    if row_count == 0:
+        logging.info(f"No records measured before {cutoff} to archive")
+        con.rollback()
+        close_database_connection(con)
+        return
+
+    # Write the new archive of every location and year next to the current one
+    output_paths = {}
+    try:
+        for location_id, year in partitions:
+            partition_dir = os.path.join(archive_path, f"location_id={location_id}", f"year={year}")
+            os.makedirs(partition_dir, exist_ok=True)
+            output_path = os.path.join(partition_dir, "data.parquet")
+            query = archive_query_template.render(
+                location_id=location_id,
+                year=year,
+                existing_path=output_path if os.path.exists(output_path) else None,
+                output_path=f"{output_path}.tmp",
+            )
+            execute_query(con, query, tag=output_path)
+            output_paths[output_path] = f"{output_path}.tmp"
+    except Exception:
+        con.rollback()
+        for temporary_path in output_paths.values():
+            os.remove(temporary_path)
+        raise
+
+    # Swap in the new archives, then remove the archived records from the hot tier
+    for output_path, temporary_path in output_paths.items():
+        os.replace(temporary_path, output_path)
+    execute_query(con, f"DELETE FROM raw.air_quality WHERE \"datetime\" < DATE '{cutoff}'")
+    execute_query(con, archive_query_template.render(create_view=True, archive_path=archive_path), tag=archive_path)
+    execute_query(con, "DROP TABLE archive_batch")
+    con.commit()
+
+    execute_query(con, "CHECKPOINT")  # Reclaim the space used by the archived records
+    logging.info(f"Archived {row_count} records measured before {cutoff} in {len(partitions)} location years")
+    close_database_connection(con)  # Close the connection
+
+# Function to list the clustered tables that exist as tables
+def read_clustered_tables(con: DuckDBPyConnection) -> List[str]:
+    """
+    List the tables of CLUSTER_KEYS that exist as tables; presentation objects
+    are only tables when the transformation materializes them.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+    
+    Returns:
+        List[str]: Qualified names of the tables.
+    """
+    tables = {row[0] for row in con.execute(
+        "SELECT schema_name || '.' || table_name FROM duckdb_tables()"
+    ).fetchall()}
+    return [table for table in CLUSTER_KEYS if table in tables]
+
+# Function to rewrite the clustered tables in the order of their sort keys
+def cluster_database(
+    database_path: str, ddl_query_parent_dir: str, create_indexes: bool = False, **resource_settings
+) -> None:
+    """
+    Rewrite every table of CLUSTER_KEYS sorted on its key, so each row group
+    covers few locations, parameters and dates and the min/max statistics of
+    the row groups let range queries skip most of them.
+    
+    New data is appended in arrival order (each batch sorted on its own), so
+    run this periodically. Tables with a primary key are recreated from the
+    DDL scripts to keep it. Optionally adds ART indexes on the sort keys of the
+    presentation tables for point lookups. The raw table gets none, since its
+    primary key index already serves lookups and DuckDB does not apply
+    upserts correctly to tables with a second index.
+    
+    Args:
+        database_path (str): Path to the DuckDB database file.
+        ddl_query_parent_dir (str): Path to the directory containing DDL SQL scripts.
+        create_indexes (bool): Whether to create ART indexes on the presentation tables.
+        **resource_settings: Resource limits passed to connect_to_database.
+    """
+    con = connect_to_database(database_path, **resource_settings)  # Connect to the database
+    tables = read_clustered_tables(con)
+    constrained = {row[0] for row in con.execute(
+        "SELECT schema_name || '.' || table_name FROM duckdb_constraints() WHERE constraint_type = 'PRIMARY KEY'"
+    ).fetchall()}
+    con.begin()
+
+    # Indexes depend on their table, so they are dropped before it is rewritten
+    for table in tables:
+        execute_query(con, f"DROP INDEX IF EXISTS {table}_cluster_idx")
+
+    # Move the tables with a primary key aside and recreate them from the DDL scripts
+    for table in tables:
+        if table in constrained:
+            execute_query(con, f"ALTER TABLE {table} RENAME TO {table.split('.')[1]}_unclustered")
+    execute_ddl_queries(con, ddl_query_parent_dir)
+
+    for table in tables:
+        order = ", ".join(f'"{column}"' for column in CLUSTER_KEYS[table])
+        if table in constrained:
+            execute_query(con, f"INSERT INTO {table} SELECT * FROM {table}_unclustered ORDER BY {order}", tag=table)
+            execute_query(con, f"DROP TABLE {table}_unclustered")
+        else:
+            execute_query(con, f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM {table} ORDER BY {order}", tag=table)
+        if create_indexes and table not in constrained:
+            execute_query(con, f"CREATE INDEX {table.split('.')[1]}_cluster_idx ON {table} ({order})", tag=table)
+        logging.info(f"Clustered {table} on {order}")
+    con.commit()
+
+    execute_query(con, "CHECKPOINT")  # Write the sorted row groups and reclaim the old ones
+    close_database_connection(con)  # Close the connection
+
+# Function to count the row groups a range query can skip
+def count_pruned_row_groups(
+    con: DuckDBPyConnection, table: str, filters: List[tuple]
+) -> tuple:
+    """
+    Count the row groups of a table and those whose min/max statistics overlap
+    every filter, i.e. the ones a query with these filters has to read.
+    
+    VARCHAR statistics only keep a short prefix, so the count is exact for the
+    short keys used here (parameters, resolutions) but not for long strings.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        table (str): Qualified name of the table.
+        filters (List[tuple]): (column, lowest value, highest value) of every filter.
+    
+    Returns:
+        tuple: The total number of row groups and the number of row groups read.
+    """
+    schema_name, table_name = table.split(".")
+    column_types = dict(con.execute(
+        "SELECT column_name, data_type FROM duckdb_columns() WHERE schema_name = ? AND table_name = ?",
+        [schema_name, table_name],
+    ).fetchall())
+    overlaps = " AND ".join(
+        f"""bool_or(column_name = '{column}'
+            AND TRY_CAST(min_value AS {column_types[column]}) <= ?
+            AND TRY_CAST(max_value AS {column_types[column]}) >= ?)"""
+        for column, _, _ in filters
+    )
+    parameters = [value for _, low, high in filters for value in (high, low)]
+    return con.execute(
+        f"""
+        WITH row_group_stats AS (
+            SELECT
+                row_group_id,
+                column_name,
+                regexp_extract(stats, '\\[Min: (.*?), Max: (.*?)[,\\]]', 1) AS min_value,
+                regexp_extract(stats, '\\[Min: (.*?), Max: (.*?)[,\\]]', 2) AS max_value
+            FROM pragma_storage_info('{table}')
+            WHERE segment_type <> 'VALIDITY'
+        ),
+        row_groups AS (
+            SELECT row_group_id, {overlaps} AS is_read
+            FROM row_group_stats
+            GROUP BY row_group_id
+        )
+        SELECT COUNT(*), COUNT(*) FILTER (WHERE is_read)
+        FROM row_groups
+        """,
+        parameters,
+    ).fetchone()
+
+# Function to report how many row groups typical dashboard queries skip
+def report_pruning(database_path: str, **resource_settings) -> None:
+    """
+    Log, for every clustered table, how many row groups a typical dashboard
+    query reads: one location and parameter over the last 30 days of data of
+    the location with the most rows, at daily resolution for the rollups.
+    
+    Args:
+        database_path (str): Path to the DuckDB database file.
+        **resource_settings: Resource limits passed to connect_to_database.
+    """
+    con = connect_to_database(database_path, **resource_settings)  # Connect to the database
+    for table in read_clustered_tables(con):
+        *keys, time_column = CLUSTER_KEYS[table]
+        where = "WHERE resolution = 'day'" if "resolution" in keys else ""
+        probe = con.execute(
+            f"""
+            SELECT {", ".join(keys)}, MAX("{time_column}")
+            FROM {table}
+            {where}
+            GROUP BY ALL
+            ORDER BY COUNT(*) DESC
+            LIMIT 1
+            """
+        ).fetchone()
+        if probe is None:
+            logging.info(f"{table} is empty")
+            continue
+        end = probe[-1]
+        start = end - relativedelta(days=30)
+        filters = [(column, value, value) for column, value in zip(keys, probe[:-1])] + [(time_column, start, end)]
+
+        # Time the query itself, then read which row groups its filters can skip
+        condition = " AND ".join(f'"{column}" BETWEEN ? AND ?' for column, _, _ in filters)
+        started = time.perf_counter()
+        row_count = con.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE {condition}",
+            [value for _, low, high in filters for value in (low, high)],
+        ).fetchone()[0]
+        elapsed = time.perf_counter() - started
+        total, read = count_pruned_row_groups(con, table, filters)
+        description = ", ".join(f"{column}={value}" for column, value in zip(keys, probe[:-1]))
+        logging.info(
+            f"{table}: {description}, {time_column} from {start} to {end} matched {row_count} rows "
+            f"in {elapsed * 1000:.1f} ms, reading {read} of {total} row groups ({total - read} pruned)"
+        )
+    close_database_connection(con)  # Close the connection
 
 # Function to destroy (delete) the database file
 def destroy_database(database_path: str) -> None:
@@ -120,33 +640,79 @@ def destroy_database(database_path: str) -> None:
         os.remove(database_path)  # Delete the file
         logging.info(f"Database at {database_path} has been destroyed.")  # Log the deletion
 
-# Main function to parse CLI arguments and perform database setup or destruction
+# Main function to parse CLI arguments and perform database setup, compaction or destruction
 def main():
     """
-    Main function to provide a CLI interface for setting up or destroying the database.
+    Main function to provide a CLI interface for setting up, compacting or destroying the database.
     """
     logging.getLogger().setLevel(logging.INFO)  # Set logging level to INFO
     
     # Define command-line arguments
-    parser = argparse.ArgumentParser(description="CLI tool to setup or destroy a database.")
+    parser = argparse.ArgumentParser(description="CLI tool to setup, compact or destroy a database.")
 
-    # Mutually exclusive group to ensure either create or destroy is selected
+    # Mutually exclusive group to ensure only one action is selected
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("--create", action="store_true", help="Create the database")  # Option to create the database
     group.add_argument("--destroy", action="store_true", help="Destroy the database")  # Option to destroy the database
+    group.add_argument("--compact", action="store_true", help="Deduplicate the raw data")  # Option to compact the database
+    group.add_argument("--archive", action="store_true", help="Move old raw data to Parquet archives")  # Option to archive old data
+    group.add_argument("--cluster", action="store_true", help="Sort the tables on location, parameter and time")  # Option to cluster the tables
+    group.add_argument("--report-pruning", action="store_true", help="Report the row groups typical queries skip")  # Option to report the pruning
 
     # Additional arguments for database path and DDL script directory
     parser.add_argument("--database-path", type=str, help="Path to the database")
     parser.add_argument("--ddl-query-parent-dir", type=str, help="Path to the parent directory of the DDL queries")
+    parser.add_argument("--workers", type=int, default=1, help="Number of independent DDL scripts to run concurrently")
+
+    # Retention policy for archiving
+    parser.add_argument("--archive-path", type=str, help="Base path of the Parquet archives of old raw data")
+    parser.add_argument("--archive-query-template-path", type=str, help="Path to the SQL archive query template")
+    parser.add_argument("--retention-months", type=int, default=12, help="Number of months of raw data kept in the database")
+
+    # Indexes created when clustering
+    parser.add_argument("--create-indexes", action="store_true", help="Create ART indexes on the sort keys of the presentation tables")
+
+    # Resource limits for DuckDB
+    parser.add_argument("--memory-limit", type=str, help="Maximum memory DuckDB may use, e.g. 2GB")
+    parser.add_argument("--threads", type=int, help="Maximum number of threads DuckDB may use")
+    parser.add_argument("--temp-directory", type=str, help="Directory DuckDB spills to when over the memory limit")
 
     # Parse the arguments
     args = parser.parse_args()
 
     # Perform the appropriate action based on the arguments
     if args.create:
-        setup_database(database_path=args.database_path, ddl_query_parent_dir=args.ddl_query_parent_dir)
+        setup_database(
+            database_path=args.database_path,
+            ddl_query_parent_dir=args.ddl_query_parent_dir,
+            workers=args.workers,
+            **read_resource_settings(args),
+        )
     elif args.destroy:
         destroy_database(database_path=args.database_path)
+    elif args.compact:
+        compact_database(
+            database_path=args.database_path,
+            ddl_query_parent_dir=args.ddl_query_parent_dir,
+            **read_resource_settings(args),
+        )
+    elif args.archive:
+        archive_database(
+            database_path=args.database_path,
+            archive_path=args.archive_path,
+            archive_query_template_path=args.archive_query_template_path,
+            retention_months=args.retention_months,
+            **read_resource_settings(args),
+        )
+    elif args.cluster:
+        cluster_database(
+            database_path=args.database_path,
+            ddl_query_parent_dir=args.ddl_query_parent_dir,
+            create_indexes=args.create_indexes,
+            **read_resource_settings(args),
+        )
+    elif args.report_pruning:
+        report_pruning(database_path=args.database_path, **read_resource_settings(args))
 
 # Entry point for the script
 if __name__ == "__main__":
@@ -2,11 +2,14 @@
 import argparse  # For command-line argument parsing
 import json  # For reading and parsing JSON files
 import logging  # For logging information
+import os  # For creating output directories
+import sys  # For the exit status of failed extractions
+from concurrent.futures import ThreadPoolExecutor, as_completed  # For running extractions concurrently
 from datetime import datetime  # For working with date and time
 from dateutil.relativedelta import relativedelta  # For adding or subtracting months
-from typing import List  # For type hinting
+from typing import Dict, List, NamedTuple, Optional, Tuple  # For type hinting
 
-from duckdb import IOException  # Exception handling for DuckDB
+from duckdb import DuckDBPyConnection, Error, IOException  # Connection type and exception handling for DuckDB
 from jinja2 import Template  # For templating dynamic strings
 
 # Import custom database manager functions
@@ -14,8 +17,20 @@ from database_manager import (
     connect_to_database,  # To connect to the database
     close_database_connection,  # To close the database connection
     execute_query,  # To execute SQL queries
-    read_query  # To read SQL queries from files
+    enable_query_profiling,  # To record every executed statement
+    disable_query_profiling,  # To summarize and export the recorded statements
+    read_query,  # To read SQL queries from files
+    add_profiling_arguments,  # To add the query profiling CLI arguments
+    add_resource_arguments,  # To add the resource limit CLI arguments
+    read_resource_settings,  # To read the resource limits from the arguments
 )
+from source_index import load_source_index  # To look up the files that exist in the source tree
+from prefetcher import Prefetcher, PrefetchSettings  # To download remote files while others are ingested
+
+# Query merging the extracted records into presentation.latest_values, used unless another one is given
+LATEST_VALUES_QUERY_PATH = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "sql", "dml", "raw", "2_presentation_latest_values_upsert.sql"
+))
 
 
 # Function to read location IDs from a JSON file
@@ -59,12 +74,13 @@ def compile_data_file_paths(
     end_date = datetime.strptime(end_date, "%Y-%m")
 
     data_file_paths = []  # Initialize an empty list for file paths
+    template = Template(data_file_path_template)  # Compile the template once for all paths
 
     # Generate paths for each location ID and date in the range
     for location_id in location_ids:
         index_date = start_date
         while index_date <= end_date:  # Iterate through months in the date range
-            data_file_path = Template(data_file_path_template).render(
+            data_file_path = template.render(
                 location_id=location_id,
                 year=str(index_date.year),
                 month=str(index_date.month).zfill(2)  # Ensure month is two digits
@@ -75,36 +91,463 @@ def compile_data_file_paths(
     return data_file_paths
 
 
-# Function to compile an SQL query for extracting data
-def compile_data_file_query(
-    base_path: str, data_file_path: str, extract_query_template: str
+# Function to compile an SQL query for extracting data from several files
+def compile_data_files_query(
+    data_files: List[str],
+    extract_query_template: Template,
+    output_path: Optional[str] = None,
+    stream_source: bool = False,
 ) -> str:
     """
-    Generate an SQL query to extract data from a file.
+    Generate an SQL query to extract data from a list of files in one scan.
     
     Args:
-        base_path (str): Base path for data files.
-        data_file_path (str): Path to the specific data file.
-        extract_query_template (str): Template for the SQL query.
+        data_files (List[str]): Full paths of the data files.
+        extract_query_template (Template): Compiled template for the SQL query.
+        output_path (Optional[str]): File to write the data to, for templates
+                                     that export data instead of inserting it.
+        stream_source (bool): Only select the records of the files, to stream them
+                              into the raw table in chunks.
     
     Returns:
         str: The rendered SQL query.
     """
-    # Render the SQL query template with the provided file path
-    extract_query = Template(extract_query_template).render(
-        data_file_path=f"{base_path}/{data_file_path}"
+    return extract_query_template.render(
+        data_file_paths=data_files, output_path=output_path, stream_source=stream_source
+    )
+
+
+# Function to compile the Parquet file path for a source partition
+def compile_parquet_output_path(parquet_base_path: str, data_file_path: str) -> str:
+    """
+    Map a source partition ("locationid=../year=../month=../*") to the Parquet
+    file holding its data, creating the partition directory for local paths.
+    
+    Args:
+        parquet_base_path (str): Base path of the Parquet storage.
+        data_file_path (str): Path (glob) of the source partition.
+    
+    Returns:
+        str: Path of the partition's Parquet file.
+    """
+    location_part, year_part, month_part = data_file_path.split("/")[:3]
+    location_id = location_part.split("=")[1]
+    partition_dir = f"{parquet_base_path}/location_id={location_id}/{year_part}/{month_part}"
+    if "://" not in parquet_base_path:
+        os.makedirs(partition_dir, exist_ok=True)  # Remote object stores need no directories
+    return f"{partition_dir}/data.parquet"
+
+
+# Function to expose the Parquet storage as the raw table
+def create_parquet_view(
+    con: DuckDBPyConnection, parquet_base_path: str, extract_query_template: Template
+) -> None:
+    """
+    Create 'raw.air_quality' as a view over the Parquet files, replacing the
+    table created by the DDL scripts if it is still empty.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        parquet_base_path (str): Base path of the Parquet storage.
+        extract_query_template (Template): Compiled template of the Parquet export query.
+    """
+    # A view can only be created once there are files to read
+    if not con.execute("SELECT file FROM glob(?) LIMIT 1", [f"{parquet_base_path}/*/*/*/*.parquet"]).fetchall():
+        return
+
+    table = con.execute(
+        "SELECT estimated_size FROM duckdb_tables() WHERE schema_name = 'raw' AND table_name = 'air_quality'"
+    ).fetchone()
+    if table is not None:
+        if con.execute("SELECT COUNT(*) FROM raw.air_quality").fetchone()[0] > 0:
+            raise ValueError("raw.air_quality is a table holding data; it cannot be replaced by the Parquet view")
+        execute_query(con, "DROP TABLE raw.air_quality")
+
+    query = extract_query_template.render(create_view=True, parquet_base_path=parquet_base_path)
+    execute_query(con, query, tag=parquet_base_path)
+    logging.info(f"Created raw.air_quality as a view over {parquet_base_path}")
+
+
+# Function to update the latest value of every location and parameter
+def update_latest_values(con: DuckDBPyConnection, latest_values_query_template: Template) -> None:
+    """
+    Merge the records ingested after the newest record in
+    'presentation.latest_values' into the table, or build it from all records
+    while it is still empty.
+    
+    The starting point is read from the table itself, so records loaded by a
+    run that stopped before updating it are merged by the next run. Merging a
+    record again is harmless, since a stored value is only replaced by a more
+    recent one.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        latest_values_query_template (Template): Compiled template of the upsert query.
+    """
+    since = con.execute("SELECT MAX(ingestion_datetime) FROM presentation.latest_values").fetchone()[0]
+    query = latest_values_query_template.render(since=since)
+    row_count = execute_query(con, query, tag="presentation.latest_values").fetchone()[0]
+    logging.info(f"Updated {row_count} latest values")
+
+
+# Function to select the data files that changed since they were last ingested
+def filter_changed_data_files(
+    con: DuckDBPyConnection, file_stats: Dict[str, Tuple[int, datetime]]
+) -> List[str]:
+    """
+    Compare data files against the ingestion manifest and keep new or modified ones.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        file_stats (Dict[str, Tuple[int, datetime]]): The size and modification time of each file.
+    
+    Returns:
+        List[str]: The data files that are not in the manifest or whose size or
+                   modification time differ from the recorded values.
+    """
+    manifest = {
+        file_path: (file_size, last_modified)
+        for file_path, file_size, last_modified in con.execute(
+            "SELECT file_path, file_size, last_modified FROM raw.ingestion_manifest"
+        ).fetchall()
+    }
+    changed = [file for file, stats in file_stats.items() if manifest.get(file) != stats]
+    logging.info(f"Skipping {len(file_stats) - len(changed)} unchanged data files")
+    return changed
+
+
+# Function to record ingested data files in the manifest
+def record_ingested_data_files(
+    con: DuckDBPyConnection,
+    file_stats: Dict[str, Tuple[int, datetime]],
+    results: Dict[str, "ExtractionResult"],
+) -> None:
+    """
+    Upsert the manifest entry of every successfully extracted data file.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        file_stats (Dict[str, Tuple[int, datetime]]): The size and modification time of each file.
+        results (Dict[str, ExtractionResult]): The extraction result of each file.
+    """
+    entries = [
+        (file, *file_stats[file], result.row_count)
+        for file, result in results.items()
+        if result.status == "extracted"
+    ]
+    if entries:
+        con.executemany(
+            """
+            INSERT OR REPLACE INTO raw.ingestion_manifest
+            VALUES (?, ?, ?, ?, current_timestamp)
+            """,
+            entries,
+        )
+    logging.info(f"Recorded {len(entries)} data files in the ingestion manifest")
+
+
+# Outcome of extracting a data file: its status and the number of rows loaded
+class ExtractionResult(NamedTuple):
+    status: str  # "extracted", "missing" or "failed"
+    row_count: Optional[int] = None  # Rows inserted, if known
+
+
+# Function to load many data files with a single extraction query
+def extract_data_bulk(
+    con: DuckDBPyConnection, data_files: List[str], extract_query_template: Template
+) -> Dict[str, ExtractionResult]:
+    """
+    Extract all given data files with one set-based query.
+    
+    The files are passed to a single read_csv call, so the query is planned
+    once, the schema is not sniffed per file and the load runs in one transaction.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        data_files (List[str]): Full paths of the existing data files.
+        extract_query_template (Template): Compiled template for the SQL query.
+    
+    Returns:
+        Dict[str, ExtractionResult]: The extraction result of each data file. Row
+                                     counts are only known for the load as a whole.
+    """
+    if not data_files:
+        return {}
+
+    query = compile_data_files_query(data_files, extract_query_template)
+    logging.info(f"Extracting data from {len(data_files)} data files in a single query")
+    try:
+        row_count = execute_query(con, query, tag=f"bulk ({len(data_files)} data files)").fetchone()[0]
+        logging.info(f"Extracted {row_count} rows")
+        result = ExtractionResult("extracted")
+    except Error as e:
+        logging.error(f"Bulk extraction failed: {e}")  # The whole load is rolled back
+        result = ExtractionResult("failed")
+
+    return {data_file: result for data_file in data_files}
+
+
+# Insert statement and chunk size used to stream a scan into the raw table
+class BatchInsert(NamedTuple):
+    query: str  # Extraction query inserting a chunk from the BATCH_RELATION relation
+    rows: int  # Approximate number of rows per chunk
+
+
+# Name under which each chunk of a streamed scan is registered
+BATCH_RELATION = "extraction_batch"
+
+# Number of rows in a DuckDB vector, the unit of the chunks of a streamed scan
+VECTOR_SIZE = 2048
+
+
+# Function to insert the result of a scan chunk by chunk
+def insert_in_batches(
+    con: DuckDBPyConnection, data_file_path: str, scan_query: str, batch_insert: BatchInsert
+) -> int:
+    """
+    Stream the result of a scan query and insert it in fixed-size chunks.
+    
+    The scan runs on its own cursor and is consumed one chunk at a time, and
+    each chunk is inserted and committed on its own, so peak memory depends on
+    the chunk size instead of the size of the data file.
+    
+    Args:
+        con (DuckDBPyConnection): Connection (or cursor) used to insert the chunks.
+        data_file_path (str): Path to the data file, used to tag the queries.
+        scan_query (str): Query selecting the records of the data file.
+        batch_insert (BatchInsert): The insert statement and chunk size.
+    
+    Returns:
+        int: Number of rows inserted.
+    """
+    reader = con.cursor()  # A separate cursor, so the inserts do not discard the scan
+    try:
+        scan = execute_query(reader, scan_query, tag=data_file_path)
+        row_count = 0
+        while True:
+            batch = scan.fetch_df_chunk(max(1, batch_insert.rows // VECTOR_SIZE))
+            if batch.empty:
+                break
+            con.register(BATCH_RELATION, batch)
+            row_count += execute_query(con, batch_insert.query, tag=data_file_path).fetchone()[0]
+        con.unregister(BATCH_RELATION)
+        return row_count
+    finally:
+        reader.close()
+
+
+# Function to run the extraction query for a single data file
+def extract_data_file(
+    con: DuckDBPyConnection, data_file_path: str, query: str, batch_insert: Optional[BatchInsert] = None
+) -> ExtractionResult:
+    """
+    Execute the extraction query for a single data file.
+    
+    Args:
+        con (DuckDBPyConnection): Connection (or cursor) used to execute the query.
+        data_file_path (str): Path to the data file, used for logging.
+        query (str): The compiled extraction query, or the scan query when streaming.
+        batch_insert (Optional[BatchInsert]): Stream the scan query into the raw table in chunks.
+    
+    Returns:
+        ExtractionResult: "extracted" with the number of inserted rows on success,
+                          "missing" if no data exists at the path and "failed"
+                          for any other database error.
+    """
+    logging.info(f"Extracting data from {data_file_path}")  # Log the extraction attempt
+
+    # Execute the query and handle potential exceptions
+    try:
+        if batch_insert is not None:
+            row_count = insert_in_batches(con, data_file_path, query, batch_insert)
+        else:
+            row_count = execute_query(con, query, tag=data_file_path).fetchone()[0]
+        return ExtractionResult("extracted", row_count)
+    except IOException as e:
+        # Files removed since they were listed are missing; unreadable files (e.g. corrupt archives) failed
+        if "No files found" in str(e) or "404" in str(e):
+            logging.warning(f"Could not find data from {data_file_path}: {e}")  # Log missing data
+            return ExtractionResult("missing")
+        logging.error(f"Failed to extract data from {data_file_path}: {e}")  # Log failure
+        return ExtractionResult("failed")
+    except Error as e:
+        logging.error(f"Failed to extract data from {data_file_path}: {e}")  # Log failure
+        return ExtractionResult("failed")
+
+
+# Function to extract data files one after the other
+def extract_data_files(
+    con: DuckDBPyConnection, queries: Dict[str, str], batch_insert: Optional[BatchInsert] = None
+) -> Dict[str, ExtractionResult]:
+    """
+    Extract data files serially on the given connection.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        queries (Dict[str, str]): Compiled extraction queries keyed by data file path.
+        batch_insert (Optional[BatchInsert]): Stream the queries into the raw table in chunks.
+    
+    Returns:
+        Dict[str, ExtractionResult]: The extraction result of each data file path.
+    """
+    results = {}  # Result per data file path
+    for index, (data_file_path, query) in enumerate(queries.items(), start=1):
+        results[data_file_path] = extract_data_file(con, data_file_path, query, batch_insert)
+        log_extraction_progress(index, len(queries), data_file_path, results[data_file_path].status)
+    return results
+
+
+# Function to extract data files concurrently on a bounded thread pool
+def extract_data_files_parallel(
+    con: DuckDBPyConnection, queries: Dict[str, str], workers: int, batch_insert: Optional[BatchInsert] = None
+) -> Dict[str, ExtractionResult]:
+    """
+    Extract data files concurrently using a bounded pool of worker threads.
+    
+    Each worker runs its queries on its own cursor of the shared connection, so
+    all writes go through the single DuckDB writer and every file is committed
+    in its own transaction. DuckDB releases the GIL while reading and parsing,
+    so the workers overlap I/O with each other.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        queries (Dict[str, str]): Compiled extraction queries keyed by data file path.
+        workers (int): Maximum number of files extracted at the same time.
+        batch_insert (Optional[BatchInsert]): Stream the queries into the raw table in chunks.
+    
+    Returns:
+        Dict[str, ExtractionResult]: The extraction result of each data file path.
+    """
+    def worker(data_file_path: str, query: str) -> ExtractionResult:
+        # Use a dedicated cursor so concurrent queries do not share state
+        cursor = con.cursor()
+        try:
+            return extract_data_file(cursor, data_file_path, query, batch_insert)
+        finally:
+            cursor.close()
+
+    results = {}  # Result per data file path
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(worker, data_file_path, query): data_file_path
+            for data_file_path, query in queries.items()
+        }
+        # Report progress as each file completes
+        for index, future in enumerate(as_completed(futures), start=1):
+            data_file_path = futures[future]
+            results[data_file_path] = future.result()
+            log_extraction_progress(index, len(queries), data_file_path, results[data_file_path].status)
+
+    return results
+
+
+# Function to extract data files while the next ones are downloaded
+def extract_data_files_prefetched(
+    con: DuckDBPyConnection,
+    units: Dict[str, List[str]],
+    extract_query_template: Template,
+    prefetcher: Prefetcher,
+    workers: int = 1,
+    output_paths: Optional[Dict[str, str]] = None,
+    batch_insert: Optional[BatchInsert] = None,
+) -> Dict[str, ExtractionResult]:
+    """
+    Download the data files of upcoming units in the background and extract
+    each unit from its local copies as soon as they are complete.
+    
+    Downloading and parsing no longer alternate in a single thread, so the
+    network and the CPU are busy at the same time.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        units (Dict[str, List[str]]): The data files of each partition (or data file) to extract.
+        extract_query_template (Template): Compiled template for the SQL query.
+        prefetcher (Prefetcher): The prefetcher downloading the data files.
+        workers (int): Maximum number of units extracted at the same time.
+        output_paths (Optional[Dict[str, str]]): File to write each unit to, for templates
+                                                 that export data instead of inserting it.
+        batch_insert (Optional[BatchInsert]): Stream the scans into the raw table in chunks.
+    
+    Returns:
+        Dict[str, ExtractionResult]: The extraction result of each unit; units that
+                                     could not be downloaded have failed.
+    """
+    processed = iter(range(1, len(units) + 1))  # Progress counter shared by the workers
+
+    def ingest(cursor: DuckDBPyConnection, key: str, local_files: List[str]) -> ExtractionResult:
+        query = compile_data_files_query(
+            local_files,
+            extract_query_template,
+            output_path=(output_paths or {}).get(key),
+            stream_source=batch_insert is not None,
+        )
+        result = extract_data_file(cursor, key, query, batch_insert)
+        log_extraction_progress(next(processed), len(units), key, result.status)
+        return result
+
+    results = prefetcher.run(units, ingest, ingest_workers=workers)
+    for key, result in results.items():
+        if result is None:
+            log_extraction_progress(next(processed), len(units), key, "failed")
+    return {key: result or ExtractionResult("failed") for key, result in results.items()}
+
+
+# Function to log the progress of an extraction run
+def log_extraction_progress(index: int, total: int, data_file_path: str, status: str) -> None:
+    """
+    Log the outcome of a single data file extraction.
+    
+    Args:
+        index (int): Number of data files processed so far.
+        total (int): Total number of data files to process.
+        data_file_path (str): Path to the processed data file.
+        status (str): Extraction status of the data file.
+    """
+    logging.info(f"[{index}/{total}] {status.capitalize()}: {data_file_path}")
+
+
+# Function to log a summary of an extraction run
+def log_extraction_summary(results: Dict[str, ExtractionResult]) -> int:
+    """
+    Log how many data files were extracted, missing or failed.
+    
+    Args:
+        results (Dict[str, ExtractionResult]): The extraction result of each data file path.
+    
+    Returns:
+        int: Number of data files that failed.
+    """
+    statuses = [result.status for result in results.values()]
+    counts = {status: statuses.count(status) for status in ("extracted", "missing", "failed")}
+    logging.info(
+        f"Extraction finished: {counts['extracted']} extracted, "
+        f"{counts['missing']} missing, {counts['failed']} failed"
     )
-    return extract_query
+    # List the failed files so they can be retried
+    for data_file_path, result in results.items():
+        if result.status == "failed":
+            logging.error(f"Extraction failed for {data_file_path}")
+    return counts["failed"]
 
 
 # Main function for extracting data
-def extract_data(args):
+def extract_data(args) -> int:
     """
     Extract data for specified locations and date range using provided templates.
     
+    Files that fail to load are logged and skipped, so the others are still
+    extracted; the caller decides how to report them.
+    
     Args:
         args (argparse.Namespace): Parsed command-line arguments.
+    
+    Returns:
+        int: Number of data files that failed to load.
     """
+    # Record every statement when profiling is requested
+    if args.profile:
+        enable_query_profiling()
+
     # Read location IDs from the specified JSON file
     location_ids = read_location_ids(args.locations_file_path)
 
@@ -119,43 +562,132 @@ def extract_data(args):
         end_date=args.end_date
     )
 
-    # Read the SQL query template for data extraction
-    extract_query_template = read_query(path=args.extract_query_template_path)
+    # Read and compile the SQL query template for data extraction
+    extract_query_template = Template(read_query(path=args.extract_query_template_path))
 
     # Connect to the DuckDB database
-    con = connect_to_database(path=args.database_path)
+    con = connect_to_database(path=args.database_path, s3_endpoint=args.s3_endpoint, **read_resource_settings(args))
 
-    # Process each data file path
-    for data_file_path in data_file_paths:
-        logging.info(f"Extracting data from {data_file_path}")  # Log the extraction attempt
+    # Look up the files of each partition in the index of the locations' trees; missing partitions have no files
+    source_index = load_source_index(
+        con, args.source_base_path, location_ids, cache_path=args.source_index_path, max_age=args.source_index_max_age
+    )
+    partition_files = source_index.select(data_file_paths)
+    results = {
+        data_file_path: ExtractionResult("missing")
+        for data_file_path, files in partition_files.items() if not files
+    }
+    data_files = [file for files in partition_files.values() for file in files]
 
-        # Compile the SQL query for the current file path
-        query = compile_data_file_query(
-            base_path=args.source_base_path,
-            data_file_path=data_file_path,
-            extract_query_template=extract_query_template
-        )
+    # Only keep files that are new or changed since they were last ingested
+    if args.incremental:
+        file_stats = source_index.stats(data_files)
+        data_files = filter_changed_data_files(con, file_stats)
+
+    if args.bulk:
+        # Load every file with one query
+        file_results = extract_data_bulk(con, data_files, extract_query_template)
+    else:
+        output_paths = {}
+        if args.parquet_base_path:
+            # Rewrite the Parquet file of every partition with new or changed files
+            changed = set(data_files)
+            units = {
+                data_file_path: files
+                for data_file_path, files in partition_files.items() if changed.intersection(files)
+            }
+            output_paths = {
+                data_file_path: compile_parquet_output_path(args.parquet_base_path, data_file_path)
+                for data_file_path in units
+            }
+        elif args.incremental:
+            # Load each file with its own query, so the manifest gets its row count
+            units = {data_file: [data_file] for data_file in data_files}
+        else:
+            # Load each partition with its own query
+            units = {data_file_path: files for data_file_path, files in partition_files.items() if files}
+
+        # Insert the scans in chunks when streaming
+        batch_insert = None
+        if args.streaming:
+            batch_insert = BatchInsert(extract_query_template.render(batch_relation=BATCH_RELATION), args.batch_rows)
+
+        # Process the queries serially or on a pool of worker threads, from prefetched local copies if requested
+        if args.prefetch:
+            prefetcher = Prefetcher(
+                con,
+                args.source_base_path,
+                PrefetchSettings(
+                    workers=args.prefetch_workers,
+                    queue_size=args.prefetch_queue_size,
+                    retries=args.prefetch_retries,
+                    directory=args.prefetch_directory,
+                ),
+            )
+            unit_results = extract_data_files_prefetched(
+                con,
+                units,
+                extract_query_template,
+                prefetcher,
+                workers=args.workers,
+                output_paths=output_paths,
+                batch_insert=batch_insert,
+            )
+        else:
+            queries = {
+                key: compile_data_files_query(
+                    files, extract_query_template, output_path=output_paths.get(key), stream_source=args.streaming
+                )
+                for key, files in units.items()
+            }
+            if args.workers > 1:
+                unit_results = extract_data_files_parallel(
+                    con, queries, workers=args.workers, batch_insert=batch_insert
+                )
+            else:
+                unit_results = extract_data_files(con, queries, batch_insert=batch_insert)
+
+        # Attribute the result of each query to its files; row counts only apply to single files
+        file_results = {
+            file: result if len(units[key]) == 1 else result._replace(row_count=None)
+            for key, result in unit_results.items()
+            for file in units[key]
+        }
+
+    if args.incremental:
+        record_ingested_data_files(con, file_stats, file_results)
+    results.update(file_results)
+
+    # Expose the Parquet files as the raw table
+    if args.parquet_base_path:
+        create_parquet_view(con, args.parquet_base_path, extract_query_template)
+
+    # Merge the newly loaded records into the latest values
+    if args.latest_values_query_path:
+        update_latest_values(con, Template(read_query(path=args.latest_values_query_path)))
+
+    failed_count = log_extraction_summary(results)
+    if args.profile:
+        disable_query_profiling("extraction", args.profile_output_path, args.prometheus_output_path)
 
-        # Execute the query and handle potential exceptions
-        try:
-            execute_query(con, query)
-            logging.info(f"Extracted data from {data_file_path}!")  # Log success
-        except IOException as e:
-            logging.warning(f"Could not find data from {data_file_path}: {e}")  # Log failure
-    
     # Close the database connection after processing
     close_database_connection(con)
+    return failed_count
 
 
-# Main function to set up argument parsing and invoke the extraction process
-def main():
+# Function to build the parser of the extraction arguments
+def build_argument_parser(description: str = "CLI for ELT Extraction") -> argparse.ArgumentParser:
     """
-    Main entry point for the CLI tool. Parses arguments and triggers the extraction process.
+    Build the parser of the extraction arguments, so other entry points can extend it.
+    
+    Args:
+        description (str): Description shown in the help message.
+    
+    Returns:
+        argparse.ArgumentParser: The parser.
     """
-    logging.getLogger().setLevel(logging.INFO)  # Set logging level to INFO
-
     # Set up argument parser
-    parser = argparse.ArgumentParser(description="CLI for ELT Extraction")
+    parser = argparse.ArgumentParser(description=description)
     
     # Define required arguments
     parser.add_argument(
@@ -185,11 +717,145 @@ def main():
         required=True,
         help="Base path for the remote data files",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of data files to extract concurrently",
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Load all data files with a single query instead of one query per file",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip data files that have not changed since they were last ingested",
+    )
+    parser.add_argument(
+        "--parquet_base_path",
+        type=str,
+        help="Land data as Parquet files partitioned by location, year and month under this path "
+             "(use with the Parquet export query template)",
+    )
+
+    parser.add_argument(
+        "--source_index_path",
+        type=str,
+        help="Cache the index of the source tree in this file instead of listing the tree on every run",
+    )
+    parser.add_argument(
+        "--source_index_max_age",
+        type=float,
+        default=3600.0,
+        help="Maximum age in seconds of a cached source index before the tree is listed again",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Insert each data file in chunks of --batch_rows rows, so memory use does not grow with file size",
+    )
+    parser.add_argument(
+        "--batch_rows",
+        type=int,
+        default=100 * VECTOR_SIZE,
+        help="Approximate number of rows per chunk when streaming",
+    )
+    parser.add_argument(
+        "--latest_values_query_path",
+        type=str,
+        default=LATEST_VALUES_QUERY_PATH,
+        help="Path to the SQL query updating presentation.latest_values with the extracted records "
+             "(defaults to the upsert query in sql/dml/raw)",
+    )
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="Download upcoming data files in the background while the downloaded ones are extracted",
+    )
+    parser.add_argument(
+        "--prefetch_workers",
+        type=int,
+        default=4,
+        help="Maximum number of data files downloaded at the same time when prefetching",
+    )
+    parser.add_argument(
+        "--prefetch_queue_size",
+        type=int,
+        default=8,
+        help="Maximum number of downloaded partitions (or data files) waiting to be extracted",
+    )
+    parser.add_argument(
+        "--prefetch_retries",
+        type=int,
+        default=3,
+        help="Number of times a failed download is retried, with exponential backoff",
+    )
+    parser.add_argument(
+        "--prefetch_directory",
+        type=str,
+        help="Directory to stage prefetched data files in (defaults to the system temp directory)",
+    )
+    parser.add_argument(
+        "--s3_endpoint",
+        type=str,
+        help="URL of an S3-compatible endpoint to read the source from, e.g. http://localhost:9000",
+    )
+    add_resource_arguments(parser)
+    add_profiling_arguments(parser)
+    return parser
+
+
+# Function to validate the parsed extraction arguments
+def validate_arguments(parser: argparse.ArgumentParser, args: argparse.Namespace) -> argparse.Namespace:
+    """
+    Reject incompatible extraction options and derive the profiling flag.
+    
+    Args:
+        parser (argparse.ArgumentParser): The parser, used to report errors.
+        args (argparse.Namespace): The parsed arguments.
+    
+    Returns:
+        argparse.Namespace: The validated arguments.
+    """
+    if args.parquet_base_path and args.bulk:
+        parser.error("--bulk cannot be combined with --parquet_base_path")
+    if args.streaming and (args.bulk or args.parquet_base_path):
+        parser.error("--streaming cannot be combined with --bulk or --parquet_base_path")
+    if args.prefetch and args.bulk:
+        parser.error("--prefetch cannot be combined with --bulk")
+    args.profile = args.profile or bool(args.profile_output_path or args.prometheus_output_path)
+    return args
+
+
+# Function to parse the command-line arguments of the extraction process
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse and validate the extraction arguments.
+    
+    Args:
+        argv (Optional[List[str]]): Arguments to parse, defaults to the command line.
+    
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = build_argument_parser()
+    return validate_arguments(parser, parser.parse_args(argv))
+
+
+# Main function to set up argument parsing and invoke the extraction process
+def main():
+    """
+    Main entry point for the CLI tool. Parses arguments and triggers the extraction process.
+    """
+    logging.getLogger().setLevel(logging.INFO)  # Set logging level to INFO
 
     # Parse arguments
-    args = parser.parse_args()
-    # Trigger the data extraction process
-    extract_data(args)
+    args = parse_arguments()
+    # Trigger the data extraction process, and exit with an error if any file failed so schedulers notice
+    if extract_data(args):
+        sys.exit(1)
 
 
 # Entry point for the script
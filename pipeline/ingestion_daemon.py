@@ -0,0 +1,620 @@
+# Import necessary modules
+import argparse  # For command-line argument parsing
+import logging  # For logging information
+import queue  # For handing micro-batches from the watcher to the writer
+import signal  # For shutting down cleanly on SIGINT and SIGTERM
+import threading  # For watching the source tree while batches are ingested
+import time  # For the batch wait and poll intervals
+from datetime import datetime  # For working with date and time
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple  # For type hinting
+
+from duckdb import DuckDBPyConnection, Error  # Connection type and exception handling for DuckDB
+from jinja2 import Template  # For templating dynamic strings
+
+# Import custom database manager functions
+from database_manager import (
+    connect_to_database,  # To connect to the database
+    close_database_connection,  # To close the database connection
+    is_writer_waiting,  # To release the database to another pipeline stage
+    read_query,  # To read SQL queries from files
+    add_resource_arguments,  # To add the resource limit CLI arguments
+    read_resource_settings,  # To read the resource limits from the arguments
+)
+from extraction import (
+    BATCH_RELATION,  # Relation each streamed chunk is registered as
+    LATEST_VALUES_QUERY_PATH,  # Default query merging new records into the latest values
+    VECTOR_SIZE,  # Rows per DuckDB vector
+    BatchInsert,  # Insert statement and chunk size of a streamed scan
+    compile_data_files_query,  # To render the extraction query of a unit
+    compile_parquet_output_path,  # To map a partition to its Parquet file
+    create_parquet_view,  # To expose the Parquet files as the raw table
+    extract_data_files,  # To extract units one after the other
+    extract_data_files_parallel,  # To extract units concurrently
+    log_extraction_summary,  # To log the outcome of a batch
+    read_location_ids,  # To read the configured locations
+    record_ingested_data_files,  # To record the ingested files in the manifest
+    update_latest_values,  # To merge new records into the latest values
+)
+from data_quality import run_quality_checks  # To check the records of every batch
+from source_index import PARTITION_PATTERN, SourceIndex, compile_partition_path  # To list the source tree
+from transformation import load_transformation_scripts, run_transformations  # To refresh the presentation objects
+
+
+# Settings of the source watcher
+class WatchSettings(NamedTuple):
+    poll_interval: float = 30.0  # Seconds between two listings of the source tree
+    batch_max_files: int = 100  # Files after which a micro-batch is flushed
+    batch_max_bytes: int = 256 * 1024 * 1024  # Bytes after which a micro-batch is flushed
+    batch_max_wait: float = 60.0  # Seconds a micro-batch may wait for more files before it is flushed
+    start_date: Optional[str] = None  # Earliest partition month to ingest, in YYYY-MM format
+
+
+# Files to ingest together, and the files of the partitions they belong to
+class MicroBatch(NamedTuple):
+    file_stats: Dict[str, Tuple[int, datetime]]  # Size and modification time of each new or changed file
+    partitions: Dict[str, List[str]]  # All files of each affected partition at the time of listing
+
+
+class SourceWatcher(threading.Thread):
+    """
+    Polls the source tree and queues new or changed files as micro-batches.
+
+    A file is only queued once its size and modification time are unchanged
+    between two listings, so files still being written are not ingested half
+    way. Files known to be ingested start from the ingestion manifest and are
+    tracked in memory afterwards. A batch is flushed when it reaches the file
+    or byte limit, or when its oldest file has waited long enough. The queue is
+    bounded, so the watcher stops listing while the writer falls behind.
+    """
+
+    def __init__(
+        self,
+        con: DuckDBPyConnection,
+        base_path: str,
+        location_ids: List[str],
+        ingested: Dict[str, Tuple[int, datetime]],
+        settings: WatchSettings,
+        batches: queue.Queue,
+        stop: threading.Event,
+    ):
+        super().__init__(name="source-watcher", daemon=True)
+        self.con = con
+        self.base_path = base_path
+        self.location_ids = set(location_ids)
+        self.settings = settings
+        self.batches = batches
+        self.stop = stop
+        self.lock = threading.Lock()  # Guards the ingested files, which the writer updates on failures
+        self.ingested = dict(ingested)  # Stats of the files ingested (or queued) so far
+        self.candidates: Dict[str, Tuple[int, datetime]] = {}  # Stats of changed files seen in the last listing
+        self.error: Optional[BaseException] = None
+
+    def run(self) -> None:
+        # List on a cursor of the listing connection, which is not shared with the writer
+        cursor = self.con.cursor()
+        try:
+            self.watch(cursor)
+        except BaseException as e:
+            self.error = e
+            logging.exception("Source watcher failed")
+            self.stop.set()  # Shut the writer down too
+        finally:
+            cursor.close()
+
+    def watch(self, cursor: DuckDBPyConnection) -> None:
+        pending: Dict[str, Tuple[int, datetime]] = {}  # Files of the batch being filled
+        pending_since = 0.0  # When the first file of the batch was found
+        index = None
+        while not self.stop.is_set():
+            try:
+                index = SourceIndex.list(cursor, self.base_path, sorted(self.location_ids))
+            except Error as e:
+                logging.warning(f"Failed to list {self.base_path}, retrying in {self.settings.poll_interval}s: {e}")
+            else:
+                for file, stats in self.find_stable_files(index).items():
+                    if not pending:
+                        pending_since = time.monotonic()
+                    pending[file] = stats
+
+            # Flush full batches first, then the remainder once it has waited long enough
+            while pending and (
+                self.is_full(pending) or time.monotonic() - pending_since >= self.settings.batch_max_wait
+            ):
+                batch_files = self.take_batch(pending)
+                if not self.put(self.build_batch(index, batch_files)):
+                    return
+                pending_since = time.monotonic()
+            self.stop.wait(self.settings.poll_interval)
+
+    def find_stable_files(self, index: SourceIndex) -> Dict[str, Tuple[int, datetime]]:
+        """
+        Compare a listing with the previous one and the ingested files.
+
+        Args:
+            index (SourceIndex): The latest listing of the source tree.
+
+        Returns:
+            Dict[str, Tuple[int, datetime]]: The new or changed files whose size and
+                                             modification time match the previous listing.
+        """
+        changed = {}
+        for partition_path, files in index.partitions.items():
+            if not self.is_watched(partition_path):
+                continue
+            for file in files:
+                changed[file.path] = (file.size, file.last_modified)
+
+        with self.lock:
+            changed = {file: stats for file, stats in changed.items() if self.ingested.get(file) != stats}
+            stable = {file: stats for file, stats in changed.items() if self.candidates.get(file) == stats}
+            # Claim the stable files now, so they are not queued twice
+            self.ingested.update(stable)
+        self.candidates = {file: stats for file, stats in changed.items() if file not in stable}
+        return stable
+
+    def is_watched(self, partition_path: str) -> bool:
+        """
+        Check whether a partition belongs to a configured location and is recent enough.
+
+        Args:
+            partition_path (str): Partition path, as built by compile_partition_path.
+
+        Returns:
+            bool: Whether the partition is ingested.
+        """
+        location_id, year, month = PARTITION_PATTERN.search(partition_path).groups()
+        if location_id not in self.location_ids:
+            return False
+        return not self.settings.start_date or f"{year}-{month}" >= self.settings.start_date
+
+    def is_full(self, pending: Dict[str, Tuple[int, datetime]]) -> bool:
+        return (
+            len(pending) >= self.settings.batch_max_files
+            or sum(size for size, _ in pending.values()) >= self.settings.batch_max_bytes
+        )
+
+    def take_batch(self, pending: Dict[str, Tuple[int, datetime]]) -> Dict[str, Tuple[int, datetime]]:
+        # Take files in listing order until a limit is reached; every batch holds at least one file
+        batch_files: Dict[str, Tuple[int, datetime]] = {}
+        batch_bytes = 0
+        for file in list(pending):
+            if batch_files and (
+                len(batch_files) >= self.settings.batch_max_files
+                or batch_bytes + pending[file][0] > self.settings.batch_max_bytes
+            ):
+                break
+            batch_files[file] = pending.pop(file)
+            batch_bytes += batch_files[file][0]
+        return batch_files
+
+    def build_batch(self, index: SourceIndex, file_stats: Dict[str, Tuple[int, datetime]]) -> MicroBatch:
+        partitions = {}
+        for file in file_stats:
+            match = PARTITION_PATTERN.search(file)
+            partition_path = compile_partition_path(*match.groups())
+            # A file removed since it was found leaves its partition without it
+            partitions[partition_path] = [
+                source_file.path for source_file in index.partitions.get(partition_path, [])
+            ] or [file]
+        return MicroBatch(file_stats, partitions)
+
+    def put(self, batch: MicroBatch) -> bool:
+        """
+        Queue a batch, waiting while the queue is full.
+
+        Args:
+            batch (MicroBatch): The batch to queue.
+
+        Returns:
+            bool: Whether the batch was queued; False when shutting down.
+        """
+        while not self.stop.is_set():
+            try:
+                self.batches.put(batch, timeout=1.0)
+                logging.info(f"Queued a batch of {len(batch.file_stats)} files ({self.batches.qsize()} waiting)")
+                return True
+            except queue.Full:
+                continue  # Backpressure: no listing until the writer catches up
+        return False
+
+    def forget(self, files: List[str]) -> None:
+        """
+        Mark files as not ingested, so they are queued again once they are stable.
+
+        Args:
+            files (List[str]): Full paths of the files.
+        """
+        with self.lock:
+            for file in files:
+                self.ingested.pop(file, None)
+
+
+# Function to read the files recorded in the ingestion manifest
+def read_ingested_files(con: DuckDBPyConnection) -> Dict[str, Tuple[int, datetime]]:
+    """
+    Read the size and modification time of every file in the ingestion manifest.
+
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+
+    Returns:
+        Dict[str, Tuple[int, datetime]]: The recorded stats of each ingested file.
+    """
+    return {
+        file_path: (file_size, last_modified)
+        for file_path, file_size, last_modified in con.execute(
+            "SELECT file_path, file_size, last_modified FROM raw.ingestion_manifest"
+        ).fetchall()
+    }
+
+
+class IngestionDaemon:
+    """
+    Ingests the micro-batches queued by the source watcher.
+
+    Templates, locations and the analyzed transformation scripts are loaded
+    once. Every batch is extracted, recorded in the manifest, merged into the
+    latest values, checked and transformed, and only the presentation objects
+    whose SQL or source data changed are refreshed.
+    """
+
+    def __init__(self, con: DuckDBPyConnection, args: argparse.Namespace):
+        self.args = args
+        self.extract_query_template = Template(read_query(path=args.extract_query_template_path))
+        self.latest_values_query_template = (
+            Template(read_query(path=args.latest_values_query_path)) if args.latest_values_query_path else None
+        )
+        self.quality_query_template = (
+            Template(read_query(path=args.quality_query_template_path)) if args.quality_query_template_path else None
+        )
+        self.scripts, self.dependencies = (
+            load_transformation_scripts(con, args.query_directory) if args.query_directory else ([], {})
+        )
+        self.batch_insert = None
+        if args.streaming:
+            self.batch_insert = BatchInsert(
+                self.extract_query_template.render(batch_relation=BATCH_RELATION), args.batch_rows
+            )
+
+    def ingest(self, con: DuckDBPyConnection, batch: MicroBatch) -> Set[str]:
+        """
+        Ingest a micro-batch and refresh the objects depending on it.
+
+        Args:
+            con (DuckDBPyConnection): The writer connection to the database.
+            batch (MicroBatch): The batch to ingest.
+
+        Returns:
+            Set[str]: The files that were not ingested.
+        """
+        started = time.monotonic()
+
+        if self.args.parquet_base_path:
+            # Rewrite the Parquet file of every partition with new or changed files
+            units = batch.partitions
+            output_paths = {
+                partition_path: compile_parquet_output_path(self.args.parquet_base_path, partition_path)
+                for partition_path in units
+            }
+        else:
+            # Load each file with its own query, so the manifest gets its row count
+            units = {file: [file] for file in batch.file_stats}
+            output_paths = {}
+
+        queries = {
+            key: compile_data_files_query(
+                files,
+                self.extract_query_template,
+                output_path=output_paths.get(key),
+                stream_source=self.batch_insert is not None,
+            )
+            for key, files in units.items()
+        }
+        if self.args.workers > 1:
+            unit_results = extract_data_files_parallel(
+                con, queries, workers=self.args.workers, batch_insert=self.batch_insert
+            )
+        else:
+            unit_results = extract_data_files(con, queries, batch_insert=self.batch_insert)
+
+        # Attribute the result of each query to the batch's files; row counts only apply to single files
+        file_results = {
+            file: result if len(units[key]) == 1 else result._replace(row_count=None)
+            for key, result in unit_results.items()
+            for file in units[key]
+            if file in batch.file_stats
+        }
+        record_ingested_data_files(con, batch.file_stats, file_results)
+        log_extraction_summary(file_results)
+
+        # The view over the Parquet files picks up new files by itself, so it is only created once
+        if self.args.parquet_base_path and not con.execute(
+            "SELECT 1 FROM duckdb_views() WHERE schema_name = 'raw' AND view_name = 'air_quality'"
+        ).fetchall():
+            create_parquet_view(con, self.args.parquet_base_path, self.extract_query_template)
+
+        # Refresh only what depends on the new records
+        if self.latest_values_query_template is not None:
+            update_latest_values(con, self.latest_values_query_template)
+        if self.quality_query_template is not None:
+            run_quality_checks(
+                con,
+                self.quality_query_template,
+                outlier_threshold=self.args.outlier_threshold,
+                min_value_count=self.args.min_value_count,
+                max_gap_hours=self.args.max_gap_hours,
+                tag=self.args.quality_query_template_path,
+            )
+        if self.scripts:
+            run_transformations(
+                con,
+                self.scripts,
+                self.dependencies,
+                materialize=self.args.materialize,
+                workers=self.args.transform_workers,
+            )
+
+        logging.info(f"Ingested a batch of {len(batch.file_stats)} files in {time.monotonic() - started:.2f}s")
+        return {file for file, result in file_results.items() if result.status != "extracted"}
+
+
+# Main function running the ingestion daemon
+def run_daemon(args: argparse.Namespace) -> None:
+    """
+    Watch the source tree and ingest new or changed files until stopped.
+
+    The source is listed on an in-memory connection. The database is opened
+    for the first batch and kept open while batches follow each other, so the
+    catalog and the caches are not reloaded for every batch. It is released
+    once no batch has arrived for `--writer_idle_timeout` seconds, or as soon
+    as another pipeline stage waits for it, so the dashboard and the other
+    stages can use it between bursts. SIGINT and SIGTERM stop the watcher and
+    let the batch being ingested finish; batches still queued are not recorded
+    in the manifest, so the next start picks them up again.
+
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments.
+    """
+    stop = threading.Event()
+
+    def request_shutdown(signum, frame) -> None:
+        logging.info(f"Received {signal.Signals(signum).name}, finishing the current batch")
+        stop.set()
+
+    previous_handlers = {
+        signum: signal.signal(signum, request_shutdown) for signum in (signal.SIGINT, signal.SIGTERM)
+    }
+
+    # Load the scripts and the files ingested so far, then release the database
+    con = connect_to_database(path=args.database_path, s3_endpoint=args.s3_endpoint, **read_resource_settings(args))
+    try:
+        daemon = IngestionDaemon(con, args)
+        ingested = read_ingested_files(con)
+    finally:
+        close_database_connection(con)
+
+    # The watcher lists the source without holding the database
+    listing_con = connect_to_database(path=":memory:", s3_endpoint=args.s3_endpoint)
+    try:
+        batches: queue.Queue = queue.Queue(maxsize=args.max_queued_batches)
+        watcher = SourceWatcher(
+            listing_con,
+            args.source_base_path,
+            read_location_ids(args.locations_file_path),
+            ingested,
+            WatchSettings(
+                poll_interval=args.poll_interval,
+                batch_max_files=args.batch_max_files,
+                batch_max_bytes=args.batch_max_bytes,
+                batch_max_wait=args.batch_max_wait,
+                start_date=args.start_date,
+            ),
+            batches,
+            stop,
+        )
+        watcher.start()
+        logging.info(f"Watching {args.source_base_path} every {args.poll_interval}s")
+
+        con = None  # Writer connection, kept while batches follow each other
+        idle_since = time.monotonic()
+        try:
+            while not stop.is_set():
+                try:
+                    batch = batches.get(timeout=0.1 if con is not None else 1.0)
+                except queue.Empty:
+                    # Release the database once idle, or as soon as another stage waits for it
+                    if con is not None and (
+                        time.monotonic() - idle_since >= args.writer_idle_timeout
+                        or is_writer_waiting(args.database_path)
+                    ):
+                        close_database_connection(con)
+                        con = None
+                    continue
+                if con is None:
+                    con = connect_to_database(
+                        path=args.database_path, s3_endpoint=args.s3_endpoint, **read_resource_settings(args)
+                    )
+                failed = daemon.ingest(con, batch)
+                idle_since = time.monotonic()
+                if failed:
+                    logging.warning(f"Retrying {len(failed)} files once they are listed again")
+                    watcher.forget(sorted(failed))
+        finally:
+            if con is not None:
+                close_database_connection(con)
+
+        watcher.join()
+        logging.info(f"Stopped with {batches.qsize()} batches not ingested")
+        if watcher.error is not None:
+            raise watcher.error
+    finally:
+        close_database_connection(listing_con)
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+
+
+# Function to parse the command-line arguments of the ingestion daemon
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse and validate the ingestion daemon arguments.
+
+    Args:
+        argv (Optional[List[str]]): Arguments to parse, defaults to the command line.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    # Set up argument parser
+    parser = argparse.ArgumentParser(description="Daemon for Continuous Ingestion")
+
+    # Define required arguments
+    parser.add_argument(
+        "--locations_file_path",
+        type=str,
+        required=True,
+        help="Path to the locations JSON file",
+    )
+    parser.add_argument(
+        "--extract_query_template_path",
+        type=str,
+        required=True,
+        help="Path to the SQL extraction query template",
+    )
+    parser.add_argument(
+        "--database_path", type=str, required=True, help="Path to the database"
+    )
+    parser.add_argument(
+        "--source_base_path",
+        type=str,
+        required=True,
+        help="Base path of the source tree to watch, local or remote",
+    )
+
+    # Define the watch and micro-batch arguments
+    parser.add_argument(
+        "--start_date", type=str, help="Ignore partitions before this month, in YYYY-MM format"
+    )
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=30.0,
+        help="Seconds between two listings of the source tree; files are ingested once unchanged between listings",
+    )
+    parser.add_argument(
+        "--batch_max_files",
+        type=int,
+        default=100,
+        help="Maximum number of files per micro-batch",
+    )
+    parser.add_argument(
+        "--batch_max_bytes",
+        type=int,
+        default=256 * 1024 * 1024,
+        help="Maximum number of bytes per micro-batch",
+    )
+    parser.add_argument(
+        "--batch_max_wait",
+        type=float,
+        default=60.0,
+        help="Seconds a micro-batch waits for more files before it is ingested",
+    )
+    parser.add_argument(
+        "--writer_idle_timeout",
+        type=float,
+        default=5.0,
+        help="Seconds the database stays open after a micro-batch, so the next one reuses the connection",
+    )
+    parser.add_argument(
+        "--max_queued_batches",
+        type=int,
+        default=2,
+        help="Micro-batches waiting to be ingested before the source tree is no longer listed",
+    )
+
+    # Define the extraction arguments
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of data files of a micro-batch to extract concurrently",
+    )
+    parser.add_argument(
+        "--parquet_base_path",
+        type=str,
+        help="Land data as Parquet files partitioned by location, year and month under this path "
+             "(use with the Parquet export query template)",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Insert each data file in chunks of --batch_rows rows, so memory use does not grow with file size",
+    )
+    parser.add_argument(
+        "--batch_rows",
+        type=int,
+        default=100 * VECTOR_SIZE,
+        help="Approximate number of rows per chunk when streaming",
+    )
+    parser.add_argument(
+        "--s3_endpoint",
+        type=str,
+        help="URL of an S3-compatible endpoint to read the source from, e.g. http://localhost:9000",
+    )
+
+    # Define the arguments of the stages run after every micro-batch
+    parser.add_argument(
+        "--latest_values_query_path",
+        type=str,
+        default=LATEST_VALUES_QUERY_PATH,
+        help="Path to the SQL query updating presentation.latest_values with the extracted records "
+             "(defaults to the upsert query in sql/dml/raw)",
+    )
+    parser.add_argument(
+        "--quality_query_template_path",
+        type=str,
+        help="Path to the SQL data-quality check query template; checks every micro-batch when given",
+    )
+    parser.add_argument("--outlier_threshold", type=float, default=6.0, help="See data_quality.py")
+    parser.add_argument("--min_value_count", type=int, default=30, help="See data_quality.py")
+    parser.add_argument("--max_gap_hours", type=int, default=3, help="See data_quality.py")
+    parser.add_argument(
+        "--query_directory",
+        type=str,
+        help="Directory containing SQL transformation queries; refreshes the affected ones after every micro-batch",
+    )
+    parser.add_argument(
+        "--materialize",
+        action="store_true",
+        help="Create tables instead of views and refresh them incrementally",
+    )
+    parser.add_argument(
+        "--transform_workers",
+        type=int,
+        default=1,
+        help="Number of independent transformation queries to run concurrently",
+    )
+    add_resource_arguments(parser)
+
+    # Parse arguments
+    args = parser.parse_args(argv)
+    if args.streaming and args.parquet_base_path:
+        parser.error("--streaming cannot be combined with --parquet_base_path")
+    return args
+
+
+# Main function to set up argument parsing and start the daemon
+def main():
+    """
+    Main entry point for the daemon. Parses arguments and watches the source tree until stopped.
+    """
+    logging.getLogger().setLevel(logging.INFO)  # Set logging level to INFO
+
+    # Parse arguments
+    args = parse_arguments()
+    # Ingest new data until SIGINT or SIGTERM
+    run_daemon(args)
+
+
+# Entry point for the script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# Import necessary modules
+import asyncio  # For overlapping downloads with ingestion
+import logging  # For logging information
+import os  # For file and directory operations
+import shutil  # For removing the staging directory
+import tempfile  # For the staging directory
+from concurrent.futures import ThreadPoolExecutor  # For running DuckDB calls off the event loop
+from typing import Callable, Dict, List, NamedTuple, Optional, TypeVar  # For type hinting
+
+from duckdb import DuckDBPyConnection, Error  # Connection type and exception handling for DuckDB
+
+from database_manager import execute_query  # To execute SQL queries
+
+# Result of ingesting a unit, as returned by the ingest function
+T = TypeVar("T")
+
+
+# Settings of the prefetcher
+class PrefetchSettings(NamedTuple):
+    workers: int = 4  # Maximum number of files downloaded at the same time
+    queue_size: int = 8  # Maximum number of downloaded units waiting to be ingested
+    retries: int = 3  # Number of times a failed download is retried
+    retry_delay: float = 1.0  # Seconds before the first retry, doubled after every attempt
+    directory: Optional[str] = None  # Directory the files are staged in, defaults to the system temp directory
+
+
+# Function to download a single file to the local disk
+def download_file(con: DuckDBPyConnection, source_path: str, target_path: str) -> None:
+    """
+    Copy a file, local or remote, to a local path.
+
+    The file is read with read_blob, so remote files are fetched with the same
+    S3 and HTTP settings as every other query. The target appears atomically.
+
+    Args:
+        con (DuckDBPyConnection): Connection (or cursor) used to read the file.
+        source_path (str): Full path or URL of the file.
+        target_path (str): Local path to write the file to.
+    """
+    escaped_path = source_path.replace("'", "''")
+    query = f"SELECT content FROM read_blob('{escaped_path}')"
+    row = execute_query(con, query, tag=source_path).fetchone()
+    if row is None:
+        raise FileNotFoundError(source_path)
+
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    with open(f"{target_path}.tmp", "wb") as f:
+        f.write(row[0])
+    os.replace(f"{target_path}.tmp", target_path)
+
+
+class Prefetcher:
+    """
+    Downloads the files of upcoming units while earlier units are ingested.
+
+    Downloads run concurrently up to a limit and are retried with exponential
+    backoff. Downloaded units wait in a bounded queue, so downloads pause when
+    ingestion falls behind and at most `queue_size` plus `workers` units are
+    staged on disk at any time. Files are staged under the same relative paths
+    as in the source tree, so partition columns read from the paths are kept.
+    """
+
+    def __init__(self, con: DuckDBPyConnection, base_path: str, settings: PrefetchSettings):
+        self.con = con
+        self.base_path = base_path.rstrip("/")
+        self.settings = settings
+
+    def run(
+        self,
+        units: Dict[str, List[str]],
+        ingest: Callable[[DuckDBPyConnection, str, List[str]], T],
+        ingest_workers: int = 1,
+    ) -> Dict[str, Optional[T]]:
+        """
+        Download every unit and ingest it as soon as it is complete.
+
+        Args:
+            units (Dict[str, List[str]]): The files of each unit, keyed by unit.
+            ingest (Callable[[DuckDBPyConnection, str, List[str]], T]): Function ingesting the
+                local copies of a unit's files on a cursor of the connection.
+            ingest_workers (int): Maximum number of units ingested at the same time.
+
+        Returns:
+            Dict[str, Optional[T]]: The ingest result of each unit, None for units that
+                                    could not be downloaded.
+        """
+        if not units:
+            return {}
+
+        if self.settings.directory:
+            os.makedirs(self.settings.directory, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix="extraction-prefetch-", dir=self.settings.directory)
+        # DuckDB releases the GIL while downloading and ingesting, so the threads run in parallel
+        executor = ThreadPoolExecutor(max_workers=self.settings.workers + ingest_workers)
+        try:
+            return asyncio.run(self._run(units, ingest, ingest_workers, staging_dir, executor))
+        finally:
+            executor.shutdown(wait=True)
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def staging_path(self, staging_dir: str, source_path: str) -> str:
+        """
+        Map a source file to its path in the staging directory.
+
+        Args:
+            staging_dir (str): The staging directory.
+            source_path (str): Full path or URL of the file.
+
+        Returns:
+            str: The local path of the file.
+        """
+        if source_path.startswith(f"{self.base_path}/"):
+            relative_path = source_path[len(self.base_path) + 1:]
+        else:
+            relative_path = os.path.basename(source_path)
+        return os.path.join(staging_dir, relative_path)
+
+    async def _run(
+        self,
+        units: Dict[str, List[str]],
+        ingest: Callable[[DuckDBPyConnection, str, List[str]], T],
+        ingest_workers: int,
+        staging_dir: str,
+        executor: ThreadPoolExecutor,
+    ) -> Dict[str, Optional[T]]:
+        loop = asyncio.get_running_loop()
+        downloads = asyncio.Semaphore(self.settings.workers)  # Limits the concurrent file downloads
+        pending: asyncio.Queue = asyncio.Queue()  # Units to download, in the given order
+        ready: asyncio.Queue = asyncio.Queue(maxsize=self.settings.queue_size)  # Downloaded units
+        results: Dict[str, Optional[T]] = {}
+
+        for unit in units.items():
+            pending.put_nowait(unit)
+
+        async def download_with_retries(source_path: str) -> Optional[str]:
+            target_path = self.staging_path(staging_dir, source_path)
+            for attempt in range(self.settings.retries + 1):
+                try:
+                    async with downloads:
+                        await loop.run_in_executor(executor, self._download, source_path, target_path)
+                    return target_path
+                except (Error, OSError) as e:
+                    if attempt == self.settings.retries:
+                        logging.error(f"Failed to download {source_path} after {attempt + 1} attempts: {e}")
+                        return None
+                    delay = self.settings.retry_delay * 2 ** attempt
+                    logging.warning(f"Failed to download {source_path}, retrying in {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
+
+        async def download_units() -> None:
+            while not pending.empty():
+                key, files = pending.get_nowait()
+                local_files = await asyncio.gather(*(download_with_retries(file) for file in files))
+                if any(local_file is None for local_file in local_files):
+                    remove_files([local_file for local_file in local_files if local_file is not None])
+                    local_files = None
+                # Wait here while the queue is full, so downloads never run far ahead of ingestion
+                await ready.put((key, local_files))
+
+        async def ingest_units() -> None:
+            while True:
+                item = await ready.get()
+                if item is None:
+                    return
+                key, local_files = item
+                if local_files is None:
+                    results[key] = None
+                    continue
+                try:
+                    results[key] = await loop.run_in_executor(executor, self._ingest, ingest, key, local_files)
+                finally:
+                    remove_files(local_files)
+
+        async def download_all() -> None:
+            # One download task per file slot, so several units are fetched at once
+            await asyncio.gather(*(download_units() for _ in range(min(self.settings.workers, len(units)))))
+            for _ in range(ingest_workers):
+                await ready.put(None)  # Stop the ingest tasks once the queue is drained
+
+        tasks = [asyncio.ensure_future(download_all())]
+        tasks += [asyncio.ensure_future(ingest_units()) for _ in range(ingest_workers)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()  # Stop the other tasks if one failed
+        return results
+
+    def _download(self, source_path: str, target_path: str) -> None:
+        # Use a dedicated cursor so concurrent downloads do not share state
+        cursor = self.con.cursor()
+        try:
+            download_file(cursor, source_path, target_path)
+        finally:
+            cursor.close()
+
+    def _ingest(
+        self, ingest: Callable[[DuckDBPyConnection, str, List[str]], T], key: str, local_files: List[str]
+    ) -> T:
+        # Use a dedicated cursor so concurrent ingestions run in their own transactions
+        cursor = self.con.cursor()
+        try:
+            return ingest(cursor, key, local_files)
+        finally:
+            cursor.close()
+
+
+# Function to remove staged files
+def remove_files(paths: List[str]) -> None:
+    """
+    Remove local files, ignoring the ones that do not exist.
+
+    Args:
+        paths (List[str]): Paths of the files.
+    """
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,318 @@
+# Import necessary modules
+import json  # For reading DuckDB profiles and writing JSON lines
+import logging  # For logging information
+import os  # For file and directory operations
+import shutil  # For removing the profile directory
+import tempfile  # For the per-connection profile files
+import threading  # For recording statements from worker threads
+import time  # For timing the statements
+import itertools  # For naming the profile files
+import weakref  # For tracking the profiled connections
+from datetime import datetime, timezone  # For timestamping the records
+from typing import Dict, List, NamedTuple, Optional  # For type hinting
+
+from duckdb import DuckDBPyConnection, Error  # Connection type and exception handling for DuckDB
+
+# Operators whose input cardinality is the number of rows the statement wrote
+WRITE_OPERATORS = {"INSERT", "DELETE_OPERATOR", "UPDATE", "CREATE_TABLE_AS", "COPY_TO_FILE", "BATCH_COPY_TO_FILE"}
+
+# Operators reading tables and files (table functions such as read_csv and read_parquet are table scans too)
+SCAN_OPERATORS = {"TABLE_SCAN"}
+
+
+# Record of a single executed statement
+class QueryRecord(NamedTuple):
+    tag: str  # Source SQL file or partition path the statement belongs to
+    query: str  # First line of the statement, without comments
+    started: str  # Start time in ISO 8601 format
+    seconds: float  # Wall time
+    rows: Optional[int]  # Rows written, or returned for reads
+    rows_scanned: Optional[int]  # Rows read by the scan operators
+    bytes_read: Optional[int]  # Bytes produced by the scan operators
+    scans: Optional[List[dict]]  # Source, rows, bytes and time of every scan operator
+    profile: Optional[dict]  # DuckDB profile, the JSON output of EXPLAIN ANALYZE
+
+
+# Function to list the scan operators of a profiled statement
+def read_profile_scans(profile: dict) -> List[dict]:
+    """
+    Collect the tables and files a statement read, with the rows and bytes
+    each scan operator produced.
+
+    DuckDB does not count the bytes a scan reads from storage, so the bytes are
+    the size of the scan's output: the columns the statement needs, decompressed.
+
+    Args:
+        profile (dict): The DuckDB JSON profile of the statement.
+
+    Returns:
+        List[dict]: One entry per scan operator.
+    """
+    scans = []
+    operators = list(profile.get("children") or [])
+    while operators:
+        operator = operators.pop()
+        operators.extend(operator.get("children") or [])
+        if operator.get("operator_type") not in SCAN_OPERATORS:
+            continue
+        extra_info = operator.get("extra_info") or {}
+        scans.append({
+            "source": extra_info.get("Text") or extra_info.get("Function") or operator.get("operator_name", ""),
+            "rows_scanned": operator.get("operator_rows_scanned", 0),
+            "rows": operator.get("operator_cardinality", 0),
+            "bytes": operator.get("result_set_size", 0),
+            "seconds": operator.get("operator_timing", 0.0),
+        })
+    return scans
+
+
+# Function to count the rows affected by a profiled statement
+def read_profile_rows(profile: dict) -> Optional[int]:
+    """
+    Count the rows a statement wrote, or the rows it returned for reads.
+
+    Args:
+        profile (dict): The DuckDB JSON profile of the statement.
+
+    Returns:
+        Optional[int]: The row count, if the profile has one.
+    """
+    operators = profile.get("children") or []
+    if operators and operators[0].get("operator_type") in WRITE_OPERATORS:
+        return sum(child.get("operator_cardinality", 0) for child in operators[0].get("children", []))
+    return profile.get("rows_returned")
+
+
+# Function to escape a Prometheus label value
+def escape_label(value: str) -> str:
+    """
+    Escape a value for use as a Prometheus label value.
+
+    Args:
+        value (str): The label value.
+
+    Returns:
+        str: The escaped label value.
+    """
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class QueryProfiler:
+    """
+    Collects the wall time, affected rows, rows and bytes scanned and DuckDB
+    profile of every statement run through `execute_query`.
+
+    DuckDB writes the profile of the last statement of a connection to a file,
+    so each connection and cursor gets its own profile file, and statements
+    running at the same time on different cursors do not mix. The scan figures
+    come from the scan operators of the profile. DuckDB writes the profile of
+    a streamed result once it has been fetched, so such records are completed
+    when their cursor runs its next statement, or when the records are read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records: List[QueryRecord] = []
+        self._pending: Dict[str, QueryRecord] = {}  # Records waiting for their profile, by profile path
+        self._profile_dir = tempfile.mkdtemp(prefix="query-profiles-")
+        self._profile_paths = weakref.WeakKeyDictionary()  # Profile file of every profiled connection
+        self._profile_names = itertools.count()
+
+    @property
+    def records(self) -> List[QueryRecord]:
+        """
+        The records collected so far, including those of streamed results.
+        """
+        with self._lock:
+            pending = list(self._pending)
+        for profile_path in pending:
+            self._complete(profile_path)
+        with self._lock:
+            return list(self._records)
+
+    def _profile_path(self, con: DuckDBPyConnection) -> str:
+        """
+        Return the profile file of a connection, enabling profiling on it the first time.
+
+        Args:
+            con (DuckDBPyConnection): Connection (or cursor) to profile.
+
+        Returns:
+            str: Path to the connection's profile file.
+        """
+        with self._lock:
+            profile_path = self._profile_paths.get(con)
+            if profile_path is not None:
+                return profile_path
+            profile_path = os.path.join(self._profile_dir, f"{next(self._profile_names)}.json")
+            self._profile_paths[con] = profile_path
+        # Profiling settings are per connection, and stay enabled so the result is not discarded
+        con.execute("SET enable_profiling = 'json'")
+        con.execute(f"SET profiling_output = '{profile_path}'")
+        return profile_path
+
+    def _complete(self, profile_path: str) -> None:
+        """
+        Complete the pending record of a profile file with the profile, if DuckDB wrote one.
+
+        Args:
+            profile_path (str): Path to the profile file.
+        """
+        with self._lock:
+            record = self._pending.pop(profile_path, None)
+        if record is None:
+            return
+        try:
+            with open(profile_path, "r") as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            profile = None  # The statement failed before a profile was written
+        if profile:
+            scans = read_profile_scans(profile)
+            record = record._replace(
+                # Streamed results are timed up to their last fetch
+                seconds=max(record.seconds, profile.get("latency") or 0.0),
+                rows=read_profile_rows(profile),
+                rows_scanned=sum(scan["rows_scanned"] for scan in scans),
+                bytes_read=sum(scan["bytes"] for scan in scans),
+                scans=scans,
+                profile=profile,
+            )
+        with self._lock:
+            self._records.append(record)
+
+    def execute(self, con: DuckDBPyConnection, query: str, tag: Optional[str] = None) -> DuckDBPyConnection:
+        """
+        Execute a query with DuckDB profiling enabled and record it.
+
+        Args:
+            con (DuckDBPyConnection): Connection (or cursor) to execute the query on.
+            query (str): The SQL query to execute.
+            tag (Optional[str]): Source SQL file or partition path of the query.
+
+        Returns:
+            DuckDBPyConnection: The connection, positioned on the query result.
+        """
+        profile_path = self._profile_path(con)
+        self._complete(profile_path)  # The previous statement of the cursor has finished
+        if os.path.exists(profile_path):
+            os.remove(profile_path)  # Do not attribute an older profile to a failed statement
+
+        started = datetime.now(timezone.utc).isoformat()
+        start = time.perf_counter()
+        try:
+            return con.execute(query)
+        finally:
+            seconds = time.perf_counter() - start
+            # Identify the statement by its first line that is not a comment
+            lines = [
+                line.strip() for line in query.splitlines()
+                if line.strip() and not line.strip().startswith("--")
+            ]
+            with self._lock:
+                self._pending[profile_path] = QueryRecord(
+                    tag=tag or "",
+                    query=lines[0] if lines else "",
+                    started=started,
+                    seconds=seconds,
+                    rows=None,
+                    rows_scanned=None,
+                    bytes_read=None,
+                    scans=None,
+                    profile=None,
+                )
+            # Results that are not streamed have their profile written already
+            if os.path.exists(profile_path):
+                self._complete(profile_path)
+
+    def write_json_lines(self, path: str) -> None:
+        """
+        Append one JSON object per recorded statement to a file.
+
+        Args:
+            path (str): Path to the JSON lines file.
+        """
+        with open(path, "a") as f:
+            for record in self.records:
+                f.write(json.dumps(record._asdict()) + "\n")
+        logging.info(f"Wrote {len(self.records)} query records to {path}")
+
+    def write_prometheus(self, path: str, job: str) -> None:
+        """
+        Write the totals per tag in the Prometheus text exposition format, e.g.
+        for the node exporter textfile collector. The file is replaced atomically.
+
+        Args:
+            path (str): Path to the Prometheus text file.
+            job (str): Name of the pipeline stage, added as a label.
+        """
+        totals: Dict[str, Dict[str, float]] = {}
+        for record in self.records:
+            total = totals.setdefault(
+                record.tag, {"statements": 0, "seconds": 0.0, "rows": 0, "rows_scanned": 0, "bytes_read": 0}
+            )
+            total["statements"] += 1
+            total["seconds"] += record.seconds
+            total["rows"] += record.rows or 0
+            total["rows_scanned"] += record.rows_scanned or 0
+            total["bytes_read"] += record.bytes_read or 0
+
+        metrics = [
+            ("pipeline_query_statements", "statements", "Number of statements executed"),
+            ("pipeline_query_seconds", "seconds", "Wall time of the statements in seconds"),
+            ("pipeline_query_rows", "rows", "Rows written or returned by the statements"),
+            ("pipeline_query_rows_scanned", "rows_scanned", "Rows read by the scan operators of the statements"),
+            ("pipeline_query_bytes_read", "bytes_read", "Bytes produced by the scan operators of the statements"),
+        ]
+        lines = []
+        for name, key, description in metrics:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            for tag, total in sorted(totals.items()):
+                lines.append(f"{name}{{job=\"{escape_label(job)}\",tag=\"{escape_label(tag)}\"}} {total[key]}")
+
+        with open(f"{path}.tmp", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(f"{path}.tmp", path)
+        logging.info(f"Wrote query metrics to {path}")
+
+    def log_summary(self, limit: int = 10) -> None:
+        """
+        Log the slowest statements and the slowest tags of the run.
+
+        Args:
+            limit (int): Number of statements and tags to list.
+        """
+        records = self.records
+        logging.info(f"Profiled {len(records)} statements in {sum(r.seconds for r in records):.3f}s")
+
+        for record in sorted(records, key=lambda r: r.seconds, reverse=True)[:limit]:
+            logging.info(
+                f"Slow statement {record.seconds:.3f}s, {record.rows} rows, {record.rows_scanned} rows "
+                f"and {record.bytes_read} bytes scanned: {record.tag} | {record.query}"
+            )
+            # Name the tables and files behind the slowest statements
+            for scan in record.scans or []:
+                logging.info(
+                    f"    Scan of {scan['source']}: {scan['rows_scanned']} rows, "
+                    f"{scan['bytes']} bytes in {scan['seconds']:.3f}s"
+                )
+
+        tag_seconds: Dict[str, float] = {}
+        for record in records:
+            tag_seconds[record.tag] = tag_seconds.get(record.tag, 0.0) + record.seconds
+        for tag, seconds in sorted(tag_seconds.items(), key=lambda item: item[1], reverse=True)[:limit]:
+            logging.info(f"Slow source {seconds:.3f}s: {tag}")
+
+    def close(self) -> None:
+        """
+        Disable profiling on the connections that are still open and remove the profile files.
+        """
+        with self._lock:
+            connections = list(self._profile_paths.keys())
+        for con in connections:
+            try:
+                con.execute("PRAGMA disable_profiling")
+            except Error:
+                pass  # The connection or cursor has been closed already
+        shutil.rmtree(self._profile_dir, ignore_errors=True)
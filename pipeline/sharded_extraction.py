@@ -0,0 +1,352 @@
+# Import necessary modules
+import argparse  # For command-line argument parsing
+import json  # For writing the locations of every shard
+import logging  # For logging information
+import multiprocessing  # For starting the shard processes
+import os  # For file and directory operations
+import shutil  # For removing the shard directory
+import sys  # For the exit status of failed shards
+import tempfile  # For the default shard directory
+import uuid  # For attaching the shards under names no database uses
+from concurrent.futures import ProcessPoolExecutor, as_completed  # For extracting the shards concurrently
+from typing import List, Optional  # For type hinting
+
+from duckdb import DuckDBPyConnection  # Type for DuckDB connection
+from jinja2 import Template  # For templating dynamic strings
+
+# Import custom database manager functions
+from database_manager import (
+    connect_to_database,  # To connect to the database
+    close_database_connection,  # To close the database connection
+    execute_query,  # To execute SQL queries
+    enable_query_profiling,  # To record every executed statement
+    disable_query_profiling,  # To summarize and export the recorded statements
+    read_query,  # To read SQL queries from files
+    read_resource_settings,  # To read the resource limits from the arguments
+    setup_database,  # To create the shard databases
+)
+from extraction import (
+    build_argument_parser,  # To accept every extraction argument
+    validate_arguments,  # To reject incompatible extraction options
+    create_parquet_view,  # To expose the Parquet files as the raw table
+    extract_data,  # To extract the locations of a shard
+    read_location_ids,  # To read the configured locations
+    update_latest_values,  # To merge the new records into the latest values
+)
+from source_index import load_source_index  # To list the source tree once for all shards
+
+
+# Function to split the locations across the shards
+def split_location_ids(location_ids: List[str], shards: int) -> List[List[str]]:
+    """
+    Deal the locations out to the shards, so every shard gets a similar number.
+
+    Args:
+        location_ids (List[str]): The location IDs.
+        shards (int): Number of shards.
+
+    Returns:
+        List[List[str]]: The location IDs of each non-empty shard.
+    """
+    return [location_ids[shard::shards] for shard in range(shards) if location_ids[shard::shards]]
+
+
+# Function to write the locations file of a shard
+def write_shard_locations(locations_file_path: str, location_ids: List[str], shard_locations_path: str) -> None:
+    """
+    Copy the entries of a shard's locations from the locations file.
+
+    Args:
+        locations_file_path (str): Path to the locations JSON file.
+        location_ids (List[str]): The location IDs of the shard.
+        shard_locations_path (str): Path to write the shard's locations file to.
+    """
+    with open(locations_file_path, "r") as f:
+        locations = json.load(f)
+    with open(shard_locations_path, "w") as f:
+        json.dump({location_id: locations[location_id] for location_id in location_ids}, f)
+
+
+# Function to choose the name a shard database is attached under
+def attach_alias() -> str:
+    """
+    Return a fresh name to attach a shard database under.
+
+    DuckDB names an attached database after its file, so a fixed name would
+    collide with a target database whose file has that name.
+
+    Returns:
+        str: The alias.
+    """
+    return f"shard_{uuid.uuid4().hex}"
+
+
+# Function to create the database of a shard
+def create_shard(con: DuckDBPyConnection, shard_path: str, ddl_query_parent_dir: str, incremental: bool) -> None:
+    """
+    Create a shard database with the same tables as the target database.
+
+    For incremental extractions the shard starts from the target's ingestion
+    manifest, so files ingested by earlier runs are skipped.
+
+    Args:
+        con (DuckDBPyConnection): Connection to the target database.
+        shard_path (str): Path to the shard database file.
+        ddl_query_parent_dir (str): Path to the directory containing DDL SQL scripts.
+        incremental (bool): Whether to copy the ingestion manifest.
+    """
+    if os.path.exists(shard_path):
+        os.remove(shard_path)  # Left over from a failed run
+    setup_database(shard_path, ddl_query_parent_dir)
+    if incremental:
+        escaped_path = shard_path.replace("'", "''")
+        alias = attach_alias()
+        execute_query(con, f"ATTACH '{escaped_path}' AS {alias}")
+        try:
+            execute_query(con, f"INSERT INTO {alias}.raw.ingestion_manifest SELECT * FROM raw.ingestion_manifest")
+        finally:
+            execute_query(con, f"DETACH {alias}")
+
+
+# Function to extract the locations of a shard in a worker process
+def extract_shard(args: argparse.Namespace) -> int:
+    """
+    Run the extraction of a shard into its own database.
+
+    Args:
+        args (argparse.Namespace): The extraction arguments of the shard.
+
+    Returns:
+        int: Number of data files that failed to load.
+    """
+    logging.getLogger().setLevel(logging.INFO)  # Worker processes start with the default logging level
+    return extract_data(args)
+
+
+# Function to merge a shard database into the target database
+def merge_shard(con: DuckDBPyConnection, shard_path: str) -> int:
+    """
+    Copy the records and manifest entries of a shard into the target database
+    in a single transaction, which is rolled back if any statement fails.
+
+    Shards whose records were landed as Parquet files hold no raw table, and
+    only their manifest is merged.
+
+    Args:
+        con (DuckDBPyConnection): Connection to the target database.
+        shard_path (str): Path to the shard database file.
+
+    Returns:
+        int: Number of records merged.
+    """
+    escaped_path = shard_path.replace("'", "''")
+    alias = attach_alias()
+    execute_query(con, f"ATTACH '{escaped_path}' AS {alias} (READ_ONLY)")
+    try:
+        con.begin()
+        try:
+            row_count = 0
+            if con.execute(
+                """
+                SELECT 1 FROM duckdb_tables()
+                WHERE database_name = ? AND schema_name = 'raw' AND table_name = 'air_quality'
+                """,
+                [alias],
+            ).fetchall():
+                row_count = execute_query(
+                    con, f"INSERT OR REPLACE INTO raw.air_quality SELECT * FROM {alias}.raw.air_quality", tag=shard_path
+                ).fetchone()[0]
+            execute_query(
+                con,
+                f"INSERT OR REPLACE INTO raw.ingestion_manifest SELECT * FROM {alias}.raw.ingestion_manifest",
+                tag=shard_path,
+            )
+            con.commit()
+        except Exception:
+            con.rollback()  # Leave the target without any of the shard's records
+            raise
+    finally:
+        execute_query(con, f"DETACH {alias}")
+    logging.info(f"Merged {row_count} records from {shard_path}")
+    return row_count
+
+
+# Main function for extracting data with one process per shard
+def extract_data_sharded(args: argparse.Namespace) -> int:
+    """
+    Split the locations across shards, extract every shard in its own process
+    and database, then merge the shards into the target database.
+
+    A DuckDB database has a single writer, so the shards write to their own
+    databases (or Parquet partitions, which belong to one location and hence
+    one shard) and only the merge goes through the target's writer. The source
+    tree is listed once and shared with the shards through the index cache.
+
+    A shard whose extraction failed is not merged. A shard where only some
+    data files failed is merged, since its manifest only records the files
+    it loaded, but still counts as failed.
+
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments.
+
+    Returns:
+        int: Number of shards that failed to extract or merge, or had failed data files.
+    """
+    # Record every statement when profiling is requested
+    if args.profile:
+        enable_query_profiling()
+
+    shard_directory = args.shard_directory or tempfile.mkdtemp(
+        prefix="extraction-shards-", dir=os.path.dirname(os.path.abspath(args.database_path))
+    )
+    os.makedirs(shard_directory, exist_ok=True)
+    shard_location_ids = split_location_ids(read_location_ids(args.locations_file_path), args.shards)
+
+    # Connect to the target database
+    con = connect_to_database(path=args.database_path, s3_endpoint=args.s3_endpoint, **read_resource_settings(args))
+
+    # List the locations' source trees once; the shards read the listing from the cache
+    source_index_path = args.source_index_path or os.path.join(shard_directory, "source-index.json")
+    shard_files = [] if args.source_index_path else [source_index_path]  # Files removed after merging
+    load_source_index(
+        con,
+        args.source_base_path,
+        [location_id for location_ids in shard_location_ids for location_id in location_ids],
+        cache_path=source_index_path,
+        max_age=args.source_index_max_age,
+    )
+
+    # Create every shard database and its locations file
+    shard_args = []
+    for shard, location_ids in enumerate(shard_location_ids):
+        shard_path = os.path.join(shard_directory, f"shard-{shard}.db")
+        shard_locations_path = os.path.join(shard_directory, f"shard-{shard}-locations.json")
+        create_shard(con, shard_path, args.ddl_query_parent_dir, args.incremental)
+        write_shard_locations(args.locations_file_path, location_ids, shard_locations_path)
+        shard_files += [shard_path, shard_locations_path]
+        shard_args.append(argparse.Namespace(**{
+            **vars(args),
+            "database_path": shard_path,
+            "threads": args.threads or max(1, (os.cpu_count() or 1) // len(shard_location_ids)),  # Share the cores
+            "locations_file_path": shard_locations_path,
+            "source_index_path": source_index_path,
+            "source_index_max_age": 24 * 3600.0,  # The index was just listed for this run
+            "latest_values_query_path": None,  # Updated once, after the merge
+            "prometheus_output_path": None,  # Totals per process would overwrite each other
+        }))
+    logging.info(f"Extracting {len(shard_args)} shards into {shard_directory}")
+
+    # Extract the shards in fresh processes, so they do not inherit the coordinator's connection
+    merged_shards, failed_shards = [], []
+    with ProcessPoolExecutor(
+        max_workers=len(shard_args), mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = {executor.submit(extract_shard, shard): shard.database_path for shard in shard_args}
+        for future in as_completed(futures):
+            shard_path = futures[future]
+            try:
+                failed_count = future.result()
+            except Exception as e:
+                logging.error(f"Extraction of {shard_path} failed: {e}")
+                failed_shards.append(shard_path)
+                continue
+            # Merge each shard as soon as it is done, while the others are still extracting
+            try:
+                merge_shard(con, shard_path)
+            except Exception as e:
+                logging.error(f"Merge of {shard_path} failed: {e}")
+                failed_shards.append(shard_path)
+                continue
+            merged_shards.append(shard_path)
+            if failed_count:
+                logging.error(f"{failed_count} data files of {shard_path} failed")
+                failed_shards.append(shard_path)
+
+    # Expose the Parquet files as the raw table
+    if args.parquet_base_path:
+        create_parquet_view(con, args.parquet_base_path, Template(read_query(path=args.extract_query_template_path)))
+
+    # Merge the newly loaded records into the latest values
+    if args.latest_values_query_path:
+        update_latest_values(con, Template(read_query(path=args.latest_values_query_path)))
+
+    logging.info(f"Sharded extraction finished: {len(merged_shards)} shards merged, {len(failed_shards)} failed or incomplete")
+    if failed_shards:
+        logging.error(f"Failed shards: {', '.join(failed_shards)}")
+    if args.profile:
+        disable_query_profiling("sharded_extraction", args.profile_output_path, args.prometheus_output_path)
+
+    # Close the database connection after merging
+    close_database_connection(con)
+
+    # Keep the shards that failed, so they can be inspected
+    if args.keep_shards or failed_shards:
+        logging.info(f"Kept the shard databases in {shard_directory}")
+    elif args.shard_directory:
+        for path in shard_files:
+            os.remove(path)
+    else:
+        shutil.rmtree(shard_directory, ignore_errors=True)
+    return len(failed_shards)
+
+
+# Function to parse the command-line arguments of the sharded extraction
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse and validate the sharded extraction arguments.
+
+    Args:
+        argv (Optional[List[str]]): Arguments to parse, defaults to the command line.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    # Accept every extraction argument, plus the sharding ones
+    parser = build_argument_parser(description="CLI for Sharded ELT Extraction")
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of processes the locations are split across (defaults to the number of CPUs)",
+    )
+    parser.add_argument(
+        "--ddl_query_parent_dir",
+        type=str,
+        required=True,
+        help="Path to the parent directory of the DDL queries, used to create the shard databases",
+    )
+    parser.add_argument(
+        "--shard_directory",
+        type=str,
+        help="Directory for the shard databases (defaults to a temporary directory next to the database)",
+    )
+    parser.add_argument(
+        "--keep_shards",
+        action="store_true",
+        help="Keep the shard databases after merging them",
+    )
+
+    # Parse arguments
+    args = validate_arguments(parser, parser.parse_args(argv))
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    return args
+
+
+# Main function to set up argument parsing and invoke the sharded extraction
+def main():
+    """
+    Main entry point for the CLI tool. Parses arguments and triggers the sharded extraction.
+    """
+    logging.getLogger().setLevel(logging.INFO)  # Set logging level to INFO
+
+    # Parse arguments
+    args = parse_arguments()
+    # Trigger the sharded extraction process, and exit with an error if any shard failed so schedulers notice
+    if extract_data_sharded(args):
+        sys.exit(1)
+
+
+# Entry point for the script
+if __name__ == "__main__":
+    main()
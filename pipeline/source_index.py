@@ -0,0 +1,194 @@
+# Import necessary modules
+import json  # For reading and writing the cached index
+import logging  # For logging information
+import os  # For file and directory operations
+import re  # For parsing partition paths
+from datetime import datetime, timedelta  # For file modification times and the cache age
+from typing import Dict, List, NamedTuple, Optional, Tuple  # For type hinting
+
+from duckdb import DuckDBPyConnection  # Type for DuckDB connection
+
+# Layout of the files of a location below the base path
+LOCATION_FILE_GLOB = "locationid={location_id}/year=*/month=*/*"
+PARTITION_PATTERN = re.compile(r"locationid=([^/]+)/year=([^/]+)/month=([^/]+)/[^/]+$")
+
+
+# Size and modification time of a source file
+class SourceFile(NamedTuple):
+    path: str  # Full path of the file
+    size: int  # Size in bytes
+    last_modified: datetime  # Last modification time
+
+
+# Function to build the key of a partition
+def compile_partition_path(location_id: str, year: str, month: str) -> str:
+    """
+    Build the path (glob) of a partition relative to the base path, in the form
+    used to key the partitions throughout the extraction.
+
+    Args:
+        location_id (str): Location ID of the partition.
+        year (str): Year of the partition.
+        month (str): Two-digit month of the partition.
+
+    Returns:
+        str: The partition path.
+    """
+    return f"locationid={location_id}/year={year}/month={month}/*"
+
+
+class SourceIndex:
+    """
+    Index of the files that exist in the source tree, grouped by partition.
+
+    The trees of the configured locations are listed in a single read_blob
+    call, so partitions that do not exist are never requested and each file's
+    size and modification time are known without touching it again.
+    """
+
+    def __init__(self, base_path: str, location_ids: List[str], files: List[SourceFile], listed_at: datetime):
+        self.base_path = base_path
+        self.location_ids = location_ids
+        self.listed_at = listed_at
+        self.files = files
+        self.partitions: Dict[str, List[SourceFile]] = {}
+        for file in files:
+            match = PARTITION_PATTERN.search(file.path)
+            if match is not None:
+                self.partitions.setdefault(compile_partition_path(*match.groups()), []).append(file)
+
+    @classmethod
+    def list(cls, con: DuckDBPyConnection, base_path: str, location_ids: List[str]) -> "SourceIndex":
+        """
+        List the source trees of the given locations, local or remote.
+
+        Every location gets its own glob, so only the prefixes of the configured
+        locations are listed rather than the whole source tree. Only the
+        metadata columns of read_blob are selected, so the file contents are
+        not downloaded.
+
+        Args:
+            con (DuckDBPyConnection): The database connection object.
+            base_path (str): Base path of the source tree.
+            location_ids (List[str]): The location IDs to list.
+
+        Returns:
+            SourceIndex: The index of the existing files.
+        """
+        location_ids = sorted(set(location_ids))
+        listed_at = datetime.now()
+        rows = con.execute(
+            "SELECT filename, size, last_modified FROM read_blob(?) ORDER BY filename",
+            [[f"{base_path}/{LOCATION_FILE_GLOB.format(location_id=location_id)}" for location_id in location_ids]],
+        ).fetchall() if location_ids else []
+        index = cls(base_path, location_ids, [SourceFile(*row) for row in rows], listed_at)
+        logging.info(
+            f"Indexed {len(index.files)} source files in {len(index.partitions)} partitions "
+            f"of {len(location_ids)} locations at {base_path}"
+        )
+        return index
+
+    @classmethod
+    def load(cls, path: str) -> "SourceIndex":
+        """
+        Load an index saved with `save`.
+
+        Args:
+            path (str): Path to the cached index.
+
+        Returns:
+            SourceIndex: The cached index.
+        """
+        with open(path, "r") as f:
+            cached = json.load(f)
+        files = [
+            SourceFile(file_path, size, datetime.fromisoformat(last_modified))
+            for file_path, size, last_modified in cached["files"]
+        ]
+        return cls(
+            cached["base_path"], cached.get("location_ids", []), files, datetime.fromisoformat(cached["listed_at"])
+        )
+
+    def save(self, path: str) -> None:
+        """
+        Save the index as JSON, replacing any previous version atomically.
+
+        Args:
+            path (str): Path to the cached index.
+        """
+        cached = {
+            "base_path": self.base_path,
+            "location_ids": self.location_ids,
+            "listed_at": self.listed_at.isoformat(),
+            "files": [[file.path, file.size, file.last_modified.isoformat()] for file in self.files],
+        }
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(cached, f)
+        os.replace(f"{path}.tmp", path)
+
+    def select(self, partition_paths: List[str]) -> Dict[str, List[str]]:
+        """
+        Look up the files of each requested partition.
+
+        Args:
+            partition_paths (List[str]): Partition paths, as built by compile_partition_path.
+
+        Returns:
+            Dict[str, List[str]]: The files of each partition, empty for partitions that do not exist.
+        """
+        return {
+            partition_path: [file.path for file in self.partitions.get(partition_path, [])]
+            for partition_path in partition_paths
+        }
+
+    def stats(self, data_files: List[str]) -> Dict[str, Tuple[int, datetime]]:
+        """
+        Look up the size and modification time of files in the index.
+
+        Args:
+            data_files (List[str]): Full paths of indexed files.
+
+        Returns:
+            Dict[str, Tuple[int, datetime]]: The size and modification time of each file.
+        """
+        files = {file.path: (file.size, file.last_modified) for file in self.files}
+        return {data_file: files[data_file] for data_file in data_files}
+
+
+# Function to get the source index, from the cache if it is recent enough
+def load_source_index(
+    con: DuckDBPyConnection,
+    base_path: str,
+    location_ids: List[str],
+    cache_path: Optional[str] = None,
+    max_age: float = 0.0,
+) -> SourceIndex:
+    """
+    Return the index of the source trees of the given locations, listing them
+    only when there is no cached index for the base path and (at least) these
+    locations that is younger than `max_age` seconds.
+
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        base_path (str): Base path of the source tree.
+        location_ids (List[str]): The location IDs to index.
+        cache_path (Optional[str]): Path to the cached index; without it the trees are always listed.
+        max_age (float): Maximum age in seconds of a cached index.
+
+    Returns:
+        SourceIndex: The index of the source trees.
+    """
+    if cache_path and os.path.exists(cache_path):
+        index = SourceIndex.load(cache_path)
+        if (
+            index.base_path == base_path
+            and set(location_ids) <= set(index.location_ids)
+            and datetime.now() - index.listed_at <= timedelta(seconds=max_age)
+        ):
+            logging.info(f"Using source index from {index.listed_at.isoformat()} at {cache_path}")
+            return index
+
+    index = SourceIndex.list(con, base_path, location_ids)
+    if cache_path:
+        index.save(cache_path)
+    return index
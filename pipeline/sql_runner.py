@@ -0,0 +1,198 @@
+# Import necessary modules
+import logging  # For logging information
+import re  # For finding the objects a script reads and writes
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait  # For running scripts concurrently
+from typing import Callable, Dict, List, NamedTuple, Set  # For type hinting
+
+from duckdb import DuckDBPyConnection  # Type for DuckDB connection
+
+# Statements creating a schema, and statements writing the object that follows them
+CREATE_SCHEMA_PATTERN = re.compile(r"\bCREATE\s+SCHEMA\s+(?:IF\s+NOT\s+EXISTS\s+)?['\"]?(\w+)", re.IGNORECASE)
+WRITE_PATTERN = re.compile(
+    r"\b(?:CREATE(?:\s+OR\s+REPLACE)?\s+(?:TABLE|VIEW)(?:\s+IF\s+NOT\s+EXISTS)?"
+    r"|INSERT(?:\s+OR\s+REPLACE)?\s+INTO|DELETE\s+FROM|UPDATE|ALTER\s+TABLE"
+    r"|DROP\s+(?:TABLE|VIEW)(?:\s+IF\s+EXISTS)?)\s+(\w+\.\w+)",
+    re.IGNORECASE,
+)
+# Qualified object names, 'schema.name'; names whose first part is not a schema are table aliases
+QUALIFIED_NAME_PATTERN = re.compile(r"\b(\w+)\.(\w+)\b")
+
+
+# A SQL script with the objects it reads and writes
+class SqlScript(NamedTuple):
+    key: str  # Identifier of the script, e.g. its path relative to the query directory
+    path: str  # Path to the script file
+    text: str  # The script (or template) text
+    writes: Set[str]  # Schemas and 'schema.name' objects the script creates or modifies
+    reads: Set[str]  # Schemas and 'schema.name' objects the script depends on
+
+
+# Function to find the objects a script reads and writes
+def analyze_script(key: str, path: str, text: str, analyzed_text: str, schemas: Set[str]) -> SqlScript:
+    """
+    Find the schemas and objects a script writes and the ones it reads.
+
+    Every qualified name in a known schema counts as a reference, and an
+    object also depends on its schema.
+
+    Args:
+        key (str): Identifier of the script.
+        path (str): Path to the script file.
+        text (str): The script (or template) text.
+        analyzed_text (str): The SQL to analyze, i.e. the script with any template rendered.
+        schemas (Set[str]): Names of the known schemas.
+
+    Returns:
+        SqlScript: The script with its reads and writes.
+    """
+    sql = re.sub(r"--[^\n]*", "", analyzed_text).replace('"', "").lower()  # Drop comments and identifier quotes
+
+    writes = set(CREATE_SCHEMA_PATTERN.findall(sql)) | set(WRITE_PATTERN.findall(sql))
+    references = {f"{schema}.{name}" for schema, name in QUALIFIED_NAME_PATTERN.findall(sql) if schema in schemas}
+    schemas_used = {name.split(".")[0] for name in writes | references if "." in name}
+    reads = (references | schemas_used) - writes
+    return SqlScript(key, path, text, writes, reads)
+
+
+# Function to collect the schemas objects can be referenced in
+def read_schema_names(con: DuckDBPyConnection, texts: List[str]) -> Set[str]:
+    """
+    Collect the names of the schemas in the database and of those created by a set of scripts.
+
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        texts (List[str]): The script texts.
+
+    Returns:
+        Set[str]: The schema names.
+    """
+    sql = "\n".join(re.sub(r"--[^\n]*", "", text) for text in texts).lower()
+    schemas = {row[0].lower() for row in con.execute(
+        "SELECT DISTINCT schema_name FROM duckdb_schemas() WHERE NOT internal"
+    ).fetchall()}
+    return schemas | set(CREATE_SCHEMA_PATTERN.findall(sql))
+
+
+# Function to build the dependency graph of a set of scripts
+def build_dependencies(scripts: List[SqlScript]) -> Dict[str, Set[str]]:
+    """
+    Make every script depend on the scripts writing the objects it reads. When
+    several scripts write the same object, they run in the order they are given.
+
+    Args:
+        scripts (List[SqlScript]): The scripts, in their fallback order.
+
+    Returns:
+        Dict[str, Set[str]]: The keys of the scripts each script depends on.
+
+    Raises:
+        ValueError: If the scripts depend on each other in a cycle.
+    """
+    dependencies: Dict[str, Set[str]] = {script.key: set() for script in scripts}
+    writers: Dict[str, List[str]] = {}
+    for script in scripts:
+        for name in script.writes:
+            # Later writers of an object run after the earlier ones
+            dependencies[script.key].update(writers.get(name, []))
+            writers.setdefault(name, []).append(script.key)
+
+    for script in scripts:
+        for name in script.reads:
+            dependencies[script.key].update(key for key in writers.get(name, []) if key != script.key)
+
+    order_scripts(dependencies)  # Fail early on cycles
+    return dependencies
+
+
+# Function to order scripts so every script follows its dependencies
+def order_scripts(dependencies: Dict[str, Set[str]]) -> List[str]:
+    """
+    Sort the scripts topologically, keeping the given order between independent scripts.
+
+    Args:
+        dependencies (Dict[str, Set[str]]): The keys of the scripts each script depends on.
+
+    Returns:
+        List[str]: The script keys in execution order.
+
+    Raises:
+        ValueError: If the scripts depend on each other in a cycle.
+    """
+    order: List[str] = []
+    remaining = dict(dependencies)
+    while remaining:
+        ready = [key for key, required in remaining.items() if not required - set(order)]
+        if not ready:
+            raise ValueError(f"Scripts depend on each other in a cycle: {sorted(remaining)}")
+        order.extend(ready)
+        for key in ready:
+            del remaining[key]
+    return order
+
+
+# Function to run scripts in dependency order, independent ones concurrently
+def run_scripts(
+    con: DuckDBPyConnection,
+    scripts: List[SqlScript],
+    dependencies: Dict[str, Set[str]],
+    run: Callable[[DuckDBPyConnection, SqlScript], None],
+    workers: int = 1,
+) -> None:
+    """
+    Run every script once all scripts it depends on have finished.
+
+    With more than one worker, every script whose dependencies are done is
+    started right away on its own cursor of the shared connection. Dependencies
+    on scripts that are not in the list are considered done. When a script
+    fails, no further scripts are started and the error is raised once the
+    running ones have finished.
+
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        scripts (List[SqlScript]): The scripts to run.
+        dependencies (Dict[str, Set[str]]): The keys of the scripts each script depends on.
+        run (Callable[[DuckDBPyConnection, SqlScript], None]): Function running a script on a connection.
+        workers (int): Maximum number of scripts running at the same time.
+    """
+    by_key = {script.key: script for script in scripts}
+    pending = {key: dependencies.get(key, set()) & set(by_key) for key in by_key}
+
+    if workers <= 1:
+        for key in order_scripts(pending):
+            run(con, by_key[key])
+        return
+
+    def worker(script: SqlScript) -> None:
+        # Use a dedicated cursor so concurrent scripts do not share transactions
+        cursor = con.cursor()
+        try:
+            run(cursor, script)
+        finally:
+            cursor.close()
+
+    done: Set[str] = set()
+    error = None
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        while pending or running:
+            # Start every script whose dependencies have finished
+            if error is None:
+                for key in [key for key, required in pending.items() if required <= done]:
+                    running[executor.submit(worker, by_key[key])] = key
+                    del pending[key]
+            if not running:
+                if pending and error is None:
+                    raise ValueError(f"Scripts depend on each other in a cycle: {sorted(pending)}")
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                key = running.pop(future)
+                if future.exception() is not None:
+                    logging.error(f"Script {key} failed: {future.exception()}")
+                    error = error or future.exception()
+                else:
+                    done.add(key)
+
+    if error is not None:
+        raise error
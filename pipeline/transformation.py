@@ -1,57 +1,444 @@
 # Import required modules
 import argparse  # For parsing command-line arguments
+import hashlib  # For hashing the scripts and data versions
 import logging  # For logging information and errors
+import os  # For working with file paths
+from datetime import datetime  # For working with date and time
+from functools import lru_cache  # For compiling every script once
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple  # For type hinting
+
+from duckdb import DuckDBPyConnection  # Type for DuckDB connection
+from jinja2 import Template  # For templating the transformation queries
 
 # Importing utility functions from the database_manager module
 from database_manager import (
     connect_to_database,  # Function to establish a connection to the database
     close_database_connection,  # Function to close the database connection
     execute_query,  # Function to execute a SQL query
+    enable_query_profiling,  # Function to record every executed statement
+    disable_query_profiling,  # Function to summarize and export the recorded statements
     collect_query_paths,  # Function to collect all SQL file paths from a directory
     read_query,  # Function to read a SQL query from a file
+    add_profiling_arguments,  # Function to add the query profiling CLI arguments
+    add_resource_arguments,  # Function to add the resource limit CLI arguments
+    read_resource_settings,  # Function to read the resource limits from the arguments
+)
+from sql_runner import (  # Functions to run the scripts in dependency order
+    SqlScript,
+    analyze_script,
+    build_dependencies,
+    order_scripts,
+    read_schema_names,
+    run_scripts,
 )
 
+# State of a transformation script after its last successful run
+class TransformationState(NamedTuple):
+    watermark: Optional[datetime]  # Latest raw ingestion_datetime reflected in a materialized table
+    sql_hash: Optional[str]  # Hash of the script, its mode and the scripts it depends on
+    data_version: Optional[str]  # Hash of the versions of the source data the script read
+
+
+# Function to find the latest ingestion timestamp of the raw data
+def read_raw_watermark(con: DuckDBPyConnection) -> Optional[datetime]:
+    """
+    Read the most recent ingestion timestamp in 'raw.air_quality'.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+    
+    Returns:
+        Optional[datetime]: The latest ingestion_datetime, or None if the table is empty.
+    """
+    return con.execute("SELECT MAX(ingestion_datetime) FROM raw.air_quality").fetchone()[0]
+
+
+# Function to read the recorded state of the transformation scripts
+def read_transformation_state(con: DuckDBPyConnection) -> Dict[str, TransformationState]:
+    """
+    Read the watermark, SQL hash and data version each transformation script last ran with.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+    
+    Returns:
+        Dict[str, TransformationState]: The state of each script, keyed by its path
+                                        relative to the query directory.
+    """
+    rows = con.execute(
+        "SELECT query_path, watermark, sql_hash, data_version FROM presentation.transformation_state"
+    ).fetchall()
+    return {query_key: TransformationState(*values) for query_key, *values in rows}
+
+
+# Function to record the state of a transformation script
+def record_transformation_state(
+    con: DuckDBPyConnection, query_key: str, state: TransformationState
+) -> None:
+    """
+    Record that a transformation script ran with the given SQL and data version.
+    For materialized tables, the watermark records that the table reflects all
+    raw data ingested up to it.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        query_key (str): Path of the script relative to the query directory.
+        state (TransformationState): The watermark, SQL hash and data version of the run.
+    """
+    con.execute(
+        """
+        INSERT OR REPLACE INTO presentation.transformation_state
+        (query_path, watermark, refreshed_datetime, sql_hash, data_version)
+        VALUES (?, ?, current_timestamp, ?, ?)
+        """,
+        [query_key, state.watermark, state.sql_hash, state.data_version],
+    )
+
+
+# Function to read the versions of the pipeline's source relations from their bookkeeping
+def read_source_versions(con: DuckDBPyConnection, raw_watermark: Optional[datetime]) -> Dict[str, str]:
+    """
+    Describe the contents of the relations the pipeline loads without scanning
+    them, from the records every load leaves behind: the raw high-water mark
+    and the ingestion manifest for the raw data, and the latest quality check
+    run for the quarantine. Archiving moves records between the tiers of the
+    raw data without changing 'raw.air_quality_all', so it leaves them unchanged.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        raw_watermark (Optional[datetime]): The latest raw ingestion_datetime, as read by read_raw_watermark.
+    
+    Returns:
+        Dict[str, str]: The version of each source relation's data, keyed by its qualified name.
+    """
+    manifest_count, manifest_latest, check_run = con.execute(
+        """
+        SELECT
+            (SELECT COUNT(*) FROM raw.ingestion_manifest),
+            (SELECT MAX(ingestion_datetime) FROM raw.ingestion_manifest),
+            (SELECT MAX(run_id) FROM quality.check_runs)
+        """
+    ).fetchone()
+    raw_version = f"{raw_watermark}:{manifest_count}:{manifest_latest}"
+    return {
+        "raw.air_quality": raw_version,
+        "raw.air_quality_cold": raw_version,
+        "raw.air_quality_all": raw_version,
+        "quality.quarantine": f"{check_run}",
+    }
+
+
+# Function to compute a cheap version of the data in a relation
+def read_data_version(con: DuckDBPyConnection, relation: str) -> str:
+    """
+    Describe the contents of a relation by its row count and, if it has one,
+    its latest ingestion timestamp. Any insert, upsert or delete changes one of them.
+    This scans the relation, so it is only used for relations read_source_versions
+    does not cover.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        relation (str): Qualified name of the table or view.
+    
+    Returns:
+        str: The version of the relation's data.
+    """
+    schema_name, table_name = relation.split(".")
+    has_ingestion_datetime = con.execute(
+        """
+        SELECT COUNT(*) > 0 FROM duckdb_columns()
+        WHERE schema_name = ? AND table_name = ? AND column_name = 'ingestion_datetime'
+        """,
+        [schema_name, table_name],
+    ).fetchone()[0]
+    watermark = "MAX(ingestion_datetime)" if has_ingestion_datetime else "NULL"
+    row_count, latest = con.execute(f"SELECT COUNT(*), {watermark} FROM {relation}").fetchone()
+    return f"{row_count}:{latest}"
+
+
+# Function to hash the parts of a version
+def hash_version(parts: List[str]) -> str:
+    """
+    Combine version parts into a single hash.
+    
+    Args:
+        parts (List[str]): The parts of the version.
+    
+    Returns:
+        str: The SHA-256 hex digest of the parts.
+    """
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+# Function to collect the keys touched by newly ingested data
+def create_touched_keys(
+    con: DuckDBPyConnection, previous_watermark: datetime, watermark: datetime
+) -> None:
+    """
+    Create the temporary 'touched_keys' table with the location, parameter and date
+    of every raw record ingested after the previous watermark.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        previous_watermark (datetime): Watermark of the last refresh.
+        watermark (datetime): Watermark of the current refresh.
+    """
+    con.execute(
+        """
+        CREATE OR REPLACE TEMP TABLE touched_keys AS
+        SELECT DISTINCT
+            location_id,
+            "parameter",
+            CAST("datetime" AS DATE) AS measurement_date
+        FROM raw.air_quality
+        WHERE ingestion_datetime > ?
+        AND ingestion_datetime <= ?
+        """,
+        [previous_watermark, watermark],
+    )
+
+
+# Function to compile a transformation script once per process
+@lru_cache(maxsize=None)
+def compile_template(query_template: str) -> Template:
+    """
+    Compile a transformation script, reusing the compiled template on later calls.
+    
+    Args:
+        query_template (str): The transformation script.
+    
+    Returns:
+        Template: The compiled template.
+    """
+    return Template(query_template)
+
+
+# Function to render a transformation query template
+def compile_transformation_query(
+    con: DuckDBPyConnection, query_template: str, materialize: bool, incremental: bool
+) -> str:
+    """
+    Render a transformation script as a view, a full table rebuild or an
+    incremental table refresh.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        query_template (str): The transformation script.
+        materialize (bool): Whether to create a table instead of a view.
+        incremental (bool): Whether to only refresh the keys in 'touched_keys'.
+    
+    Returns:
+        str: The rendered SQL query.
+    """
+    # Existing relations, so a script can drop a view it replaces with a table (or the reverse)
+    views = {row[0] for row in con.execute(
+        "SELECT schema_name || '.' || view_name FROM duckdb_views() WHERE NOT internal"
+    ).fetchall()}
+    tables = {row[0] for row in con.execute(
+        "SELECT schema_name || '.' || table_name FROM duckdb_tables()"
+    ).fetchall()}
+
+    return compile_template(query_template).render(
+        materialize=materialize, incremental=incremental, views=views, tables=tables
+    )
+
+
+# Function to read and analyze the transformation scripts
+def load_transformation_scripts(
+    con: DuckDBPyConnection, query_directory: str
+) -> Tuple[List[SqlScript], Dict[str, Set[str]]]:
+    """
+    Read the transformation scripts from a directory and find the objects they
+    read and write, and the scripts each one depends on.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        query_directory (str): Directory containing the SQL transformation scripts.
+    
+    Returns:
+        Tuple[List[SqlScript], Dict[str, Set[str]]]: The scripts, and the keys of the
+                                                     scripts each script depends on.
+    """
+    query_templates = {
+        os.path.relpath(query_path, query_directory): (query_path, read_query(query_path))
+        for query_path in collect_query_paths(query_directory)
+    }
+    schemas = read_schema_names(con, [query_template for _, query_template in query_templates.values()])
+    scripts = [
+        analyze_script(
+            query_key,
+            query_path,
+            query_template,
+            compile_template(query_template).render(
+                materialize=False, incremental=False, views=set(), tables=set()
+            ),
+            schemas,
+        )
+        for query_key, (query_path, query_template) in query_templates.items()
+    ]
+    return scripts, build_dependencies(scripts)
+
+
+# Function to run the transformation scripts whose SQL or source data changed
+def run_transformations(
+    con: DuckDBPyConnection,
+    scripts: List[SqlScript],
+    dependencies: Dict[str, Set[str]],
+    materialize: bool = False,
+    full_refresh: bool = False,
+    workers: int = 1,
+) -> int:
+    """
+    Run the transformation scripts in dependency order, skipping unchanged ones.
+    
+    A script is skipped when neither its SQL (including that of the scripts it
+    depends on) nor, for tables, the source data it reads have changed since
+    its last run. Tables materialized before by the same SQL are refreshed
+    incrementally.
+    
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+        scripts (List[SqlScript]): The scripts, as loaded by load_transformation_scripts.
+        dependencies (Dict[str, Set[str]]): The keys of the scripts each script depends on.
+        materialize (bool): Whether to create tables instead of views.
+        full_refresh (bool): Whether to rebuild every table (and rerun every view) from scratch.
+        workers (int): Maximum number of independent scripts run at the same time.
+    
+    Returns:
+        int: Number of scripts executed.
+    """
+    written = {name for script in scripts for name in script.writes}
+
+    # Everything ingested up to now is reflected after this run
+    watermark = read_raw_watermark(con) if materialize else None
+    source_versions = read_source_versions(con, watermark) if materialize else {}
+
+    # Decide which scripts need to run, and how
+    previous_states = read_transformation_state(con)
+    relations = {row[0] for row in con.execute(
+        """
+        SELECT schema_name || '.' || view_name FROM duckdb_views() WHERE NOT internal
+        UNION ALL
+        SELECT schema_name || '.' || table_name FROM duckdb_tables()
+        """
+    ).fetchall()}
+    scripts_by_key = {script.key: script for script in scripts}
+    states: Dict[str, TransformationState] = {}
+    incremental: Dict[str, bool] = {}
+    scripts_to_run: List[SqlScript] = []
+    for query_key in order_scripts(dependencies):
+        script = scripts_by_key[query_key]
+        upstream = sorted(dependencies[query_key])
+        sql_hash = hash_version(
+            ["table" if materialize else "view", script.text] + [states[key].sql_hash for key in upstream]
+        )
+        # Views always show the current data, so only tables depend on the data version
+        data_version = hash_version(
+            [
+                f"{name}={source_versions.get(name) or read_data_version(con, name)}"
+                for name in sorted(script.reads - written) if "." in name
+            ]
+            + [states[key].data_version for key in upstream]
+        ) if materialize else None
+        states[query_key] = TransformationState(watermark, sql_hash, data_version)
+
+        previous = previous_states.get(query_key)
+        unchanged = (
+            previous is not None
+            and previous.sql_hash == sql_hash
+            and previous.data_version == data_version
+            and script.writes <= relations
+        )
+        if unchanged and not full_refresh:
+            logging.info(f"Skipping unchanged query from {script.path}")
+            continue
+
+        # Refresh incrementally when the table was materialized before by the same SQL
+        incremental[query_key] = (
+            materialize
+            and not full_refresh
+            and previous is not None
+            and previous.watermark is not None
+            and previous.sql_hash == sql_hash
+        )
+        scripts_to_run.append(script)
+
+    def run(cursor: DuckDBPyConnection, script: SqlScript) -> None:
+        cursor.begin()
+        if incremental[script.key]:
+            create_touched_keys(cursor, previous_states[script.key].watermark, watermark)
+        query = compile_transformation_query(
+            cursor, script.text, materialize=materialize, incremental=incremental[script.key]
+        )
+        execute_query(cursor, query, tag=script.path)
+        record_transformation_state(cursor, script.key, states[script.key])
+        cursor.commit()
+
+        # Log the successful execution of the query
+        logging.info(f"Executed query from {script.path}")
+
+    # Execute the scripts that changed, independent ones concurrently
+    run_scripts(con, scripts_to_run, dependencies, run, workers=workers)
+    logging.info(f"Executed {len(scripts_to_run)} and skipped {len(scripts) - len(scripts_to_run)} unchanged queries")
+    return len(scripts_to_run)
+
+
 # Function to perform data transformation
 def transform_data(args) -> None:
     """
     Execute SQL transformation queries on the database.
     
+    By default every script creates a view. With materialization enabled, each
+    script creates a table instead, which later runs refresh only for the
+    location, parameter and date keys touched by newly ingested raw data.
+    
+    Scripts run after the scripts creating the objects they read, independent
+    scripts concurrently, and unchanged scripts are skipped.
+    
     Args:
-        args: Parsed command-line arguments containing the database path
-              and the directory of SQL transformation queries.
+        args: Parsed command-line arguments containing the database path,
+              the directory of SQL transformation queries and the
+              materialization options.
     """
+    # Record every statement when profiling is requested
+    if args.profile:
+        enable_query_profiling()
+
     # Get the path to the database from arguments
     database_path = args.database_path
 
     # Establish a connection to the database
-    con = connect_to_database(path=database_path)
+    con = connect_to_database(path=database_path, **read_resource_settings(args))
 
-    # Collect paths to all SQL files in the provided query directory
-    query_paths = collect_query_paths(args.query_directory)
-
-    # Execute each SQL query in the collected file paths
-    for query_path in query_paths:
-        # Read the SQL query from the file
-        query = read_query(query_path)
-        # Execute the query using the database connection
-        execute_query(con, query)
+    # Collect all SQL files in the provided query directory and run the ones that changed
+    scripts, dependencies = load_transformation_scripts(con, args.query_directory)
+    run_transformations(
+        con,
+        scripts,
+        dependencies,
+        materialize=args.materialize,
+        full_refresh=args.full_refresh,
+        workers=args.workers,
+    )
 
-        # Log the successful execution of the query
-        logging.info(f"Executed query from {query_path}")
+    if args.profile:
+        disable_query_profiling("transformation", args.profile_output_path, args.prometheus_output_path)
 
     # Close the database connection after all queries have been executed
     close_database_connection(con)
 
 
-# Main function to handle command-line argument parsing and trigger the transformation process
-def main():
+# Function to parse the command-line arguments of the transformation process
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
     """
-    Main entry point for the script. Parses command-line arguments
-    and triggers the data transformation process.
+    Parse the transformation arguments.
+    
+    Args:
+        argv (Optional[List[str]]): Arguments to parse, defaults to the command line.
+    
+    Returns:
+        argparse.Namespace: The parsed arguments.
     """
-    # Set logging level to INFO for detailed logs
-    logging.getLogger().setLevel(logging.INFO)
-
     # Initialize argument parser for command-line interface
     parser = argparse.ArgumentParser(description="CLI for Data Transformation")
 
@@ -71,8 +458,47 @@ def main():
         help="Directory containing SQL transformation queries",
     )
 
+    # Add arguments for materializing the presentation objects as tables
+    parser.add_argument(
+        "--materialize",
+        action="store_true",
+        help="Create tables instead of views and refresh them incrementally",
+    )
+    parser.add_argument(
+        "--full_refresh",
+        action="store_true",
+        help="Rebuild materialized tables (and rerun unchanged views) from scratch instead of refreshing them incrementally",
+    )
+
+    # Add argument for running independent scripts concurrently
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of independent transformation queries to run concurrently",
+    )
+
+    # Add arguments for limiting resources and recording the executed statements
+    add_resource_arguments(parser)
+    add_profiling_arguments(parser)
+
+    # Parse the arguments passed via the command line
+    args = parser.parse_args(argv)
+    args.profile = args.profile or bool(args.profile_output_path or args.prometheus_output_path)
+    return args
+
+
+# Main function to handle command-line argument parsing and trigger the transformation process
+def main():
+    """
+    Main entry point for the script. Parses command-line arguments
+    and triggers the data transformation process.
+    """
+    # Set logging level to INFO for detailed logs
+    logging.getLogger().setLevel(logging.INFO)
+
     # Parse the arguments passed via the command line
-    args = parser.parse_args()
+    args = parse_arguments()
 
     # Trigger the data transformation process with the parsed arguments
     transform_data(args)
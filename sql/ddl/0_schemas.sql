@@ -5,3 +5,7 @@ CREATE SCHEMA IF NOT EXISTS 'raw';
 -- Create a schema named 'presentation' if it does not already exist.
 -- The 'presentation' schema is used for processed or cleaned data, often used in reporting or analysis.
 CREATE SCHEMA IF NOT EXISTS 'presentation';
+
+-- Create a schema named 'quality' if it does not already exist.
+-- The 'quality' schema holds the results of the data-quality checks and the records that failed them.
+CREATE SCHEMA IF NOT EXISTS 'quality';
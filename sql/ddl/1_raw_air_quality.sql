@@ -1,5 +1,6 @@
 -- Create a table named 'air_quality' in the 'raw' schema if it does not already exist.
 -- This table stores detailed air quality data with various columns for metadata and measurements.
+-- The primary key keeps a single record per sensor parameter per datetime; re-ingested records replace older ones.
 CREATE TABLE IF NOT EXISTS raw.air_quality (
     location_id BIGINT,                -- Unique identifier for the location
     sensors_id BIGINT,                 -- Unique identifier for the sensor
@@ -12,5 +13,6 @@ CREATE TABLE IF NOT EXISTS raw.air_quality (
     "value" DOUBLE,                    -- Measured value
     "month" VARCHAR,                   -- Month when the measurement was recorded
     "year" BIGINT,                     -- Year when the measurement was recorded
-    ingestion_datetime TIMESTAMP       -- Timestamp when the data was ingested into the database
+    ingestion_datetime TIMESTAMP,      -- Timestamp when the data was ingested into the database
+    PRIMARY KEY (location_id, sensors_id, "datetime", "parameter")
 );
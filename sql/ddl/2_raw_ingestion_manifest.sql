@@ -0,0 +1,9 @@
+-- Create a table named 'ingestion_manifest' in the 'raw' schema if it does not already exist.
+-- This table records every source file loaded into 'raw.air_quality' so unchanged files can be skipped on later runs.
+CREATE TABLE IF NOT EXISTS raw.ingestion_manifest (
+    file_path VARCHAR PRIMARY KEY,     -- Full path of the source file
+    file_size BIGINT,                  -- Size of the source file in bytes
+    last_modified TIMESTAMP,           -- Last modification time of the source file
+    row_count BIGINT,                  -- Number of rows loaded from the file (NULL for bulk loads)
+    ingestion_datetime TIMESTAMP       -- Timestamp when the file was ingested into the database
+);
@@ -0,0 +1,14 @@
+-- Create a table named 'transformation_state' in the 'presentation' schema if it does not already exist.
+-- This table records how far each materialized transformation has processed 'raw.air_quality', so later runs only refresh new data,
+-- and the SQL and data version each script last ran with, so unchanged scripts are skipped.
+CREATE TABLE IF NOT EXISTS presentation.transformation_state (
+    query_path VARCHAR PRIMARY KEY,    -- Path of the transformation script, relative to the query directory
+    watermark TIMESTAMP,               -- Latest raw ingestion_datetime reflected in the materialized table
+    refreshed_datetime TIMESTAMP,      -- Timestamp when the table was last refreshed
+    sql_hash VARCHAR,                  -- Hash of the script, its mode and the scripts it depends on
+    data_version VARCHAR               -- Hash of the versions of the source data the script read
+);
+
+-- Add the change detection columns to tables created before they existed.
+ALTER TABLE presentation.transformation_state ADD COLUMN IF NOT EXISTS sql_hash VARCHAR;
+ALTER TABLE presentation.transformation_state ADD COLUMN IF NOT EXISTS data_version VARCHAR;
@@ -0,0 +1,64 @@
+-- Create the tables of the data-quality stage in the 'quality' schema if they do not already exist.
+-- Every run checks the records ingested since the previous run; the state tables carry what the checks need
+-- to know about earlier data, so a run never rescans the history.
+
+-- One record per run, with the latest raw ingestion_datetime it checked.
+CREATE TABLE IF NOT EXISTS quality.check_runs (
+    run_id BIGINT PRIMARY KEY,         -- Sequential identifier of the run
+    checked_datetime TIMESTAMP,        -- Timestamp when the run finished
+    watermark TIMESTAMP,               -- Latest raw ingestion_datetime checked by the run
+    record_count BIGINT,               -- Number of records checked
+    quarantined_count BIGINT           -- Number of records that failed at least one check
+);
+
+-- The failures found by each run, per check, location and parameter (and sensor, for timestamp gaps).
+CREATE TABLE IF NOT EXISTS quality.check_results (
+    run_id BIGINT,                     -- Run that found the failures
+    check_name VARCHAR,                -- Name of the check, e.g. 'negative_value' or 'timestamp_gap'
+    location_id BIGINT,                -- Location of the failing records
+    "parameter" VARCHAR,               -- Parameter of the failing records
+    sensors_id BIGINT,                 -- Sensor of a timestamp gap (NULL for record checks)
+    failed_count BIGINT,               -- Number of failing records (1 per timestamp gap)
+    first_datetime TIMESTAMP,          -- Earliest failing measurement, or the start of the gap
+    last_datetime TIMESTAMP            -- Latest failing measurement, or the end of the gap
+);
+
+-- The records that failed at least one check, with the checks they failed.
+CREATE TABLE IF NOT EXISTS quality.quarantine (
+    location_id BIGINT,                -- Unique identifier for the location
+    sensors_id BIGINT,                 -- Unique identifier for the sensor
+    "location" VARCHAR,                -- Name of the location
+    "datetime" TIMESTAMP,              -- Timestamp when the measurement was recorded
+    lat DOUBLE,                        -- Latitude coordinate of the location
+    lon DOUBLE,                        -- Longitude coordinate of the location
+    "parameter" VARCHAR,               -- Type of measurement (e.g., PM10, PM2.5, SO2)
+    units VARCHAR,                     -- Units of the measurement
+    "value" DOUBLE,                    -- Measured value
+    "month" VARCHAR,                   -- Month when the measurement was recorded
+    "year" BIGINT,                     -- Year when the measurement was recorded
+    ingestion_datetime TIMESTAMP,      -- Timestamp when the record was ingested into the database
+    failed_checks VARCHAR[],           -- Names of the checks the record failed
+    run_id BIGINT,                     -- Run that quarantined the record
+    quarantined_datetime TIMESTAMP     -- Timestamp when the record was quarantined
+);
+
+-- Running count, sum and sum of squares of the valid values per location, parameter and unit.
+-- Sums merge with those of a new batch, so outlier limits never need the history.
+CREATE TABLE IF NOT EXISTS quality.value_stats (
+    location_id BIGINT,                -- Unique identifier for the location
+    "parameter" VARCHAR,               -- Type of measurement
+    units VARCHAR,                     -- Units of the measurement
+    value_count BIGINT,                -- Number of valid values
+    value_sum DOUBLE,                  -- Sum of the valid values
+    value_sum_squares DOUBLE,          -- Sum of the squares of the valid values
+    PRIMARY KEY (location_id, "parameter", units)
+);
+
+-- Latest measurement time of every sensor parameter, to find gaps at the start of a batch.
+CREATE TABLE IF NOT EXISTS quality.sensor_state (
+    sensors_id BIGINT,                 -- Unique identifier for the sensor
+    "parameter" VARCHAR,               -- Type of measurement
+    location_id BIGINT,                -- Location of the sensor
+    last_datetime TIMESTAMP,           -- Latest measurement checked so far
+    PRIMARY KEY (sensors_id, "parameter")
+);
@@ -0,0 +1,16 @@
+-- Create a table named 'latest_values' in the 'presentation' schema if it does not already exist.
+-- This table holds the most recent reported value of every parameter at every location. Extraction updates it in place
+-- from the records it loads, so the map reads a row per location and parameter instead of scanning the history.
+CREATE TABLE IF NOT EXISTS presentation.latest_values (
+    location_id BIGINT,                -- Unique identifier for the location
+    "parameter" VARCHAR,               -- Type of measurement (e.g., PM10, PM2.5, SO2)
+    sensors_id BIGINT,                 -- Sensor that reported the value
+    "location" VARCHAR,                -- Name of the location
+    lat DOUBLE,                        -- Latitude coordinate of the location
+    lon DOUBLE,                        -- Longitude coordinate of the location
+    units VARCHAR,                     -- Units of the measurement
+    "value" DOUBLE,                    -- Latest measured value
+    "datetime" TIMESTAMP,              -- Timestamp of the latest measurement
+    ingestion_datetime TIMESTAMP,      -- Timestamp when the measurement was ingested into the database
+    PRIMARY KEY (location_id, "parameter")
+);
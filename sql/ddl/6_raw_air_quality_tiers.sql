@@ -0,0 +1,26 @@
+-- Expose the hot and cold tiers of the raw data as one view.
+-- Recent records are kept in the 'raw.air_quality' table (the hot tier). The archive command of the database manager
+-- moves older records to Parquet files per location and year (the cold tier), read through 'raw.air_quality_cold'.
+
+-- Until the first archive is written, the cold tier is an empty view with the columns of the raw table.
+-- The archive command replaces it by a view over the Parquet files.
+CREATE VIEW IF NOT EXISTS raw.air_quality_cold AS
+SELECT *
+FROM raw.air_quality
+LIMIT 0;
+
+-- Create or replace a view named 'air_quality_all' in the 'raw' schema, holding the records of both tiers.
+-- Readers of the full history, such as the presentation views, select from this view instead of the raw table.
+-- Extractions of archived months insert those records into the hot tier again; the hot record wins until the next
+-- archive run merges it into the archive, so no record is counted twice.
+CREATE OR REPLACE VIEW raw.air_quality_all AS
+SELECT *
+FROM raw.air_quality
+UNION ALL BY NAME
+SELECT *
+FROM raw.air_quality_cold
+ANTI JOIN raw.air_quality AS hot
+ON air_quality_cold.location_id = hot.location_id
+AND air_quality_cold.sensors_id = hot.sensors_id
+AND air_quality_cold."datetime" = hot."datetime"
+AND air_quality_cold."parameter" = hot."parameter";
@@ -1,19 +1,9 @@
 -- Create or replace a view named 'air_quality' in the 'presentation' schema.
--- This view processes raw air quality data to ensure data quality by keeping only the latest record for each sensor parameter per datetime.
+-- This view filters raw air quality data, recent and archived, to the parameters and values used for reporting.
+-- Duplicates are handled on ingestion: 'raw.air_quality' holds only the latest record for each sensor parameter per datetime.
+-- Records quarantined by the data-quality checks are left out.
 
 CREATE OR REPLACE VIEW presentation.air_quality AS (
-    -- Use a Common Table Expression (CTE) to add a row number for each record based on specific criteria.
-    WITH ranked_data AS (
-        SELECT
-            *,  -- Select all columns from the raw data.
-            ROW_NUMBER() OVER (
-                PARTITION BY location_id, sensors_id, "datetime", "parameter" 
-                ORDER BY ingestion_datetime DESC
-            ) AS rn -- Assign a row number, prioritizing the most recent ingestion time.
-        FROM raw.air_quality
-        WHERE parameter IN ('pm10', 'pm25', 'so2')  -- Filter for specific parameters.
-        AND "value" >= 0                            -- Exclude records with negative values.
-    )
     SELECT
         location_id,
         sensors_id,
@@ -27,6 +17,12 @@ CREATE OR REPLACE VIEW presentation.air_quality AS (
         "month",
         "year",
         ingestion_datetime
-    FROM ranked_data
-    WHERE rn = 1  -- Keep only the latest record for each group (row number 1).
+    FROM raw.air_quality_all                   -- Recent and archived records.
+    ANTI JOIN quality.quarantine                -- Exclude records that failed a data-quality check.
+    ON air_quality_all.location_id = quarantine.location_id
+    AND air_quality_all.sensors_id = quarantine.sensors_id
+    AND air_quality_all."datetime" = quarantine."datetime"
+    AND air_quality_all."parameter" = quarantine."parameter"
+    WHERE parameter IN ('pm10', 'pm25', 'so2')  -- Filter for specific parameters.
+    AND "value" >= 0                            -- Exclude records with negative values.
 );
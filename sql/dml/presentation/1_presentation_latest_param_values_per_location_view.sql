@@ -1,7 +1,21 @@
 -- Create or replace a view named 'latest_param_values_per_location' in the 'presentation' schema.
 -- This view provides the most recent parameter values for each location.
+-- When materialized it is a table instead; incremental refreshes only recompute locations listed in 'touched_keys'.
+{% set relation = 'presentation.latest_param_values_per_location' %}
 
-CREATE OR REPLACE VIEW presentation.latest_param_values_per_location AS
+{% if incremental %}
+-- Remove the rows of the locations that received new data, they are recomputed below.
+DELETE FROM {{ relation }}
+WHERE location_id IN (SELECT location_id FROM touched_keys);
+
+INSERT INTO {{ relation }} BY NAME
+{% elif materialize %}
+{% if relation in views %}DROP VIEW {{ relation }};{% endif %}
+CREATE OR REPLACE TABLE {{ relation }} AS
+{% else %}
+{% if relation in tables %}DROP TABLE {{ relation }};{% endif %}
+CREATE OR REPLACE VIEW {{ relation }} AS
+{% endif %}
 -- Use a Common Table Expression (CTE) to assign row numbers based on the latest datetime for each parameter at each location.
 WITH ranked_data AS (
   SELECT
@@ -17,6 +31,9 @@ WITH ranked_data AS (
         ORDER BY datetime DESC               -- Order by the most recent datetime
     ) AS rn -- Assign row numbers to prioritize the latest records.
   FROM presentation.air_quality
+  {% if incremental %}
+  WHERE location_id IN (SELECT location_id FROM touched_keys)  -- Only the locations that received new data.
+  {% endif %}
 )
 -- Use PIVOT to transform the data and display the latest value for each parameter as columns for each location.
 PIVOT (
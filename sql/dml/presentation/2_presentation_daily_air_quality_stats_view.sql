@@ -1,7 +1,24 @@
 -- Create or replace a view named 'daily_air_quality_stats' in the 'presentation' schema.
 -- This view calculates average daily air quality values for each parameter at each location.
+-- When materialized it is a table instead; incremental refreshes only recompute the keys listed in 'touched_keys'.
+{% set relation = 'presentation.daily_air_quality_stats' %}
 
-CREATE OR REPLACE VIEW presentation.daily_air_quality_stats AS
+{% if incremental %}
+-- Remove the days that received new data, they are recomputed below.
+DELETE FROM {{ relation }}
+USING touched_keys
+WHERE {{ relation }}.location_id = touched_keys.location_id
+AND {{ relation }}.parameter = touched_keys.parameter
+AND {{ relation }}.measurement_date = touched_keys.measurement_date;
+
+INSERT INTO {{ relation }} BY NAME
+{% elif materialize %}
+{% if relation in views %}DROP VIEW {{ relation }};{% endif %}
+CREATE OR REPLACE TABLE {{ relation }} AS
+{% else %}
+{% if relation in tables %}DROP TABLE {{ relation }};{% endif %}
+CREATE OR REPLACE VIEW {{ relation }} AS
+{% endif %}
 -- Use a Common Table Expression (CTE) to preprocess air quality data for daily statistics.
 WITH air_quality_cte AS (
     SELECT
@@ -21,6 +38,12 @@ WITH air_quality_cte AS (
             ELSE 0                              -- Mark as 0 if the day is a weekday.
         END AS is_weekend                      -- Flag indicating whether the day is a weekend.
     FROM presentation.air_quality              -- Use preprocessed air quality data from the presentation schema.
+    {% if incremental %}
+    SEMI JOIN touched_keys                     -- Only the location, parameter and date keys that received new data.
+    ON air_quality.location_id = touched_keys.location_id
+    AND air_quality.parameter = touched_keys.parameter
+    AND CAST(air_quality."datetime" AS DATE) = touched_keys.measurement_date
+    {% endif %}
 )
 -- Select the processed data and compute daily average air quality statistics.
 SELECT
@@ -46,4 +69,8 @@ GROUP BY                                       -- Group data by all relevant fie
     lat,
     lon,
     parameter,
-    units;
+    units
+{% if materialize and not incremental %}
+-- Store the table in the order of its sort key, so row group statistics allow skipping.
+ORDER BY location_id, parameter, measurement_date
+{% endif %};
@@ -0,0 +1,84 @@
+-- Create or replace a view named 'air_quality_rollups' in the 'presentation' schema.
+-- This view aggregates air quality values per location and parameter at hourly, daily, weekly and monthly resolution.
+-- When materialized it is a table instead; incremental refreshes only recompute the periods containing the keys in 'touched_keys'.
+{% set relation = 'presentation.air_quality_rollups' %}
+
+{% if incremental %}
+-- Collect the periods that contain a touched date, at every resolution.
+-- Hourly periods are refreshed for the whole touched day.
+CREATE OR REPLACE TEMP TABLE touched_periods AS
+SELECT DISTINCT
+    resolution,
+    location_id,
+    parameter,
+    date_trunc(CASE resolution WHEN 'hour' THEN 'day' ELSE resolution END, measurement_date)::TIMESTAMP AS range_start,
+    range_start + CASE resolution
+        WHEN 'week' THEN INTERVAL 7 DAY
+        WHEN 'month' THEN INTERVAL 1 MONTH
+        ELSE INTERVAL 1 DAY
+    END AS range_end
+FROM touched_keys
+CROSS JOIN (VALUES ('hour'), ('day'), ('week'), ('month')) AS resolutions(resolution);
+
+-- Remove the touched periods, they are recomputed below.
+DELETE FROM {{ relation }}
+USING touched_periods
+WHERE {{ relation }}.resolution = touched_periods.resolution
+AND {{ relation }}.location_id = touched_periods.location_id
+AND {{ relation }}.parameter = touched_periods.parameter
+AND {{ relation }}.period_start >= touched_periods.range_start
+AND {{ relation }}.period_start < touched_periods.range_end;
+
+INSERT INTO {{ relation }} BY NAME
+{% elif materialize %}
+{% if relation in views %}DROP VIEW {{ relation }};{% endif %}
+CREATE OR REPLACE TABLE {{ relation }} AS
+{% else %}
+{% if relation in tables %}DROP TABLE {{ relation }};{% endif %}
+CREATE OR REPLACE VIEW {{ relation }} AS
+{% endif %}
+-- Pair every measurement with each resolution and the start of its period at that resolution.
+WITH periods AS (
+    SELECT
+        resolutions.resolution,                -- Resolution of the rollup ('hour', 'day', 'week' or 'month').
+        date_trunc(resolutions.resolution, air_quality."datetime") AS period_start, -- Start of the period.
+        air_quality.location_id,               -- Unique identifier for the location.
+        air_quality.location,                  -- Name of the location.
+        air_quality.parameter,                 -- Type of measurement.
+        air_quality.units,                     -- Units of the measurement.
+        air_quality.value                      -- Measured value.
+    FROM presentation.air_quality
+    CROSS JOIN (VALUES ('hour'), ('day'), ('week'), ('month')) AS resolutions(resolution)
+    {% if incremental %}
+    SEMI JOIN touched_periods                  -- Only the periods that received new data.
+    ON touched_periods.resolution = resolutions.resolution
+    AND touched_periods.location_id = air_quality.location_id
+    AND touched_periods.parameter = air_quality.parameter
+    AND air_quality."datetime" >= touched_periods.range_start
+    AND air_quality."datetime" < touched_periods.range_end
+    {% endif %}
+)
+-- Aggregate the measurements of each period.
+SELECT
+    resolution,
+    period_start,
+    location_id,
+    location,
+    parameter,
+    units,
+    AVG(value) AS average_value,               -- Average value over the period.
+    MIN(value) AS min_value,                   -- Lowest value in the period.
+    MAX(value) AS max_value,                   -- Highest value in the period.
+    COUNT(*) AS measurement_count              -- Number of measurements in the period.
+FROM periods
+GROUP BY
+    resolution,
+    period_start,
+    location_id,
+    location,
+    parameter,
+    units
+{% if materialize and not incremental %}
+-- Store the table in the order of its sort key, so row group statistics allow skipping.
+ORDER BY resolution, location_id, parameter, period_start
+{% endif %};
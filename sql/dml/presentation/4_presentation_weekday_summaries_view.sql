@@ -0,0 +1,121 @@
+-- Create or replace a view named 'weekday_summaries' in the 'presentation' schema.
+-- This view summarizes the daily averages of each parameter at each location per year and weekday: their count,
+-- minimum, maximum and mean, and a quantile sketch of at most 20 centroids (mean and weight of consecutive values).
+-- The 4 lowest and 4 highest values are centroids of their own, so the points beyond the box plot whiskers stay
+-- exact, and the values in between are split into 12 centroids of equal shares.
+-- Summaries merge by adding the counts, weighting the means, taking the extremes and concatenating the centroids,
+-- so the weekday distribution over any range of years is computed from a few summaries instead of every daily value.
+-- When materialized it is a table instead; incremental refreshes only recompute the years listed in 'touched_keys'.
+{% set relation = 'presentation.weekday_summaries' %}
+{% set tail_size = 4 %}
+{% set middle_size = 12 %}
+
+{% if incremental %}
+-- The years that received new data, they are recomputed below.
+CREATE OR REPLACE TEMP TABLE touched_years AS
+SELECT DISTINCT
+    location_id,
+    parameter,
+    CAST(date_trunc('year', measurement_date) AS DATE) AS year_start
+FROM touched_keys;
+
+DELETE FROM {{ relation }}
+USING touched_years
+WHERE {{ relation }}.location_id = touched_years.location_id
+AND {{ relation }}.parameter = touched_years.parameter
+AND {{ relation }}.year_start = touched_years.year_start;
+
+INSERT INTO {{ relation }} BY NAME
+{% elif materialize %}
+{% if relation in views %}DROP VIEW {{ relation }};{% endif %}
+CREATE OR REPLACE TABLE {{ relation }} AS
+{% else %}
+{% if relation in tables %}DROP TABLE {{ relation }};{% endif %}
+CREATE OR REPLACE VIEW {{ relation }} AS
+{% endif %}
+-- Use a Common Table Expression (CTE) to rank every daily average within its year and weekday.
+WITH daily_values AS (
+    SELECT
+        location_id,                           -- Unique identifier for the location.
+        parameter,                             -- Type of measurement.
+        units,                                 -- Units of the measurement.
+        CAST(date_trunc('year', measurement_date) AS DATE) AS year_start, -- First day of the year.
+        weekday_number,                        -- Day of the week as a number.
+        weekday,                               -- Name of the day of the week.
+        average_value,                         -- Average value of the day.
+        row_number() OVER (                    -- Rank of the value among the sorted values.
+            PARTITION BY location_id, parameter, units, year_start, weekday_number
+            ORDER BY average_value
+        ) AS value_rank,
+        COUNT(*) OVER (                        -- Number of values of the year and weekday.
+            PARTITION BY location_id, parameter, units, year_start, weekday_number
+        ) AS value_count
+    FROM presentation.daily_air_quality_stats
+    {% if incremental %}
+    SEMI JOIN touched_years                    -- Only the years that received new data.
+    ON daily_air_quality_stats.location_id = touched_years.location_id
+    AND daily_air_quality_stats.parameter = touched_years.parameter
+    AND date_trunc('year', daily_air_quality_stats.measurement_date) = touched_years.year_start
+    {% endif %}
+),
+-- Assign every daily average to a centroid: the tails one value each, the rest in equal shares.
+ranked_values AS (
+    SELECT
+        *,
+        CASE
+            WHEN value_rank <= {{ tail_size }} OR value_rank > value_count - {{ tail_size }}
+            THEN -value_rank                   -- A centroid of its own.
+            ELSE (value_rank - {{ tail_size }} - 1) * {{ middle_size }} // (value_count - 2 * {{ tail_size }})
+        END AS centroid
+    FROM daily_values
+),
+-- Compute the statistics of every centroid.
+centroids AS (
+    SELECT
+        location_id,
+        parameter,
+        units,
+        year_start,
+        weekday_number,
+        weekday,
+        COUNT(*) AS day_count,                 -- Number of daily averages in the centroid.
+        MIN(average_value) AS min_value,       -- Lowest daily average in the centroid.
+        MAX(average_value) AS max_value,       -- Highest daily average in the centroid.
+        AVG(average_value) AS average_value    -- Mean of the daily averages in the centroid.
+    FROM ranked_values
+    GROUP BY
+        location_id,
+        parameter,
+        units,
+        year_start,
+        weekday_number,
+        weekday,
+        centroid
+)
+-- Combine the centroids into one summary per location, parameter, year and weekday.
+SELECT
+    location_id,                               -- Unique identifier for the location.
+    parameter,                                 -- Type of measurement.
+    units,                                     -- Units of the measurement.
+    year_start,                                -- First day of the year.
+    weekday_number,                            -- Day of the week as a number.
+    weekday,                                   -- Name of the day of the week.
+    SUM(day_count) AS day_count,               -- Number of daily averages.
+    MIN(min_value) AS min_value,               -- Lowest daily average.
+    MAX(max_value) AS max_value,               -- Highest daily average.
+    SUM(average_value * day_count) / SUM(day_count) AS average_value, -- Mean of the daily averages.
+    list(                                      -- Quantile sketch, sorted by centroid mean.
+        {'mean': average_value, 'weight': day_count} ORDER BY average_value
+    ) AS centroids
+FROM centroids
+GROUP BY
+    location_id,
+    parameter,
+    units,
+    year_start,
+    weekday_number,
+    weekday
+{% if materialize and not incremental %}
+-- Store the table in the order of its sort key, so row group statistics allow skipping.
+ORDER BY location_id, parameter, year_start, weekday_number
+{% endif %};
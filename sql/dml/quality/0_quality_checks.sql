@@ -0,0 +1,317 @@
+-- Check the records ingested into 'raw.air_quality' since the previous run with a few set-based statements.
+-- The batch holds the records ingested after 'previous_watermark' up to 'watermark'. Earlier data is only read
+-- through the small state tables and, for duplicates, the raw records within the batch's time range, so the cost
+-- of a run grows with the batch, not the history.
+-- Failing records are copied to 'quality.quarantine'; failure counts per check, location and parameter, and the
+-- timestamp gaps per sensor, go to 'quality.check_results'.
+
+-- The records to check.
+CREATE OR REPLACE TEMP TABLE quality_batch AS
+SELECT *
+FROM raw.air_quality
+WHERE ingestion_datetime <= TIMESTAMP '{{ watermark }}'
+{% if previous_watermark %}
+AND ingestion_datetime > TIMESTAMP '{{ previous_watermark }}'
+{% endif %};
+
+-- Flag every record of the batch with the names of the checks it fails.
+CREATE OR REPLACE TEMP TABLE quality_flags AS
+WITH batch_stats AS (
+    -- Value statistics of the batch, in the mergeable form of 'quality.value_stats'.
+    SELECT
+        location_id,
+        "parameter",
+        units,
+        COUNT("value") AS value_count,
+        SUM("value") AS value_sum,
+        SUM("value" * "value") AS value_sum_squares
+    FROM quality_batch
+    WHERE "value" >= 0
+    AND units IS NOT NULL
+    GROUP BY ALL
+),
+merged_stats AS (
+    -- Statistics of the earlier valid values and the batch together.
+    SELECT
+        location_id,
+        "parameter",
+        units,
+        SUM(value_count) AS value_count,
+        SUM(value_sum) AS value_sum,
+        SUM(value_sum_squares) AS value_sum_squares
+    FROM (
+        SELECT location_id, "parameter", units, value_count, value_sum, value_sum_squares
+        FROM quality.value_stats
+        UNION ALL
+        SELECT location_id, "parameter", units, value_count, value_sum, value_sum_squares
+        FROM batch_stats
+    )
+    GROUP BY ALL
+),
+value_limits AS (
+    -- Mean and standard deviation per location, parameter and unit, once there are enough values.
+    SELECT
+        location_id,
+        "parameter",
+        units,
+        value_sum / value_count AS value_mean,
+        sqrt(greatest(value_sum_squares - value_sum * value_sum / value_count, 0) / (value_count - 1)) AS value_stddev
+    FROM merged_stats
+    WHERE value_count >= {{ min_value_count }}
+),
+expected_units AS (
+    -- The unit each parameter is reported in most often.
+    SELECT "parameter", arg_max(units, value_count) AS units
+    FROM (
+        SELECT "parameter", units, SUM(value_count) AS value_count
+        FROM merged_stats
+        GROUP BY ALL
+    )
+    GROUP BY "parameter"
+),
+duplicates AS (
+    -- Batch records repeating the location, parameter, unit, value and datetime of another record.
+    -- The earliest ingested record, then the one of the lowest sensor, is kept.
+    SELECT location_id, sensors_id, "datetime", "parameter"
+    FROM (
+        SELECT
+            location_id,
+            sensors_id,
+            "datetime",
+            "parameter",
+            in_batch,
+            ROW_NUMBER() OVER (
+                PARTITION BY location_id, "parameter", units, "value", "datetime"
+                ORDER BY in_batch, sensors_id
+            ) AS occurrence
+        FROM (
+            SELECT location_id, sensors_id, "datetime", "parameter", units, "value", true AS in_batch
+            FROM quality_batch
+            UNION ALL
+            SELECT location_id, sensors_id, "datetime", "parameter", units, "value", false AS in_batch
+            FROM raw.air_quality
+            -- Constant bounds, so row groups outside the batch's time range are skipped.
+            WHERE "datetime" BETWEEN TIMESTAMP '{{ batch_start }}' AND TIMESTAMP '{{ batch_end }}'
+            {% if previous_watermark %}
+            AND ingestion_datetime <= TIMESTAMP '{{ previous_watermark }}'
+            {% else %}
+            AND false                           -- Nothing was checked before, so the batch is the whole history.
+            {% endif %}
+        )
+    )
+    WHERE in_batch
+    AND occurrence > 1
+)
+SELECT
+    quality_batch.*,
+    list_filter(
+        [
+            CASE WHEN quality_batch."value" IS NULL OR quality_batch.units IS NULL THEN 'null_value' END,
+            CASE WHEN quality_batch."value" < 0 THEN 'negative_value' END,
+            CASE
+                WHEN quality_batch."value" >= 0
+                AND value_limits.value_stddev > 0
+                AND abs(quality_batch."value" - value_limits.value_mean) > {{ outlier_threshold }} * value_limits.value_stddev
+                THEN 'outlier_value'
+            END,
+            CASE WHEN quality_batch.units <> expected_units.units THEN 'unit_mismatch' END,
+            CASE WHEN duplicates.sensors_id IS NOT NULL THEN 'duplicate' END
+        ],
+        check_name -> check_name IS NOT NULL
+    ) AS failed_checks
+FROM quality_batch
+LEFT JOIN value_limits
+ON quality_batch.location_id = value_limits.location_id
+AND quality_batch."parameter" = value_limits."parameter"
+AND quality_batch.units = value_limits.units
+LEFT JOIN expected_units
+ON quality_batch."parameter" = expected_units."parameter"
+LEFT JOIN duplicates
+ON quality_batch.location_id = duplicates.location_id
+AND quality_batch.sensors_id = duplicates.sensors_id
+AND quality_batch."datetime" = duplicates."datetime"
+AND quality_batch."parameter" = duplicates."parameter";
+
+-- Replace the quarantined versions of re-ingested records, then quarantine the failing records.
+DELETE FROM quality.quarantine
+USING quality_flags
+WHERE quarantine.location_id = quality_flags.location_id
+AND quarantine.sensors_id = quality_flags.sensors_id
+AND quarantine."datetime" = quality_flags."datetime"
+AND quarantine."parameter" = quality_flags."parameter";
+
+INSERT INTO quality.quarantine
+SELECT
+    location_id,
+    sensors_id,
+    "location",
+    "datetime",
+    lat,
+    lon,
+    "parameter",
+    units,
+    "value",
+    "month",
+    "year",
+    ingestion_datetime,
+    failed_checks,
+    {{ run_id }} AS run_id,
+    current_timestamp AS quarantined_datetime
+FROM quality_flags
+WHERE len(failed_checks) > 0;
+
+-- Count the failures per check, location and parameter.
+INSERT INTO quality.check_results
+SELECT
+    {{ run_id }} AS run_id,
+    check_name,
+    location_id,
+    "parameter",
+    NULL AS sensors_id,
+    COUNT(*) AS failed_count,
+    MIN("datetime") AS first_datetime,
+    MAX("datetime") AS last_datetime
+FROM (
+    SELECT location_id, "parameter", "datetime", unnest(failed_checks) AS check_name
+    FROM quality_flags
+)
+GROUP BY ALL;
+
+-- Record the gaps between consecutive measurements of every sensor parameter, including the gap
+-- between the latest measurement of earlier runs and the first one of the batch.
+INSERT INTO quality.check_results
+WITH measurements AS (
+    SELECT DISTINCT location_id, sensors_id, "parameter", "datetime", true AS in_batch
+    FROM quality_batch
+    WHERE "datetime" IS NOT NULL
+    UNION ALL
+    SELECT location_id, sensors_id, "parameter", last_datetime AS "datetime", false AS in_batch
+    FROM quality.sensor_state
+    SEMI JOIN quality_batch
+    ON sensor_state.sensors_id = quality_batch.sensors_id
+    AND sensor_state."parameter" = quality_batch."parameter"
+),
+gaps AS (
+    SELECT
+        location_id,
+        sensors_id,
+        "parameter",
+        in_batch,
+        LAG("datetime") OVER (PARTITION BY sensors_id, "parameter" ORDER BY "datetime", in_batch) AS gap_start,
+        "datetime" AS gap_end
+    FROM measurements
+)
+SELECT
+    {{ run_id }} AS run_id,
+    'timestamp_gap' AS check_name,
+    location_id,
+    "parameter",
+    sensors_id,
+    1 AS failed_count,
+    gap_start AS first_datetime,
+    gap_end AS last_datetime
+FROM gaps
+WHERE in_batch                                  -- Gaps ending before earlier data are backfills, not gaps.
+AND gap_end - gap_start > INTERVAL {{ max_gap_hours }} HOUR;
+
+-- Add the valid values of the batch to the value statistics.
+INSERT OR REPLACE INTO quality.value_stats
+WITH batch_stats AS (
+    SELECT
+        location_id,
+        "parameter",
+        units,
+        COUNT("value") AS value_count,
+        SUM("value") AS value_sum,
+        SUM("value" * "value") AS value_sum_squares
+    FROM quality_flags
+    WHERE len(failed_checks) = 0
+    GROUP BY ALL
+)
+SELECT
+    batch_stats.location_id,
+    batch_stats."parameter",
+    batch_stats.units,
+    batch_stats.value_count + COALESCE(value_stats.value_count, 0) AS value_count,
+    batch_stats.value_sum + COALESCE(value_stats.value_sum, 0) AS value_sum,
+    batch_stats.value_sum_squares + COALESCE(value_stats.value_sum_squares, 0) AS value_sum_squares
+FROM batch_stats
+LEFT JOIN quality.value_stats
+ON batch_stats.location_id = value_stats.location_id
+AND batch_stats."parameter" = value_stats."parameter"
+AND batch_stats.units = value_stats.units;
+
+-- Move every sensor parameter's latest measurement forward.
+INSERT OR REPLACE INTO quality.sensor_state
+SELECT
+    quality_batch.sensors_id,
+    quality_batch."parameter",
+    ANY_VALUE(quality_batch.location_id) AS location_id,
+    greatest(MAX(quality_batch."datetime"), MAX(sensor_state.last_datetime)) AS last_datetime
+FROM quality_batch
+LEFT JOIN quality.sensor_state
+ON quality_batch.sensors_id = sensor_state.sensors_id
+AND quality_batch."parameter" = sensor_state."parameter"
+WHERE quality_batch.sensors_id IS NOT NULL
+AND quality_batch."datetime" IS NOT NULL
+AND quality_batch."parameter" IS NOT NULL
+GROUP BY ALL;
+
+-- Record the run.
+INSERT INTO quality.check_runs
+SELECT
+    {{ run_id }} AS run_id,
+    current_timestamp AS checked_datetime,
+    TIMESTAMP '{{ watermark }}' AS watermark,
+    COUNT(*) AS record_count,
+    COUNT(*) FILTER (WHERE len(failed_checks) > 0) AS quarantined_count
+FROM quality_flags;
+
+-- Replace the latest values that were just quarantined by the latest remaining record of their location and parameter.
+-- The replacements are upserted, since a key deleted and inserted again in one transaction violates the primary key.
+CREATE OR REPLACE TEMP TABLE quarantined_latest_values AS
+SELECT latest_values.location_id, latest_values."parameter"
+FROM presentation.latest_values
+SEMI JOIN quality_flags
+ON latest_values.location_id = quality_flags.location_id
+AND latest_values.sensors_id = quality_flags.sensors_id
+AND latest_values."datetime" = quality_flags."datetime"
+AND latest_values."parameter" = quality_flags."parameter"
+AND len(quality_flags.failed_checks) > 0;
+
+INSERT OR REPLACE INTO presentation.latest_values
+SELECT
+    location_id,
+    "parameter",
+    sensors_id,
+    "location",
+    lat,
+    lon,
+    units,
+    "value",
+    "datetime",
+    ingestion_datetime
+FROM raw.air_quality
+SEMI JOIN quarantined_latest_values
+ON air_quality.location_id = quarantined_latest_values.location_id
+AND air_quality."parameter" = quarantined_latest_values."parameter"
+ANTI JOIN quality.quarantine
+ON air_quality.location_id = quarantine.location_id
+AND air_quality.sensors_id = quarantine.sensors_id
+AND air_quality."datetime" = quarantine."datetime"
+AND air_quality."parameter" = quarantine."parameter"
+WHERE "value" >= 0
+QUALIFY ROW_NUMBER() OVER (PARTITION BY location_id, "parameter" ORDER BY "datetime" DESC, sensors_id) = 1;
+
+-- Remove the latest values of locations and parameters without any remaining record.
+DELETE FROM presentation.latest_values
+USING quality_flags
+WHERE latest_values.location_id = quality_flags.location_id
+AND latest_values.sensors_id = quality_flags.sensors_id
+AND latest_values."datetime" = quality_flags."datetime"
+AND latest_values."parameter" = quality_flags."parameter"
+AND len(quality_flags.failed_checks) > 0;
+
+DROP TABLE quarantined_latest_values;
+DROP TABLE quality_flags;
+DROP TABLE quality_batch;
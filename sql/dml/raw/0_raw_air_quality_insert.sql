@@ -1,6 +1,35 @@
 -- Insert new air quality data into the 'raw.air_quality' table.
-INSERT INTO raw.air_quality
-SELECT 
+-- Records that already exist (same location, sensor, datetime and parameter) are replaced by the new version.
+-- In streaming mode ('stream_source') only the scan of the CSV files is rendered, and every chunk of
+-- the scan is then inserted from the relation named in the 'batch_relation' variable.
+{% set source %}
+-- Load data from the CSV files listed in the 'data_file_paths' variable (paths or globs) in a single scan.
+read_csv(
+    [{% for data_file_path in data_file_paths %}'{{ data_file_path }}'{% if not loop.last %}, {% endif %}{% endfor %}],
+    header = true,
+    -- Explicit schema so DuckDB does not have to sniff every file.
+    columns = {
+        'location_id': 'BIGINT',
+        'sensors_id': 'BIGINT',
+        'location': 'VARCHAR',
+        'datetime': 'TIMESTAMP',
+        'lat': 'DOUBLE',
+        'lon': 'DOUBLE',
+        'parameter': 'VARCHAR',
+        'units': 'VARCHAR',
+        'value': 'DOUBLE'
+    },
+    -- Read the 'locationid=/year=/month=' directories as columns.
+    hive_partitioning = true,
+    hive_types = {'locationid': 'BIGINT', 'year': 'BIGINT', 'month': 'VARCHAR'}
+)
+{% endset %}
+{% if stream_source %}
+SELECT *
+FROM {{ source }};
+{% else %}
+INSERT OR REPLACE INTO raw.air_quality
+SELECT
     location_id,                               -- Unique identifier for the location.
     sensors_id,                               -- Unique identifier for the sensor.
     "location",                               -- Name of the location.
@@ -13,4 +42,13 @@ SELECT
     "month",                                  -- Month of the measurement.
     "year",                                   -- Year of the measurement.
     current_timestamp AS ingestion_datetime   -- Timestamp when the data was ingested.
-FROM read_csv('{{ data_file_path }}');        -- Load data from a CSV file specified by the 'data_file_path' variable.
+FROM {% if batch_relation %}{{ batch_relation }}{% else %}{{ source }}{% endif %}
+WHERE location_id IS NOT NULL                 -- Skip records without a complete primary key.
+AND sensors_id IS NOT NULL
+AND "datetime" IS NOT NULL
+AND "parameter" IS NOT NULL
+-- Keep one record per primary key, since a key may only be written once per statement.
+QUALIFY ROW_NUMBER() OVER (PARTITION BY location_id, sensors_id, "datetime", "parameter") = 1
+-- Append the records in the order of the table's sort key, so row group statistics allow skipping.
+ORDER BY location_id, "parameter", "datetime";
+{% endif %}
@@ -0,0 +1,71 @@
+-- Land air quality data as Parquet files instead of inserting it into a table.
+-- Each source partition (location, year, month) is written to its own file, so re-extracting a partition replaces it.
+-- Once files are written, 'raw.air_quality' is (re)created as a view over all of them (rendered with 'create_view').
+
+{% if create_view %}
+-- Expose every Parquet file as 'raw.air_quality'.
+-- Filters on location_id, year and month skip whole files; filters on parameter and datetime skip row groups, since files are sorted by them.
+CREATE OR REPLACE VIEW raw.air_quality AS
+SELECT
+    location_id,                              -- Unique identifier for the location.
+    sensors_id,                               -- Unique identifier for the sensor.
+    "location",                               -- Name of the location.
+    "datetime",                               -- Timestamp of the measurement.
+    lat,                                      -- Latitude coordinate of the location.
+    lon,                                      -- Longitude coordinate of the location.
+    "parameter",                              -- Type of measurement (e.g., PM10, PM2.5).
+    units,                                    -- Units of the measurement.
+    "value",                                  -- Measured value.
+    "month",                                  -- Month of the measurement.
+    "year",                                   -- Year of the measurement.
+    ingestion_datetime                        -- Timestamp when the data was ingested.
+FROM read_parquet(
+    '{{ parquet_base_path }}/*/*/*/*.parquet',
+    hive_partitioning = true,
+    hive_types = {'location_id': 'BIGINT', 'year': 'BIGINT', 'month': 'VARCHAR'}
+);
+{% else %}
+-- Write the data of one source partition to a Parquet file.
+COPY (
+    SELECT
+        location_id,                          -- Unique identifier for the location.
+        sensors_id,                           -- Unique identifier for the sensor.
+        "location",                           -- Name of the location.
+        "datetime",                           -- Timestamp of the measurement.
+        lat,                                  -- Latitude coordinate of the location.
+        lon,                                  -- Longitude coordinate of the location.
+        "parameter",                          -- Type of measurement (e.g., PM10, PM2.5).
+        units,                                -- Units of the measurement.
+        "value",                              -- Measured value.
+        "month",                              -- Month of the measurement.
+        "year",                               -- Year of the measurement.
+        CAST(current_timestamp AS TIMESTAMP) AS ingestion_datetime -- Timestamp when the data was ingested.
+    -- Load data from the CSV files listed in the 'data_file_paths' variable (paths or globs) in a single scan.
+    FROM read_csv(
+        [{% for data_file_path in data_file_paths %}'{{ data_file_path }}'{% if not loop.last %}, {% endif %}{% endfor %}],
+        header = true,
+        -- Explicit schema so DuckDB does not have to sniff every file.
+        columns = {
+            'location_id': 'BIGINT',
+            'sensors_id': 'BIGINT',
+            'location': 'VARCHAR',
+            'datetime': 'TIMESTAMP',
+            'lat': 'DOUBLE',
+            'lon': 'DOUBLE',
+            'parameter': 'VARCHAR',
+            'units': 'VARCHAR',
+            'value': 'DOUBLE'
+        },
+        -- Read the 'locationid=/year=/month=' directories as columns.
+        hive_partitioning = true,
+        hive_types = {'locationid': 'BIGINT', 'year': 'BIGINT', 'month': 'VARCHAR'}
+    )
+    WHERE location_id IS NOT NULL             -- Skip records without a complete key.
+    AND sensors_id IS NOT NULL
+    AND "datetime" IS NOT NULL
+    AND "parameter" IS NOT NULL
+    -- Keep one record per key, like the primary key of the 'raw.air_quality' table.
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY location_id, sensors_id, "datetime", "parameter") = 1
+    ORDER BY "parameter", "datetime"          -- Sort by parameter and time so row group statistics allow skipping.
+) TO '{{ output_path }}' (FORMAT PARQUET, COMPRESSION ZSTD);
+{% endif %}
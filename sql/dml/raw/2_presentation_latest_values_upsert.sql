@@ -0,0 +1,46 @@
+-- Update 'presentation.latest_values' with the records ingested after 'since' (the newest ingestion_datetime in the
+-- table), or rebuild it from all records when 'since' is not set. Only the latest new record of each location and
+-- parameter is considered, and it replaces the stored value unless that one is more recent.
+-- The records are filtered like 'presentation.air_quality', which may be a table that is not refreshed yet.
+INSERT OR REPLACE INTO presentation.latest_values
+SELECT
+    new_values.location_id,
+    new_values."parameter",
+    new_values.sensors_id,
+    new_values."location",
+    new_values.lat,
+    new_values.lon,
+    new_values.units,
+    new_values."value",
+    new_values."datetime",
+    new_values.ingestion_datetime
+FROM (
+    SELECT
+        location_id,
+        "parameter",
+        sensors_id,
+        "location",
+        lat,
+        lon,
+        units,
+        "value",
+        "datetime",
+        ingestion_datetime
+    FROM raw.air_quality
+    ANTI JOIN quality.quarantine                -- Exclude records that failed a data-quality check.
+    ON air_quality.location_id = quarantine.location_id
+    AND air_quality.sensors_id = quarantine.sensors_id
+    AND air_quality."datetime" = quarantine."datetime"
+    AND air_quality."parameter" = quarantine."parameter"
+    WHERE "parameter" IN ('pm10', 'pm25', 'so2')  -- Filter for specific parameters.
+    AND "value" >= 0                            -- Exclude records with negative values.
+    {% if since %}
+    AND ingestion_datetime > TIMESTAMP '{{ since }}'  -- Only the records not merged yet.
+    {% endif %}
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY location_id, "parameter" ORDER BY "datetime" DESC, sensors_id) = 1
+) AS new_values
+LEFT JOIN presentation.latest_values
+ON new_values.location_id = latest_values.location_id
+AND new_values."parameter" = latest_values."parameter"
+WHERE latest_values."datetime" IS NULL
+OR new_values."datetime" >= latest_values."datetime";
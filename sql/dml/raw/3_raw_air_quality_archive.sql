@@ -0,0 +1,62 @@
+-- Archive raw air quality records older than the retention period as Parquet files, one per location and year.
+-- The records to archive are staged in the temporary 'archive_batch' table. Each rendering writes the archive
+-- of one location and year, merged with the records archived before ('existing_path'), to 'output_path'.
+-- Once archives are written, 'raw.air_quality_cold' is (re)created as a view over all of them (rendered with 'create_view').
+
+{% if create_view %}
+-- Expose every archive as the cold tier of 'raw.air_quality'.
+-- Filters on location_id and year skip whole files; filters on parameter and datetime skip row groups, since files are sorted by them.
+CREATE OR REPLACE VIEW raw.air_quality_cold AS
+SELECT
+    location_id,                              -- Unique identifier for the location.
+    sensors_id,                               -- Unique identifier for the sensor.
+    "location",                               -- Name of the location.
+    "datetime",                               -- Timestamp of the measurement.
+    lat,                                      -- Latitude coordinate of the location.
+    lon,                                      -- Longitude coordinate of the location.
+    "parameter",                              -- Type of measurement (e.g., PM10, PM2.5).
+    units,                                    -- Units of the measurement.
+    "value",                                  -- Measured value.
+    "month",                                  -- Month of the measurement.
+    "year",                                   -- Year of the measurement.
+    ingestion_datetime                        -- Timestamp when the data was ingested.
+FROM read_parquet(
+    '{{ archive_path }}/*/*/*.parquet',
+    hive_partitioning = true,
+    hive_types = {'location_id': 'BIGINT', 'year': 'BIGINT'}
+);
+{% else %}
+-- Write the archive of one location and year.
+COPY (
+    SELECT
+        location_id,                          -- Unique identifier for the location.
+        sensors_id,                           -- Unique identifier for the sensor.
+        "location",                           -- Name of the location.
+        "datetime",                           -- Timestamp of the measurement.
+        lat,                                  -- Latitude coordinate of the location.
+        lon,                                  -- Longitude coordinate of the location.
+        "parameter",                          -- Type of measurement (e.g., PM10, PM2.5).
+        units,                                -- Units of the measurement.
+        "value",                              -- Measured value.
+        "month",                              -- Month of the measurement.
+        "year",                               -- Year of the measurement.
+        ingestion_datetime                    -- Timestamp when the data was ingested.
+    FROM (
+        SELECT *
+        FROM archive_batch
+        WHERE location_id = {{ location_id }}
+        AND "year" = {{ year }}
+        {% if existing_path %}
+        UNION ALL BY NAME
+        SELECT *
+        FROM read_parquet('{{ existing_path }}')
+        {% endif %}
+    )
+    -- Keep the latest ingested version of records that were re-ingested after they were archived.
+    QUALIFY ROW_NUMBER() OVER (
+        PARTITION BY location_id, sensors_id, "datetime", "parameter"
+        ORDER BY ingestion_datetime DESC
+    ) = 1
+    ORDER BY "parameter", "datetime"          -- Sort so row group statistics allow skipping.
+) TO '{{ output_path }}' (FORMAT PARQUET, COMPRESSION ZSTD);
+{% endif %}